@@ -8,5 +8,8 @@ pip install -r requirements.txt
 # マイグレーションを実行
 python manage.py migrate --noinput
 
+# 類義語辞書を展開インデックスにコンパイル
+python manage.py build_synonym_index
+
 # 静的ファイルを収集
 python manage.py collectstatic --noinput --clear
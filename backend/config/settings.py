@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -78,6 +79,25 @@ else:
         }
     }
 
+# Shared cache (L2 of folders.tiered_cache): Redis if REDIS_URL is set, otherwise a file cache shared by the workers on this host
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'TIMEOUT': 3600,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'drive-explorer-cache')),
+            'TIMEOUT': 3600,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
     { 'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
@@ -97,12 +117,31 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# アプリのログ（検索・キャッシュの処理状況）をコンソールに出力
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '[{levelname}] {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'folders': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')},
+        'search': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')},
+    },
+}
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True # Simplest for demo/production mix
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Server-Timing']
 # Or use: CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
 
 GOOGLE_DRIVE_FOLDER_ID = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
 GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv('GOOGLE_SERVICE_ACCOUNT_FILE', 'service_account.json')
+DRIVE_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv('DRIVE_TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+DRIVE_HTTP_TIMEOUT_SECONDS = int(os.getenv('DRIVE_HTTP_TIMEOUT_SECONDS', '60'))
 
 # Base64エンコードされたサービスアカウントキーをデコードしてファイルとして保存
 import base64
@@ -122,6 +161,40 @@ if b64_content:
 
 # キャッシュ設定
 FOLDER_CACHE_MAX_AGE_HOURS = int(os.getenv('FOLDER_CACHE_MAX_AGE_HOURS', '24'))
+FOLDER_CACHE_CRAWL_CONCURRENCY = int(os.getenv('FOLDER_CACHE_CRAWL_CONCURRENCY', '4'))
+FOLDER_CACHE_WRITE_BATCH_SIZE = int(os.getenv('FOLDER_CACHE_WRITE_BATCH_SIZE', '500'))
+FOLDER_CACHE_INCREMENTAL_SYNC = os.getenv('FOLDER_CACHE_INCREMENTAL_SYNC', 'True') == 'True'
+FOLDER_CACHE_SYNC_INTERVAL_MINUTES = int(os.getenv('FOLDER_CACHE_SYNC_INTERVAL_MINUTES', '5'))
+FOLDER_CACHE_STALE_WHILE_REVALIDATE = os.getenv('FOLDER_CACHE_STALE_WHILE_REVALIDATE', 'True') == 'True'  # 古いキャッシュを返しつつ裏で更新
+FOLDER_CACHE_LOCK_SECONDS = int(os.getenv('FOLDER_CACHE_LOCK_SECONDS', '1800'))
+SINGLE_FLIGHT_CROSS_WORKER = os.getenv('SINGLE_FLIGHT_CROSS_WORKER', 'True') == 'True'  # 同じ検索・再構築をワーカー間でもDBロックでまとめる
+SINGLE_FLIGHT_LOCK_SECONDS = int(os.getenv('SINGLE_FLIGHT_LOCK_SECONDS', '120'))
+SINGLE_FLIGHT_WAIT_SECONDS = int(os.getenv('SINGLE_FLIGHT_WAIT_SECONDS', '20'))  # 実行中の同じ処理を待つ上限（ワーカーのタイムアウトより短く。超えたら古い結果か 503 を返す）
+SINGLE_FLIGHT_POLL_SECONDS = float(os.getenv('SINGLE_FLIGHT_POLL_SECONDS', '0.5'))
+CACHE_JOBS_RUN_IN_PROCESS = os.getenv('CACHE_JOBS_RUN_IN_PROCESS', 'True') == 'True'  # False なら refresh_folder_cache --pending で実行
+CACHE_JOB_RETRY_SECONDS = int(os.getenv('CACHE_JOB_RETRY_SECONDS', '60'))  # 失敗したフォルダの差分同期を再登録するまでの秒数
+CACHE_JOB_RETENTION_DAYS = int(os.getenv('CACHE_JOB_RETENTION_DAYS', '7'))  # 終了したジョブの履歴を残す日数
+ENABLE_FILE_INDEX = os.getenv('ENABLE_FILE_INDEX', 'True') == 'True'
+SEARCH_MAX_IN_FLIGHT_BATCHES = int(os.getenv('SEARCH_MAX_IN_FLIGHT_BATCHES', '4'))
+SEARCH_ASYNC_MAX_CONCURRENCY = int(os.getenv('SEARCH_ASYNC_MAX_CONCURRENCY', '32'))  # 非同期検索で同時に送信するリクエスト数
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '100'))
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '0'))  # 0 = 無制限
+SEARCH_PARENTS_PER_QUERY = int(os.getenv('SEARCH_PARENTS_PER_QUERY', '50'))
+DRIVE_QUERY_MAX_LENGTH = int(os.getenv('DRIVE_QUERY_MAX_LENGTH', '6000'))  # URLエンコード後の文字数
+SEARCH_CONDITION_MAX_LENGTH = int(os.getenv('SEARCH_CONDITION_MAX_LENGTH', '2000'))  # 超える場合は複数のクエリに分割
+SEARCH_RESULTS_TOP_N = int(os.getenv('SEARCH_RESULTS_TOP_N', '100'))  # 0 = 全件返す
+PAGINATION_MAX_LIMIT = int(os.getenv('PAGINATION_MAX_LIMIT', '500'))
+DRIVE_API_MAX_RETRIES = int(os.getenv('DRIVE_API_MAX_RETRIES', '5'))
+DRIVE_API_BACKOFF_SECONDS = float(os.getenv('DRIVE_API_BACKOFF_SECONDS', '1.0'))
+FOLDER_LISTING_CACHE_SECONDS = int(os.getenv('FOLDER_LISTING_CACHE_SECONDS', '60'))
+SUGGEST_MAX_RESULTS = int(os.getenv('SUGGEST_MAX_RESULTS', '10'))
+SUGGEST_REFRESH_SECONDS = int(os.getenv('SUGGEST_REFRESH_SECONDS', '5'))  # 入力候補のインデックスがキャッシュの変更（版）を確認する間隔
+TIERED_CACHE_L1_MAX_ENTRIES = int(os.getenv('TIERED_CACHE_L1_MAX_ENTRIES', '1000'))  # プロセス内キャッシュの件数上限（キャッシュの種類ごと）
+TIERED_CACHE_L1_SECONDS = int(os.getenv('TIERED_CACHE_L1_SECONDS', '30'))  # 他のワーカーの更新・無効化がプロセス内キャッシュに反映されるまでの最大時間
+CACHE_WRITE_BEHIND = os.getenv('CACHE_WRITE_BEHIND', 'True') == 'True'  # 検索結果・類義語の DB への保存をバックグラウンドで行う
+SYNONYM_LRU_MAX_ENTRIES = int(os.getenv('SYNONYM_LRU_MAX_ENTRIES', '1024'))
 SEARCH_RESULT_CACHE_MINUTES = int(os.getenv('SEARCH_RESULT_CACHE_MINUTES', '30'))
 ENABLE_SEARCH_RESULT_CACHE = os.getenv('ENABLE_SEARCH_RESULT_CACHE', 'True') == 'True'
+SEARCH_RESULT_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_RESULT_CACHE_MAX_ENTRIES', '500'))
+SEARCH_RESULT_CACHE_PURGE_SECONDS = int(os.getenv('SEARCH_RESULT_CACHE_PURGE_SECONDS', '300'))
 
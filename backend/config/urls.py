@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
+from folders.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/folders/', include('folders.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
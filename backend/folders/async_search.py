@@ -0,0 +1,143 @@
+"""
+非同期の Drive 検索: files.list をイベントループ上で並列に送信する（BatchSearchService の非同期版）
+
+クエリの組み立て・結果の振り分けは同期版と共通。バッチ（multipart）の代わりに個別のリクエストを
+HTTP/2 の1接続に多重化し、同時に送信する数をセマフォで制限する
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Union
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .cache_service import BatchSearchService, _backoff_delay, _dedupe_by_id
+from .drive_client import get_access_token, get_async_http_client
+from .metrics import DRIVE_BATCH_SECONDS, DRIVE_SUBREQUEST_ERRORS
+
+
+logger = logging.getLogger(__name__)
+
+DRIVE_FILES_URL = 'https://www.googleapis.com/drive/v3/files'
+
+
+class DriveRequestError(Exception):
+    """Drive API がエラーを返した（再送しても回復しない、または再送の上限に達した）"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Drive API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class AsyncBatchSearchService:
+    """非同期バッチ検索実行サービス"""
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: httpx.AsyncClient（None なら実行中のループで共有するクライアント）
+        """
+        self.client = client
+        self.page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 100)
+        self.max_concurrency = max(1, getattr(settings, 'SEARCH_ASYNC_MAX_CONCURRENCY', 32))
+        self.max_retries = getattr(settings, 'DRIVE_API_MAX_RETRIES', 5)
+        self.max_results = getattr(settings, 'SEARCH_MAX_RESULTS', 0) or None
+        # クエリの組み立て（フォルダのまとめ方・長さの上限）は同期版と共通
+        self.query_builder = BatchSearchService(None)
+
+    async def batch_search(self, folder_ids: List[str], search_conditions: Union[str, List[str]], max_results: Optional[int] = None) -> List[Dict]:
+        """
+        バッチ検索を実行（最大 max_concurrency 個のリクエストを同時に送信）
+
+        Args:
+            folder_ids: 検索対象フォルダIDのリスト
+            search_conditions: 検索条件、またはクエリプランナーで分割した条件のリスト
+            max_results: 最大件数（None なら SEARCH_MAX_RESULTS、0 以下は無制限）
+
+        Returns:
+            検索結果のリスト（フォルダIDの順序どおり、ファイルIDで重複除去済み）
+        """
+        if not folder_ids:
+            return []
+
+        max_results = max_results if max_results is not None else self.max_results
+        limited = bool(max_results and max_results > 0)
+        start_time = time.time()
+
+        groups, queries = self.query_builder._build_queries(folder_ids, search_conditions)
+        token = await sync_to_async(get_access_token)()
+        client = self.client or await get_async_http_client()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        state = {'found': 0}
+
+        async def run(query: str) -> List[Dict]:
+            files = []
+            page_token = None
+            while True:
+                # 件数の上限に達したら残りのページは取得しない
+                if limited and state['found'] >= max_results:
+                    return files
+                async with semaphore:
+                    response = await self._list_page(client, token, query, page_token)
+                page = response.get('files', [])
+                files.extend(page)
+                state['found'] += len(page)
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    return files
+
+        query_results = await asyncio.gather(*(run(query) for query in queries), return_exceptions=True)
+
+        results = {}
+        for query_idx, (group, files) in enumerate(zip(groups, query_results)):
+            if isinstance(files, Exception):
+                logger.error(f"Error in query {query_idx}: {files}")
+                continue
+            self.query_builder._assign_to_parents(group, files, results)
+
+        all_results = _dedupe_by_id(item for folder_id in folder_ids for item in results.get(folder_id, []))
+        if limited:
+            all_results = all_results[:max_results]
+
+        elapsed = time.time() - start_time
+        logger.info(f"Async search completed: {len(all_results)} results from {len(queries)} queries in {elapsed:.2f}s")
+
+        return all_results
+
+    async def _list_page(self, client, token: str, query: str, page_token: Optional[str]) -> Dict:
+        """
+        files.list の1ページを取得（レート制限・5xx は指数バックオフで再送）
+
+        Raises:
+            DriveRequestError: 再送しても回復しないエラーの場合
+        """
+        params = {
+            'q': query,
+            'fields': 'nextPageToken, files(id, name, mimeType, webViewLink, parents)',
+            'pageSize': self.page_size,
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        headers = {'Authorization': f'Bearer {token}'}
+
+        for attempt in range(self.max_retries + 1):
+            request_start = time.perf_counter()
+            try:
+                response = await client.get(DRIVE_FILES_URL, params=params, headers=headers)
+            except Exception as e:
+                # 接続エラー・タイムアウトは再送で回復しうる
+                status_code, message = None, str(e)
+            else:
+                if response.status_code == 200:
+                    DRIVE_BATCH_SECONDS.observe(time.perf_counter() - request_start, kind='async_search')
+                    return response.json()
+                status_code, message = response.status_code, response.text
+
+            retryable = status_code is None or status_code == 429 or status_code >= 500 or (
+                status_code == 403 and 'ateLimitExceeded' in message
+            )
+            DRIVE_SUBREQUEST_ERRORS.inc(kind='async_search', retryable=str(retryable).lower())
+            if not retryable or attempt >= self.max_retries:
+                raise DriveRequestError(status_code or 0, message[:200])
+
+            logger.warning(f"Retrying search request (attempt {attempt + 1}): {status_code or message}")
+            await asyncio.sleep(_backoff_delay(attempt))
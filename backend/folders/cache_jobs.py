@@ -0,0 +1,199 @@
+"""
+フォルダキャッシュのバックグラウンド更新: ジョブの登録・実行と、DBロックによるワーカー間の排他
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .cache_service import FolderCacheService, FolderListingCacheService, SearchResultCacheService
+from .drive_client import get_drive_service
+from .locks import acquire_lock, release_lock
+from .models import CacheJob
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = (CacheJob.STATUS_QUEUED, CacheJob.STATUS_RUNNING)
+
+
+def enqueue_refresh(root_folder_id: str, force: bool = False, service=None, run_in_process: Optional[bool] = None) -> CacheJob:
+    """
+    フォルダキャッシュの更新ジョブを登録（同じフォルダの未完了ジョブか、差分同期なら
+    CACHE_JOB_RETRY_SECONDS 以内に失敗したジョブがあればそれを返す）
+
+    CACHE_JOBS_RUN_IN_PROCESS が有効ならバックグラウンドスレッドで即座に実行し、
+    無効なら refresh_folder_cache --pending での実行を待つ
+
+    Args:
+        root_folder_id: ルートフォルダID
+        force: True の場合、差分同期せず全体を再構築
+        service: Google Drive API service instance（None ならスレッド内で取得）
+        run_in_process: バックグラウンドスレッドで実行するか（None なら CACHE_JOBS_RUN_IN_PROCESS）
+
+    Returns:
+        CacheJob
+    """
+    # ロックの期限を過ぎても終わっていないジョブは、ワーカーごと落ちたものとみなす
+    lock_seconds = getattr(settings, 'FOLDER_CACHE_LOCK_SECONDS', 1800)
+    active_jobs = CacheJob.objects.filter(
+        root_folder_id=root_folder_id,
+        status__in=ACTIVE_STATUSES,
+        created_at__gt=timezone.now() - timedelta(seconds=lock_seconds),
+    )
+    if force:
+        # 差分同期のジョブでは全体の再構築の代わりにならない
+        active_jobs = active_jobs.filter(force=True)
+    job = active_jobs.order_by('created_at').first()
+    if job is not None:
+        return job
+
+    if not force:
+        # 直前に失敗したフォルダは、リクエストのたびにジョブを登録し直さず一定時間待つ
+        retry_seconds = getattr(settings, 'CACHE_JOB_RETRY_SECONDS', 60)
+        job = CacheJob.objects.filter(
+            root_folder_id=root_folder_id,
+            status=CacheJob.STATUS_FAILED,
+            finished_at__gt=timezone.now() - timedelta(seconds=retry_seconds),
+        ).order_by('-finished_at').first()
+        if job is not None:
+            logger.info(f"Cache job {job.id} for {root_folder_id} failed recently, not retrying yet")
+            return job
+
+    job = CacheJob.objects.create(root_folder_id=root_folder_id, force=force)
+    logger.info(f"Queued cache job {job.id} for {root_folder_id} (force={force})")
+
+    if run_in_process is None:
+        run_in_process = getattr(settings, 'CACHE_JOBS_RUN_IN_PROCESS', True)
+    if run_in_process:
+        def run():
+            try:
+                run_job(job.id, service)
+            except Exception as e:
+                logger.error(f"Cache job {job.id} crashed: {e}")
+            finally:
+                connection.close()
+
+        threading.Thread(target=run, name=f'cache-job-{job.id}', daemon=True).start()
+
+    return job
+
+
+def run_pending_jobs(service=None) -> int:
+    """
+    未実行のジョブを登録順に実行
+
+    Returns:
+        実行したジョブ数
+    """
+    count = 0
+    for job_id in CacheJob.objects.filter(status=CacheJob.STATUS_QUEUED).order_by('created_at').values_list('id', flat=True):
+        run_job(job_id, service)
+        count += 1
+    return count
+
+
+def run_job(job_id, service=None) -> Optional[CacheJob]:
+    """
+    ジョブを実行（同じフォルダを別のワーカーが更新中なら、差分同期はスキップし、手動更新は終わるのを待つ）
+
+    Args:
+        job_id: ジョブID
+        service: Google Drive API service instance（None なら get_drive_service）
+
+    Returns:
+        実行後の CacheJob（既に他で実行済みなら None）
+    """
+    # 登録後に他のワーカーが拾っていないか確認しつつ、実行中に切り替える
+    started = CacheJob.objects.filter(id=job_id, status=CacheJob.STATUS_QUEUED).update(
+        status=CacheJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not started:
+        return None
+    job = CacheJob.objects.get(id=job_id)
+
+    lock_name = f'folder-cache:{job.root_folder_id}'
+    owner = f'{socket.gethostname()}:{os.getpid()}:{job.id}'
+    lock_seconds = getattr(settings, 'FOLDER_CACHE_LOCK_SECONDS', 1800)
+    if not acquire_lock(lock_name, owner, lock_seconds):
+        if not job.force:
+            logger.info(f"Skipping cache job {job.id}: {job.root_folder_id} is being refreshed by another worker")
+            return _finish(job, CacheJob.STATUS_SKIPPED, message='Another worker is refreshing this folder')
+
+        # 手動更新は差分同期の代わりにならないので、実行中の更新が終わってから再構築する
+        logger.info(f"Cache job {job.id} is waiting for the running refresh of {job.root_folder_id}")
+        CacheJob.objects.filter(id=job.id).update(message='Waiting for another refresh to finish')
+        if not _wait_for_lock(lock_name, owner, lock_seconds):
+            return _finish(job, CacheJob.STATUS_FAILED, message='Timed out waiting for another refresh to finish')
+
+    try:
+        service = service or get_drive_service()
+        cache_service = FolderCacheService(service)
+        cache_service.on_progress = lambda count: CacheJob.objects.filter(id=job.id).update(progress=count)
+
+        if job.force:
+            folder_ids = cache_service.build_folder_cache(job.root_folder_id)
+            # 手動更新では古い検索結果と一覧も破棄
+            SearchResultCacheService().invalidate(job.root_folder_id)
+            FolderListingCacheService(service).invalidate()
+        else:
+            folder_ids = cache_service.refresh_folder_cache(job.root_folder_id)
+
+        return _finish(job, CacheJob.STATUS_SUCCEEDED, folder_count=len(folder_ids))
+    except Exception as e:
+        logger.error(f"Cache job {job.id} failed: {e}")
+        return _finish(job, CacheJob.STATUS_FAILED, message=str(e))
+    finally:
+        release_lock(lock_name, owner)
+        purge_finished_jobs()
+
+
+def _wait_for_lock(lock_name: str, owner: str, lock_seconds: int) -> bool:
+    """
+    ロックが空くまで待って取得（保持者が落ちていてもロックの期限で取得できる）
+
+    Returns:
+        取得できた場合 True
+    """
+    poll_seconds = getattr(settings, 'SINGLE_FLIGHT_POLL_SECONDS', 0.5)
+    deadline = time.monotonic() + lock_seconds + poll_seconds
+    while time.monotonic() < deadline:
+        time.sleep(poll_seconds)
+        if acquire_lock(lock_name, owner, lock_seconds):
+            return True
+    return False
+
+
+def purge_finished_jobs() -> int:
+    """
+    CACHE_JOB_RETENTION_DAYS より前に終わったジョブを削除
+
+    Returns:
+        削除したジョブ数
+    """
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'CACHE_JOB_RETENTION_DAYS', 7))
+    try:
+        deleted, _ = CacheJob.objects.exclude(status__in=ACTIVE_STATUSES).filter(finished_at__lt=cutoff).delete()
+    except Exception as e:
+        logger.warning(f"Failed to purge finished cache jobs: {e}")
+        return 0
+    if deleted:
+        logger.info(f"Purged {deleted} finished cache jobs")
+    return deleted
+
+
+def _finish(job: CacheJob, status: str, message: str = '', folder_count: Optional[int] = None) -> CacheJob:
+    job.status = status
+    job.message = message
+    job.finished_at = timezone.now()
+    fields = ['status', 'message', 'finished_at']
+    if folder_count is not None:
+        job.folder_count = job.progress = folder_count
+        fields += ['folder_count', 'progress']
+    job.save(update_fields=fields)
+    return job
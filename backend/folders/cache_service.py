@@ -1,23 +1,98 @@
 """
-キャッシュサービス: フォルダ構造のキャッシュとバッチ検索を管理
+キャッシュサービス: フォルダ構造のキャッシュ・検索結果キャッシュとバッチ検索を管理
 """
+import hashlib
+import json
 import logging
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from collections import deque
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Union
+from urllib.parse import quote
 from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
-from googleapiclient.http import BatchHttpRequest
-from .models import FolderCache
+from googleapiclient.errors import HttpError
+from search.synonyms import synonym_dict
+from .drive_client import authorized_http_for
+from .file_index import FileIndexService, PDF_MIME_TYPE
+from .locks import folder_cache_flight
+from .metrics import CACHE_REQUESTS, DRIVE_BATCH_SECONDS, DRIVE_SUBREQUEST_ERRORS
+from .models import FolderCache, SearchResultCache, DriveSyncState, FolderListingCache
+from .suggest import mark_changed as mark_suggest_index_changed
+from .tiered_cache import TieredCache, write_behind
 
 
 logger = logging.getLogger(__name__)
 
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+def _is_rate_limited(error) -> bool:
+    """
+    レート制限エラー（429 / 403 rateLimitExceeded）かどうかを判定
+    """
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and b'ateLimitExceeded' in (error.content or b'')
+
+
+def _is_retryable(error) -> bool:
+    """
+    再送で回復しうるエラー（レート制限 / 5xx）かどうかを判定
+    """
+    if _is_rate_limited(error):
+        return True
+    return isinstance(error, HttpError) and error.resp.status >= 500
+
+
+def _backoff_delay(attempt: int) -> float:
+    """
+    指数バックオフ（ジッター付き）の待ち時間（秒）
+
+    Args:
+        attempt: 0始まりのリトライ回数
+    """
+    base = getattr(settings, 'DRIVE_API_BACKOFF_SECONDS', 1.0)
+    return base * (2 ** attempt) + random.uniform(0, base)
+
+
+def _backoff(attempt: int):
+    """
+    指数バックオフ（ジッター付き）で待機
+
+    Args:
+        attempt: 0始まりのリトライ回数
+    """
+    time.sleep(_backoff_delay(attempt))
+
+
+def _dedupe_by_id(items, seen: Optional[set] = None) -> List[Dict]:
+    """
+    ファイルIDで重複を除く（先に出現したものを残す）
+
+    Args:
+        items: 検索結果
+        seen: これまでに出力したファイルIDの集合（更新される）
+    """
+    seen = set() if seen is None else seen
+    unique = []
+    for item in items:
+        if item['id'] not in seen:
+            seen.add(item['id'])
+            unique.append(item)
+    return unique
+
 
 class FolderCacheService:
     """フォルダ構造のキャッシュ管理サービス"""
 
+    # ルートフォルダID → 配下のフォルダIDのリスト（鮮度の期限まで DB を読まずに返す）
+    _folder_ids_cache = TieredCache('folder_ids')
+
     def __init__(self, service):
         """
         Args:
@@ -25,6 +100,17 @@ class FolderCacheService:
         """
         self.service = service
         self.max_age_hours = getattr(settings, 'FOLDER_CACHE_MAX_AGE_HOURS', 24)
+        self.crawl_concurrency = max(1, getattr(settings, 'FOLDER_CACHE_CRAWL_CONCURRENCY', 4))
+        self.max_retries = getattr(settings, 'DRIVE_API_MAX_RETRIES', 5)
+        self.batch_size = 100  # Google API制限
+        self.write_batch_size = getattr(settings, 'FOLDER_CACHE_WRITE_BATCH_SIZE', 500)
+        self.incremental_sync = getattr(settings, 'FOLDER_CACHE_INCREMENTAL_SYNC', True)
+        self.sync_interval_minutes = getattr(settings, 'FOLDER_CACHE_SYNC_INTERVAL_MINUTES', 5)
+        self.index_files = getattr(settings, 'ENABLE_FILE_INDEX', True)
+        self.stale_while_revalidate = getattr(settings, 'FOLDER_CACHE_STALE_WHILE_REVALIDATE', True)
+        self.file_index = FileIndexService()
+        # クロールの進捗（見つかったフォルダ数）を受け取るコールバック
+        self.on_progress = None
 
     def get_all_folder_ids(self, root_folder_id: str, force_refresh: bool = False) -> List[str]:
         """
@@ -37,22 +123,75 @@ class FolderCacheService:
         Returns:
             フォルダIDのリスト
         """
+        if force_refresh:
+            logger.info(f"Rebuilding folder cache for {root_folder_id}")
+            return self.build_folder_cache(root_folder_id)
+
+        folder_ids = self._folder_ids_cache.get(root_folder_id)
+        if folder_ids is not None:
+            CACHE_REQUESTS.inc(cache='folder_tree', result='hit')
+            return folder_ids
+
         # キャッシュの鮮度をチェック
-        cache_is_fresh = self._is_cache_fresh(root_folder_id)
+        fresh_until = self._fresh_until(root_folder_id)
+        folder_ids = self._get_cached_folder_ids(root_folder_id)
 
-        if not force_refresh and cache_is_fresh:
+        if fresh_until and folder_ids:
             logger.info(f"Using cached folder structure for {root_folder_id}")
-            folder_ids = self._get_cached_folder_ids(root_folder_id)
-            if folder_ids:
-                return folder_ids
+            CACHE_REQUESTS.inc(cache='folder_tree', result='hit')
+            self._folder_ids_cache.set(root_folder_id, folder_ids, (fresh_until - timezone.now()).total_seconds())
+            return folder_ids
+
+        # 古いキャッシュはそのまま返し、更新はバックグラウンドで行う
+        has_cache = FolderCache.objects.filter(folder_id=root_folder_id, is_active=True).exists()
+        if has_cache and folder_ids and self.stale_while_revalidate:
+            from .cache_jobs import enqueue_refresh  # 循環インポート回避
+            job = enqueue_refresh(root_folder_id)
+            logger.info(f"Serving stale folder cache for {root_folder_id}, refreshing in job {job.id}")
+            CACHE_REQUESTS.inc(cache='folder_tree', result='stale')
+            return folder_ids
+
+        CACHE_REQUESTS.inc(cache='folder_tree', result='miss')
+        # 同時に来たリクエスト（他のワーカーの更新ジョブを含む）で再構築を1回にまとめる
+        return folder_cache_flight.do(
+            f'folder-cache:{root_folder_id}',
+            lambda: self.refresh_folder_cache(root_folder_id),
+            lookup=lambda: self._get_cached_folder_ids(root_folder_id) if self._is_cache_fresh(root_folder_id) else None,
+            lock_seconds=getattr(settings, 'FOLDER_CACHE_LOCK_SECONDS', 1800),
+            # 再構築が長引いている間は、古いキャッシュがあればそれを返す
+            fallback=lambda: self._get_cached_folder_ids(root_folder_id) if has_cache else None,
+        )
+
+    def refresh_folder_cache(self, root_folder_id: str) -> List[str]:
+        """
+        フォルダキャッシュを更新（差分同期が可能なら変更分だけ、そうでなければ再構築）
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            フォルダIDのリスト
+        """
+        # 差分同期が可能なら変更分だけ反映（同期トークンが無効なら内部で再構築）
+        if self._can_sync_incrementally(root_folder_id):
+            logger.info(f"Syncing folder cache changes for {root_folder_id}")
+            return self.sync_folder_cache(root_folder_id)
 
         # キャッシュが古いか存在しない場合、再構築
         logger.info(f"Rebuilding folder cache for {root_folder_id}")
         return self.build_folder_cache(root_folder_id)
 
+    def _can_sync_incrementally(self, root_folder_id: str) -> bool:
+        """
+        差分同期モードが有効で、同期トークンが保存済みかチェック
+        """
+        if not self.incremental_sync:
+            return False
+        return DriveSyncState.objects.filter(root_folder_id=root_folder_id).exists()
+
     def _is_cache_fresh(self, root_folder_id: str) -> bool:
         """
-        キャッシュが新鮮かチェック
+        キャッシュが新鮮かチェック（差分同期が可能な場合は同期間隔で判定）
 
         Args:
             root_folder_id: ルートフォルダID
@@ -60,16 +199,32 @@ class FolderCacheService:
         Returns:
             True if cache is fresh, False otherwise
         """
+        return self._fresh_until(root_folder_id) is not None
+
+    def _fresh_until(self, root_folder_id: str) -> Optional[datetime]:
+        """
+        キャッシュが新鮮である期限を取得
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            期限（キャッシュがない・既に古い場合は None）
+        """
         try:
             root_cache = FolderCache.objects.filter(folder_id=root_folder_id).first()
             if not root_cache:
-                return False
+                return None
 
-            age_threshold = timezone.now() - timedelta(hours=self.max_age_hours)
-            return root_cache.last_updated > age_threshold
+            if self._can_sync_incrementally(root_folder_id):
+                max_age = timedelta(minutes=self.sync_interval_minutes)
+            else:
+                max_age = timedelta(hours=self.max_age_hours)
+            fresh_until = root_cache.last_updated + max_age
+            return fresh_until if fresh_until > timezone.now() else None
         except Exception as e:
             logger.error(f"Error checking cache freshness: {e}")
-            return False
+            return None
 
     def _get_cached_folder_ids(self, root_folder_id: str) -> List[str]:
         """
@@ -82,14 +237,17 @@ class FolderCacheService:
             フォルダIDのリスト
         """
         try:
-            # ルートを含むすべてのフォルダを取得
-            folders = FolderCache.objects.filter(is_active=True).values_list('folder_id', flat=True)
-            folder_ids = list(folders)
+            # ツリーインデックスでルート配下のフォルダだけを取得
+            tree_path = FolderCache.objects.filter(folder_id=root_folder_id).values_list('tree_path', flat=True).first()
+            folder_ids = []
+            if tree_path:
+                folders = self._subtree(tree_path).filter(is_active=True).order_by('tree_path')
+                folder_ids = list(folders.values_list('folder_id', flat=True))
 
             if root_folder_id not in folder_ids:
                 folder_ids.insert(0, root_folder_id)
 
-            logger.info(f"Retrieved {len(folder_ids)} folders from cache")
+            logger.info(f"Retrieved {len(folder_ids)} folders under {root_folder_id} from cache")
             return folder_ids
         except Exception as e:
             logger.error(f"Error retrieving cached folder IDs: {e}")
@@ -97,7 +255,7 @@ class FolderCacheService:
 
     def build_folder_cache(self, root_folder_id: str) -> List[str]:
         """
-        BFSトラバーサルでフォルダキャッシュを構築
+        階層ごとの並列BFSでフォルダキャッシュを構築
 
         Args:
             root_folder_id: ルートフォルダID
@@ -106,60 +264,35 @@ class FolderCacheService:
             フォルダIDのリスト
         """
         start_time = time.time()
-        all_folder_ids = []
 
         try:
-            # BFS (Breadth-First Search) でフォルダツリーをトラバース
-            queue = deque([(root_folder_id, None, "Root")])
-            visited = set()
-
-            while queue:
-                folder_id, parent_id, folder_name = queue.popleft()
+            # クロール中の変更を取りこぼさないよう、クロール前に同期トークンを取得
+            start_page_token = self._get_start_page_token()
+            folders, files, failed = self._crawl_folder_tree(root_folder_id)
 
-                if folder_id in visited:
-                    continue
+            if root_folder_id in failed:
+                # ルート直下も取得できなかった場合は、キャッシュを書き換えない
+                logger.error(f"Could not list {root_folder_id}, keeping the cached folder tree")
+                return self._get_cached_folder_ids(root_folder_id)
 
-                visited.add(folder_id)
-                all_folder_ids.append(folder_id)
-
-                # キャッシュに保存
-                try:
-                    FolderCache.objects.update_or_create(
-                        folder_id=folder_id,
-                        defaults={
-                            'parent_id': parent_id,
-                            'name': folder_name,
-                            'path': f"/{folder_name}",  # 簡易パス
-                            'is_active': True
-                        }
+            # キャッシュに一括保存
+            all_folder_ids = [folder['id'] for folder in folders]
+            try:
+                all_folder_ids = self._save_folder_tree(root_folder_id, folders, files, failed)
+                if failed:
+                    # 一部の配下が欠けたクロールの時点から差分同期すると、欠けた分が戻らない
+                    logger.warning(f"Not saving the sync token of {root_folder_id}: {len(failed)} folders could not be listed")
+                elif start_page_token:
+                    DriveSyncState.objects.update_or_create(
+                        root_folder_id=root_folder_id,
+                        defaults={'start_page_token': start_page_token}
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to cache folder {folder_id}: {e}")
-
-                # サブフォルダを取得
-                try:
-                    query = f"'{folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-                    page_token = None
-
-                    while True:
-                        results = self.service.files().list(
-                            q=query,
-                            fields="nextPageToken, files(id, name)",
-                            pageSize=1000,
-                            pageToken=page_token
-                        ).execute()
-
-                        subfolders = results.get('files', [])
-                        for subfolder in subfolders:
-                            queue.append((subfolder['id'], folder_id, subfolder['name']))
-
-                        page_token = results.get('nextPageToken')
-                        if not page_token:
-                            break
-
-                except Exception as e:
-                    logger.error(f"Error listing subfolders of {folder_id}: {e}")
-                    continue
+            except Exception as e:
+                logger.error(f"Failed to cache folder tree of {root_folder_id}: {e}")
+
+            if failed:
+                # 一覧を取得できなかったフォルダの配下はキャッシュに残した分を含める
+                all_folder_ids = self._get_cached_folder_ids(root_folder_id)
 
             elapsed = time.time() - start_time
             logger.info(f"Built folder cache: {len(all_folder_ids)} folders in {elapsed:.2f}s")
@@ -171,22 +304,797 @@ class FolderCacheService:
             # フォールバック: 最低限ルートフォルダを返す
             return [root_folder_id]
 
-    def invalidate_cache(self, root_folder_id: Optional[str] = None):
+    def _save_folder_tree(self, root_folder_id: str, folders: List[Dict], files: List[Dict], failed=()) -> List[str]:
+        """
+        メモリ上で組み立てたフォルダツリー（とファイルインデックス）を1トランザクションで一括upsertし、
+        ツリーから消えたフォルダ・ファイルを is_active=False にする
+
+        一覧を取得できなかったフォルダの配下は、消えたのか分からないのでキャッシュの内容を残す
+
+        Args:
+            root_folder_id: ルートフォルダID
+            folders: フォルダ情報（id, parent_id, name）のリスト
+            files: ファイル情報（id, name, mimeType, webViewLink, parent_id）のリスト
+            failed: 一覧を取得できなかったフォルダIDの集合
+
+        Returns:
+            保存したフォルダIDのリスト（BFS順）
+        """
+        tree = self._assemble_tree(root_folder_id, {folder['id']: folder for folder in folders})
+        kept_tree_paths = self._get_cached_tree_paths(failed)
+        removed_ids = self._get_cached_subtree_ids(root_folder_id) - tree.keys()
+        for tree_path in kept_tree_paths:
+            removed_ids -= set(self._subtree(tree_path).values_list('folder_id', flat=True))
+
+        with transaction.atomic():
+            self._write_folder_rows(list(tree.values()), removed_ids)
+            if self.index_files:
+                self.file_index.replace_subtree(root_folder_id, tree, files, kept_tree_paths)
+        return list(tree)
+
+    def _assemble_tree(self, root_folder_id: str, folders: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        ルートから辿れるフォルダをBFS順に並べ、表示用の完全パスと祖先IDの経路を付与
+
+        Args:
+            root_folder_id: ルートフォルダID
+            folders: フォルダID → フォルダ情報（id, parent_id, name）
+
+        Returns:
+            BFS順のフォルダID → フォルダ情報（path, tree_path 付き）。祖先IDの経路がカラムの長さを
+            超える（階層が深すぎる）フォルダとその配下は含まない
+        """
+        max_length = FolderCache._meta.get_field('tree_path').max_length
+        children = {}
+        for folder in folders.values():
+            children.setdefault(folder['parent_id'], []).append(folder['id'])
+
+        root = folders[root_folder_id]
+        tree = {root_folder_id: {
+            **root,
+            'path': root.get('path') or f"/{root['name']}",
+            'tree_path': root.get('tree_path') or f"/{root_folder_id}/",
+        }}
+        queue = [root_folder_id]
+        for parent_id in queue:
+            parent = tree[parent_id]
+            for child_id in children.get(parent_id, []):
+                if child_id in tree:
+                    continue
+                tree_path = f"{parent['tree_path']}{child_id}/"
+                # 切り詰めて保存すると配下の範囲検索が壊れるため、この枝だけ保存しない
+                if len(tree_path) > max_length:
+                    logger.warning(
+                        f"Skipping folder {child_id} and its subfolders: it is {tree_path.count('/') - 1} levels deep "
+                        f"and its tree path ({len(tree_path)} chars) exceeds {max_length} chars"
+                    )
+                    continue
+                tree[child_id] = {
+                    **folders[child_id],
+                    'path': f"{parent['path']}/{folders[child_id]['name']}",
+                    'tree_path': tree_path,
+                }
+                queue.append(child_id)
+        return tree
+
+    def _write_folder_rows(self, folders: List[Dict], removed_ids):
+        """
+        フォルダ行のチャンク単位upsertと削除済みフォルダの無効化を1トランザクションで実行
+
+        Args:
+            folders: 保存するフォルダ情報（id, parent_id, name, path, tree_path）のリスト
+            removed_ids: 無効化するフォルダIDの集合
+        """
+        rows = [
+            FolderCache(
+                folder_id=folder['id'],
+                parent_id=folder['parent_id'],
+                name=folder['name'],
+                path=folder['path'],
+                tree_path=folder['tree_path'],
+                is_active=True,
+            )
+            for folder in folders
+        ]
+        removed_ids = list(removed_ids)
+
+        # MySQL は衝突対象カラムの指定をサポートしない
+        unique_fields = ['folder_id'] if connection.features.supports_update_conflicts_with_target else None
+
+        with transaction.atomic():
+            FolderCache.objects.bulk_create(
+                rows,
+                batch_size=self.write_batch_size,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=['parent_id', 'name', 'path', 'tree_path', 'is_active', 'last_updated'],
+            )
+            # 更新日時も進める（入力候補のインデックスが差分を検出できるように）
+            for i in range(0, len(removed_ids), self.write_batch_size):
+                FolderCache.objects.filter(
+                    folder_id__in=removed_ids[i:i+self.write_batch_size]
+                ).update(is_active=False, last_updated=timezone.now())
+
+        # 全ワーカーのフォルダIDのキャッシュを無効化し、入力候補のインデックスに反映を促す
+        self._folder_ids_cache.clear()
+        transaction.on_commit(mark_suggest_index_changed)
+        logger.info(f"Saved {len(rows)} folders, deactivated {len(removed_ids)} removed folders")
+
+    def _get_cached_subtree_ids(self, root_folder_id: str) -> set:
+        """
+        キャッシュ上でルート配下にある有効なフォルダIDを取得
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            ルートを含むフォルダIDの集合
+        """
+        tree_path = FolderCache.objects.filter(folder_id=root_folder_id).values_list('tree_path', flat=True).first()
+        if not tree_path:
+            return {root_folder_id}
+        return set(self._subtree(tree_path).filter(is_active=True).values_list('folder_id', flat=True)) | {root_folder_id}
+
+    @staticmethod
+    def _get_cached_tree_paths(folder_ids) -> List[str]:
+        """
+        キャッシュ上の有効なフォルダの経路を取得
+
+        Args:
+            folder_ids: フォルダIDの集合
+
+        Returns:
+            経路のリスト（キャッシュにないフォルダは含まない）
+        """
+        if not folder_ids:
+            return []
+        return list(FolderCache.objects.filter(
+            folder_id__in=list(folder_ids), is_active=True
+        ).exclude(tree_path='').values_list('tree_path', flat=True))
+
+    @staticmethod
+    def _subtree(tree_path: str):
+        """
+        祖先IDの経路が tree_path で始まる行（自身と全子孫）を1回のインデックス範囲検索で取得
+
+        Args:
+            tree_path: 基点フォルダの経路（末尾は "/"）
+
+        Returns:
+            FolderCache の QuerySet
+        """
+        # "/a/b/" で始まる文字列は "/a/b/" 以上 "/a/b0" 未満（"0" は "/" の次の文字）
+        return FolderCache.objects.filter(tree_path__gte=tree_path, tree_path__lt=tree_path[:-1] + '0')
+
+    def _get_root_node(self, root_folder_id: str) -> Dict:
+        """
+        ルートフォルダのノード情報を取得（上位ツリーのキャッシュに含まれる場合はその位置を引き継ぐ）
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            フォルダ情報（id, parent_id, name, path, tree_path）
+        """
+        row = FolderCache.objects.filter(folder_id=root_folder_id).values('parent_id', 'name', 'path', 'tree_path').first()
+        if row and row['tree_path']:
+            return {'id': root_folder_id, **row}
+        return {'id': root_folder_id, 'parent_id': None, 'name': "Root", 'path': "/Root", 'tree_path': f"/{root_folder_id}/"}
+
+    def _crawl_folder_tree(self, root_folder_id: str) -> Tuple[List[Dict], List[Dict], set]:
+        """
+        BFSでフォルダツリーをトラバース（各階層の親フォルダをまとめて並列に一覧取得）
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            (BFS順のフォルダ情報のリスト, ファイル情報のリスト, 一覧を取得できなかったフォルダIDの集合) のタプル
+        """
+        folders = {root_folder_id: self._get_root_node(root_folder_id)}
+        files = []
+        failed = self._crawl_levels([root_folder_id], folders, files)
+        return list(folders.values()), files, failed
+
+    def _crawl_levels(self, level: List[str], folders: Dict[str, Dict], files: List[Dict]) -> set:
+        """
+        指定フォルダから下位の階層を1段ずつクロールし、見つかったフォルダを folders に、
+        PDFを files に追加
+
+        Args:
+            level: クロールを開始するフォルダIDのリスト
+            folders: フォルダID → フォルダ情報（クロール結果で更新される）
+            files: ファイル情報のリスト（クロール結果で更新される）
+
+        Returns:
+            一覧を取得しきれなかった（配下が不完全な）フォルダIDの集合
+        """
+        depth = 0
+        failed = set()
+
+        while level:
+            next_level = []
+            children, level_failed = self._list_children(level)
+            failed |= level_failed
+            for parent_id, item in children:
+                if item.get('mimeType', FOLDER_MIME_TYPE) != FOLDER_MIME_TYPE:
+                    files.append({**item, 'parent_id': parent_id})
+                    continue
+
+                subfolder = item
+                if subfolder['id'] in folders:
+                    continue
+                folders[subfolder['id']] = {
+                    'id': subfolder['id'],
+                    'parent_id': parent_id,
+                    'name': subfolder['name'],
+                }
+                next_level.append(subfolder['id'])
+
+            depth += 1
+            logger.debug(f"Crawled depth {depth}: {len(level)} parents, {len(next_level)} subfolders")
+            if self.on_progress:
+                self.on_progress(len(folders))
+            level = next_level
+
+        if failed:
+            logger.warning(f"Could not list {len(failed)} folders, their subtrees are incomplete")
+        return failed
+
+    def _list_children(self, parent_ids: List[str]) -> Tuple[List[Tuple[str, Dict]], set]:
+        """
+        複数の親フォルダのサブフォルダ（とインデックス対象のPDF）を、
+        100件単位のバッチリクエストを並列実行して取得（一時的なエラーは指数バックオフで再送）
+
+        Args:
+            parent_ids: 親フォルダIDのリスト
+
+        Returns:
+            ((親フォルダID, サブフォルダ/ファイル情報) のリスト, 再送しても一覧を取得できなかった親フォルダIDの集合) のタプル
+        """
+        found = []
+        failed = set()
+        pending = [(parent_id, None) for parent_id in parent_ids]
+        attempt = 0
+
+        with ThreadPoolExecutor(max_workers=self.crawl_concurrency) as executor:
+            while pending:
+                chunks = [pending[i:i+self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                pending = []
+                retry = []
+
+                for children, next_pages, retryable, errors in executor.map(self._list_children_batch, chunks):
+                    found.extend(children)
+                    pending.extend(next_pages)
+                    retry.extend(retryable)
+                    failed.update(errors)
+
+                if retry:
+                    if attempt >= self.max_retries:
+                        logger.error(f"Giving up listing {len(retry)} folders after {attempt} retries")
+                        failed.update(parent_id for parent_id, _ in retry)
+                    else:
+                        logger.warning(f"Transient errors on {len(retry)} folder listings, retrying (attempt {attempt + 1})")
+                        _backoff(attempt)
+                        attempt += 1
+                        pending.extend(retry)
+
+        return found, failed
+
+    def _list_children_batch(self, chunk: List[Tuple[str, Optional[str]]]):
+        """
+        単一のバッチリクエストで子要素一覧の1ページを取得
+
+        Args:
+            chunk: (親フォルダID, ページトークン) のリスト（最大100件）
+
+        Returns:
+            (子要素, 次ページの (親ID, トークン), 再送する (親ID, トークン), 失敗した親ID) のタプル
+        """
+        children = []
+        next_pages = []
+        retry = []
+        failed = []
+
+        def callback(request_id, response, exception):
+            """バッチリクエストのコールバック"""
+            parent_id, page_token = chunk[int(request_id)]
+            if exception:
+                retryable = _is_retryable(exception)
+                DRIVE_SUBREQUEST_ERRORS.inc(kind='crawl', retryable=str(retryable).lower())
+                if retryable:
+                    retry.append((parent_id, page_token))
+                else:
+                    logger.error(f"Error listing subfolders of {parent_id}: {exception}")
+                    failed.append(parent_id)
+                return
+
+            for item in response.get('files', []):
+                children.append((parent_id, item))
+            if response.get('nextPageToken'):
+                next_pages.append((parent_id, response['nextPageToken']))
+
+        if self.index_files:
+            mime_condition = f"(mimeType = '{FOLDER_MIME_TYPE}' or mimeType = '{PDF_MIME_TYPE}')"
+            fields = "nextPageToken, files(id, name, mimeType, webViewLink)"
+        else:
+            mime_condition = f"mimeType = '{FOLDER_MIME_TYPE}'"
+            fields = "nextPageToken, files(id, name)"
+
+        batch = self.service.new_batch_http_request()
+        for index, (parent_id, page_token) in enumerate(chunk):
+            query = f"'{parent_id}' in parents and {mime_condition} and trashed = false"
+            batch.add(
+                self.service.files().list(
+                    q=query,
+                    fields=fields,
+                    pageSize=1000,
+                    pageToken=page_token
+                ),
+                callback=callback,
+                request_id=str(index)
+            )
+
+        batch_start = time.perf_counter()
+        try:
+            batch.execute(http=authorized_http_for(self.service))
+        except Exception as e:
+            if _is_retryable(e):
+                return [], [], list(chunk), []
+            logger.error(f"Error executing folder listing batch: {e}")
+            return [], [], [], [parent_id for parent_id, _ in chunk]
+        finally:
+            DRIVE_BATCH_SECONDS.observe(time.perf_counter() - batch_start, kind='crawl')
+
+        return children, next_pages, retry, failed
+
+    def _get_start_page_token(self) -> Optional[str]:
+        """
+        Changes API の現在の同期トークンを取得
+
+        Returns:
+            startPageToken（取得できない場合は None）
+        """
+        try:
+            return self.service.changes().getStartPageToken().execute().get('startPageToken')
+        except Exception as e:
+            logger.warning(f"Failed to get start page token: {e}")
+            return None
+
+    def sync_folder_cache(self, root_folder_id: str) -> List[str]:
+        """
+        Changes API の差分（追加・名前変更・移動・ゴミ箱）をフォルダキャッシュに反映
+
+        同期トークンが未保存または無効な場合は全体を再構築する
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            フォルダIDのリスト
+        """
+        state = DriveSyncState.objects.filter(root_folder_id=root_folder_id).first()
+        if state is None:
+            return self.build_folder_cache(root_folder_id)
+
+        start_time = time.time()
+        try:
+            changes, new_start_page_token = self._list_changes(state.start_page_token)
+        except HttpError as e:
+            if e.resp.status in (400, 404, 410):
+                logger.warning(f"Sync token for {root_folder_id} is invalid, rebuilding: {e}")
+                state.delete()
+                return self.build_folder_cache(root_folder_id)
+            logger.error(f"Error listing changes for {root_folder_id}: {e}")
+            return self._get_cached_folder_ids(root_folder_id)
+
+        try:
+            self._apply_changes(root_folder_id, changes)
+            state.start_page_token = new_start_page_token
+            state.save()
+            # 鮮度判定用にルートの更新日時を進める
+            FolderCache.objects.filter(folder_id=root_folder_id).update(last_updated=timezone.now())
+        except Exception as e:
+            logger.error(f"Error applying changes for {root_folder_id}: {e}")
+
+        elapsed = time.time() - start_time
+        logger.info(f"Synced {len(changes)} changes for {root_folder_id} in {elapsed:.2f}s")
+
+        return self._get_cached_folder_ids(root_folder_id)
+
+    def _list_changes(self, page_token: str) -> Tuple[List[Dict], str]:
+        """
+        同期トークン以降の変更をすべて取得
+
+        Args:
+            page_token: 保存済みの同期トークン
+
+        Returns:
+            (変更のリスト, 次回用の newStartPageToken) のタプル
+        """
+        changes = []
+        attempt = 0
+
+        while True:
+            try:
+                response = self.service.changes().list(
+                    pageToken=page_token,
+                    fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, parents, trashed, webViewLink))",
+                    pageSize=1000,
+                    includeRemoved=True
+                ).execute()
+            except HttpError as e:
+                if not _is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                _backoff(attempt)
+                attempt += 1
+                continue
+
+            changes.extend(response.get('changes', []))
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+    def _apply_changes(self, root_folder_id: str, changes: List[Dict]):
+        """
+        変更をメモリ上のツリーに適用し、差分のある行だけを保存
+
+        Args:
+            root_folder_id: ルートフォルダID
+            changes: Changes API の変更リスト
+        """
+        root = self._get_root_node(root_folder_id)
+        current = {
+            row['folder_id']: {
+                'id': row['folder_id'],
+                'parent_id': row['parent_id'],
+                'name': row['name'],
+                'path': row['path'],
+                'tree_path': row['tree_path'],
+            }
+            for row in self._subtree(root['tree_path']).filter(is_active=True).values(
+                'folder_id', 'parent_id', 'name', 'path', 'tree_path'
+            )
+        }
+        current[root_folder_id] = root
+
+        folders = {folder_id: dict(folder) for folder_id, folder in current.items()}
+        changed_files = {}
+        removed_file_ids = set()
+        touched_folder_ids = set()
+        for change in changes:
+            file_id = change.get('fileId')
+            file = change.get('file') or {}
+            if file_id == root_folder_id:
+                continue
+
+            parents = file.get('parents') or [None]
+            # 変更があった要素の新旧の親フォルダ（と自身）の一覧キャッシュを破棄する
+            touched_folder_ids.update(parent for parent in parents if parent)
+            touched_folder_ids.add(file_id)
+            if file_id in folders:
+                touched_folder_ids.add(folders[file_id]['parent_id'])
+            if change.get('removed') or file.get('trashed'):
+                folders.pop(file_id, None)
+                changed_files.pop(file_id, None)
+                removed_file_ids.add(file_id)
+            elif file.get('mimeType') == FOLDER_MIME_TYPE:
+                folders[file_id] = {'id': file_id, 'parent_id': parents[0], 'name': file.get('name', '')}
+            elif file.get('mimeType') == PDF_MIME_TYPE:
+                changed_files[file_id] = {**file, 'parent_id': parents[0]}
+
+        # 移動・復元で新たにツリーへ入ったフォルダは配下を改めてクロール
+        tree = self._assemble_tree(root_folder_id, folders)
+        added_ids = [folder_id for folder_id in tree if folder_id not in current]
+        crawled_files = []
+        if added_ids:
+            failed = self._crawl_levels(added_ids, folders, crawled_files)
+            if failed:
+                # 同期トークンを進めず、次回の同期で同じ変更からやり直す
+                raise RuntimeError(f"Could not list {len(failed)} folders added to {root_folder_id}")
+            tree = self._assemble_tree(root_folder_id, folders)
+
+        changed = [
+            folder for folder_id, folder in tree.items()
+            if current.get(folder_id) != folder
+        ]
+        removed_ids = current.keys() - tree.keys()
+
+        with transaction.atomic():
+            self._write_folder_rows(changed, removed_ids)
+            if self.index_files:
+                self.file_index.deactivate_in_folders(removed_ids)
+                for folder in changed:
+                    previous = current.get(folder['id'])
+                    if previous and previous['tree_path'] != folder['tree_path']:
+                        self.file_index.move_folder_files(folder['id'], folder['tree_path'])
+                saved_ids = self.file_index.save_files(list(changed_files.values()) + crawled_files, tree)
+                # ツリー外へ移動したファイルも無効化
+                self.file_index.deactivate((removed_file_ids | changed_files.keys()) - saved_ids)
+
+        FolderListingCacheService(self.service).invalidate(touched_folder_ids | removed_ids)
+
+
+class FolderListingCacheService:
+    """フォルダ直下の一覧（ナビゲーション用）のキャッシュ管理サービス"""
+
+    def __init__(self, service):
+        """
+        Args:
+            service: Google Drive API service instance
+        """
+        self.service = service
+        self.ttl_seconds = getattr(settings, 'FOLDER_LISTING_CACHE_SECONDS', 60)
+
+    def get_listing(self, folder_id: str) -> Tuple[List[Dict], str]:
+        """
+        フォルダ直下の一覧を取得（キャッシュが有効ならDriveにアクセスしない）
+
+        Args:
+            folder_id: フォルダID
+
+        Returns:
+            (一覧のリスト, ETag) のタプル
+        """
+        now = timezone.now()
+        try:
+            entry = FolderListingCache.objects.filter(folder_id=folder_id, expires_at__gt=now).first()
+            if entry is not None:
+                CACHE_REQUESTS.inc(cache='folder_listing', result='hit')
+                return entry.items_json, entry.etag
+        except Exception as e:
+            logger.error(f"Error reading folder listing cache: {e}")
+
+        CACHE_REQUESTS.inc(cache='folder_listing', result='miss')
+        items = self._list_folder(folder_id)
+        etag = hashlib.sha256(json.dumps(items, sort_keys=True).encode('utf-8')).hexdigest()
+
+        try:
+            FolderListingCache.objects.update_or_create(
+                folder_id=folder_id,
+                defaults={
+                    'items_json': items,
+                    'etag': etag,
+                    'expires_at': now + timedelta(seconds=self.ttl_seconds),
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error writing folder listing cache: {e}")
+
+        return items, etag
+
+    def _list_folder(self, folder_id: str) -> List[Dict]:
+        """
+        フォルダ直下の要素をすべてのページにわたって取得
+
+        Args:
+            folder_id: フォルダID
+
+        Returns:
+            一覧のリスト（フォルダ優先・名前順）
+        """
+        items = []
+        page_token = None
+
+        while True:
+            results = self.service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                pageSize=1000,
+                fields="nextPageToken, files(id, name, mimeType, webViewLink)",
+                orderBy="folder,name",
+                pageToken=page_token
+            ).execute()
+
+            items.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return items
+
+    def invalidate(self, folder_ids=None):
+        """
+        一覧キャッシュを無効化
+
+        Args:
+            folder_ids: 無効化するフォルダIDのリスト（Noneなら全て）
+        """
+        try:
+            entries = FolderListingCache.objects.all()
+            if folder_ids is not None:
+                folder_ids = [folder_id for folder_id in folder_ids if folder_id]
+                if not folder_ids:
+                    return
+                entries = entries.filter(folder_id__in=folder_ids)
+            deleted, _ = entries.delete()
+            if deleted:
+                logger.info(f"Invalidated {deleted} cached folder listings")
+        except Exception as e:
+            logger.error(f"Error invalidating folder listing cache: {e}")
+
+
+class SearchResultCacheService:
+    """検索結果キャッシュの管理サービス（TTL + LRU退避）"""
+
+    # 期限切れ行のバックグラウンド削除はプロセス内で1本だけ走らせる
+    _purge_lock = threading.Lock()
+    _last_purge_at = 0.0
+    # DB の手前に置くプロセス内・ワーカー間共有のキャッシュ（キー → 検索結果）
+    _tiered_cache = TieredCache('search_result')
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'ENABLE_SEARCH_RESULT_CACHE', True)
+        self.ttl_minutes = getattr(settings, 'SEARCH_RESULT_CACHE_MINUTES', 30)
+        self.max_entries = getattr(settings, 'SEARCH_RESULT_CACHE_MAX_ENTRIES', 500)
+        self.purge_interval = getattr(settings, 'SEARCH_RESULT_CACHE_PURGE_SECONDS', 300)
+
+    @staticmethod
+    def normalize_query(query_text: str) -> str:
+        """
+        検索クエリを正規化（全角/半角・大文字小文字・語順・重複の違いを吸収）
+
+        Args:
+            query_text: ユーザー入力の検索クエリ
+
+        Returns:
+            正規化済みクエリ文字列
+        """
+        keywords = (query_text or '').replace('　', ' ').split()
+        normalized = {synonym_dict.normalize(keyword) for keyword in keywords}
+        return ' '.join(sorted(k for k in normalized if k))
+
+    def make_key(self, root_folder_id: str, query_text: str) -> str:
+        """
+        キャッシュキー（正規化クエリ + ルートフォルダIDのSHA-256）を生成
+        """
+        raw = f"{root_folder_id}:{self.normalize_query(query_text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, root_folder_id: str, query_text: str) -> Optional[List[Dict]]:
+        """
+        有効期限内のキャッシュ済み検索結果を取得
+
+        Args:
+            root_folder_id: ルートフォルダID
+            query_text: 検索クエリ
+
+        Returns:
+            検索結果のリスト（キャッシュなし/期限切れの場合は None）
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            key = self.make_key(root_folder_id, query_text)
+            results = self._tiered_cache.get(key)
+            if results is not None:
+                # どの層で見つかったかは search_result_l1 / search_result_l2 で分かる
+                CACHE_REQUESTS.inc(cache='search_result', result='hit')
+                return results
+
+            now = timezone.now()
+            entry = SearchResultCache.objects.filter(query_hash=key, expires_at__gt=now).first()
+            self._schedule_purge()
+            if entry is None:
+                CACHE_REQUESTS.inc(cache='search_result', result='miss')
+                return None
+
+            CACHE_REQUESTS.inc(cache='search_result', result='hit')
+            # LRU用に最終アクセス日時を更新
+            SearchResultCache.objects.filter(query_hash=key).update(last_accessed=now)
+            self._tiered_cache.set(key, entry.results_json, (entry.expires_at - now).total_seconds())
+            return entry.results_json
+        except Exception as e:
+            logger.error(f"Error reading search result cache: {e}")
+            return None
+
+    def set(self, root_folder_id: str, query_text: str, results: List[Dict]):
+        """
+        検索結果をキャッシュに保存し、上限を超えた分を退避
+
+        Args:
+            root_folder_id: ルートフォルダID
+            query_text: 検索クエリ
+            results: 検索結果のリスト
+        """
+        if not self.enabled:
+            return
+
+        key = self.make_key(root_folder_id, query_text)
+        self._tiered_cache.set(key, results, self.ttl_minutes * 60)
+        # DB への保存はレスポンスを待たせずに後から行う
+        write_behind.submit(lambda: self._save(key, root_folder_id, query_text, results), 'search result')
+
+    def _save(self, key: str, root_folder_id: str, query_text: str, results: List[Dict]):
+        """
+        検索結果を DB に保存し、上限を超えた分を退避
+        """
+        try:
+            now = timezone.now()
+            SearchResultCache.objects.update_or_create(
+                query_hash=key,
+                defaults={
+                    'query_text': self.normalize_query(query_text),
+                    'root_folder_id': root_folder_id,
+                    'results_json': results,
+                    'expires_at': now + timedelta(minutes=self.ttl_minutes),
+                    'last_accessed': now,
+                }
+            )
+            self._evict()
+        except Exception as e:
+            logger.error(f"Error writing search result cache: {e}")
+
+    def _evict(self):
+        """
+        件数上限を超えた場合、期限切れ → 最終アクセスが古い順に削除
+        """
+        excess = SearchResultCache.objects.count() - self.max_entries
+        if excess <= 0:
+            return
+
+        excess -= self.purge_expired()
+        if excess <= 0:
+            return
+
+        stale_keys = list(
+            SearchResultCache.objects.order_by('last_accessed').values_list('query_hash', flat=True)[:excess]
+        )
+        SearchResultCache.objects.filter(query_hash__in=stale_keys).delete()
+        logger.info(f"Evicted {len(stale_keys)} least recently used search results")
+
+    def purge_expired(self) -> int:
         """
-        キャッシュを無効化
+        期限切れのキャッシュ行を削除
+
+        Returns:
+            削除した件数
+        """
+        deleted, _ = SearchResultCache.objects.filter(expires_at__lte=timezone.now()).delete()
+        if deleted:
+            logger.info(f"Purged {deleted} expired search results")
+        return deleted
+
+    def _schedule_purge(self):
+        """
+        一定間隔ごとにバックグラウンドスレッドで期限切れ行を削除
+        """
+        cls = type(self)
+        if time.time() - cls._last_purge_at < self.purge_interval:
+            return
+        if not cls._purge_lock.acquire(blocking=False):
+            return
+
+        cls._last_purge_at = time.time()
+
+        def run():
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.error(f"Error purging search result cache: {e}")
+            finally:
+                connection.close()
+                cls._purge_lock.release()
+
+        threading.Thread(target=run, name='search-cache-purge', daemon=True).start()
+
+    def invalidate(self, root_folder_id: Optional[str] = None):
+        """
+        検索結果キャッシュを無効化
 
         Args:
-            root_folder_id: 特定のルートフォルダのキャッシュのみ無効化（Noneなら全て）
+            root_folder_id: 特定のルートフォルダの結果のみ無効化（Noneなら全て）
         """
         try:
+            # 保存待ちの古い結果が削除の後に書き込まれないよう、先に書き終える
+            write_behind.flush(timeout=10)
+            entries = SearchResultCache.objects.all()
             if root_folder_id:
-                FolderCache.objects.filter(folder_id=root_folder_id).update(is_active=False)
-                logger.info(f"Invalidated cache for folder {root_folder_id}")
-            else:
-                FolderCache.objects.all().update(is_active=False)
-                logger.info("Invalidated all folder caches")
+                entries = entries.filter(root_folder_id=root_folder_id)
+            deleted, _ = entries.delete()
+            # 共有キャッシュはキーからルートを辿れないので全体を無効化
+            self._tiered_cache.clear()
+            logger.info(f"Invalidated {deleted} cached search results")
         except Exception as e:
-            logger.error(f"Error invalidating cache: {e}")
+            logger.error(f"Error invalidating search result cache: {e}")
 
 
 class BatchSearchService:
@@ -199,82 +1107,307 @@ class BatchSearchService:
         """
         self.service = service
         self.batch_size = 100  # Google API制限
+        self.page_size = getattr(settings, 'SEARCH_PAGE_SIZE', 100)
+        self.max_in_flight = max(1, getattr(settings, 'SEARCH_MAX_IN_FLIGHT_BATCHES', 4))
+        self.max_retries = getattr(settings, 'DRIVE_API_MAX_RETRIES', 5)
+        self.max_results = getattr(settings, 'SEARCH_MAX_RESULTS', 0) or None
+        self.parents_per_query = max(1, getattr(settings, 'SEARCH_PARENTS_PER_QUERY', 50))
+        self.max_query_length = getattr(settings, 'DRIVE_QUERY_MAX_LENGTH', 6000)
 
-    def batch_search(self, folder_ids: List[str], search_conditions: str) -> List[Dict]:
+    def batch_search(self, folder_ids: List[str], search_conditions: Union[str, List[str]], max_results: Optional[int] = None) -> List[Dict]:
         """
-        バッチ検索を実行
+        バッチ検索を実行（最大 max_in_flight 個のバッチを並列に送信）
+
+        複数フォルダを "('a' in parents or 'b' in parents ...)" の1クエリにまとめ、
+        結果を親フォルダごとに振り分ける。nextPageToken が返ったクエリは、
+        後続のバッチで次ページをまとめて取得する
 
         Args:
             folder_ids: 検索対象フォルダIDのリスト
-            search_conditions: 検索条件（name contains 'keyword' など）
+            search_conditions: 検索条件（name contains 'keyword' など）、またはクエリプランナーで分割した条件のリスト
+            max_results: 最大件数（None なら SEARCH_MAX_RESULTS、0 以下は無制限）
 
         Returns:
-            検索結果のリスト
+            検索結果のリスト（フォルダIDの順序どおり、ファイルIDで重複除去済み）
         """
         if not folder_ids:
             return []
 
+        max_results = max_results if max_results is not None else self.max_results
         start_time = time.time()
-        all_results = []
+        groups, queries = self._build_queries(folder_ids, search_conditions)
+        results = {}
+        found = 0
+        pending = [(group_idx, None) for group_idx in range(len(queries))]
+        stage = 0
 
-        # フォルダIDを100件ずつのチャンクに分割
-        folder_chunks = [folder_ids[i:i+self.batch_size] for i in range(0, len(folder_ids), self.batch_size)]
+        logger.info(f"Packed {len(folder_ids)} folders into {len(queries)} queries")
 
-        logger.info(f"Starting batch search across {len(folder_ids)} folders in {len(folder_chunks)} batches")
+        while pending:
+            stage += 1
+            stage_results, pending = self._execute_stage(pending, queries, stage)
+            for group_idx, files in stage_results:
+                self._assign_to_parents(groups[group_idx], files, results)
+                found += len(files)
 
-        for chunk_idx, chunk in enumerate(folder_chunks):
-            try:
-                chunk_results = self._execute_batch(chunk, search_conditions)
-                all_results.extend(chunk_results)
-                logger.debug(f"Batch {chunk_idx + 1}/{len(folder_chunks)}: found {len(chunk_results)} items")
-            except Exception as e:
-                logger.error(f"Error in batch {chunk_idx + 1}: {e}")
-                continue
+            if pending and max_results and max_results > 0 and found >= max_results:
+                logger.info(f"Reached {max_results} results, skipping {len(pending)} remaining pages")
+                break
+
+        all_results = _dedupe_by_id(item for folder_id in folder_ids for item in results.get(folder_id, []))
+        if max_results and max_results > 0:
+            all_results = all_results[:max_results]
 
         elapsed = time.time() - start_time
-        logger.info(f"Batch search completed: {len(all_results)} results in {elapsed:.2f}s")
+        logger.info(f"Batch search completed: {len(all_results)} results in {elapsed:.2f}s ({stage} stages)")
 
         return all_results
 
-    def _execute_batch(self, folder_ids: List[str], search_conditions: str) -> List[Dict]:
+    def iter_batch_search(self, folder_ids: List[str], search_conditions: Union[str, List[str]], max_results: Optional[int] = None):
+        """
+        バッチ検索を実行し、バッチが完了するたびにその結果を返すジェネレータ（ストリーミング用）
+
+        Args:
+            folder_ids: 検索対象フォルダIDのリスト
+            search_conditions: 検索条件（name contains 'keyword' など）、または分割した条件のリスト
+            max_results: 最大件数（None なら SEARCH_MAX_RESULTS、0 以下は無制限）
+
+        Yields:
+            完了したバッチの検索結果のリスト（完了順）
         """
-        単一のバッチリクエストを実行
+        if not folder_ids:
+            return
+
+        max_results = max_results if max_results is not None else self.max_results
+        limited = bool(max_results and max_results > 0)
+        groups, queries = self._build_queries(folder_ids, search_conditions)
+        pending = [(group_idx, None) for group_idx in range(len(queries))]
+        seen = set()
+        sent = 0
+        stage = 0
+
+        while pending:
+            stage += 1
+            next_pending = []
+            for _, results, next_pages in self._iter_stage(pending, queries, stage):
+                items = _dedupe_by_id((item for _, files in results for item in files), seen)
+                if limited:
+                    items = items[:max_results - sent]
+                sent += len(items)
+                next_pending.extend(next_pages)
+                yield items
+
+                if limited and sent >= max_results:
+                    return
+            pending = next_pending
+
+    def _build_queries(self, folder_ids: List[str], search_conditions: Union[str, List[str]]) -> Tuple[List[List[str]], List[str]]:
+        """
+        クエリ長の上限（URLエンコード後）とフォルダ数の上限に収まるよう、フォルダIDをまとめたクエリを作成
 
         Args:
-            folder_ids: フォルダIDのリスト（最大100件）
-            search_conditions: 検索条件
+            folder_ids: 検索対象フォルダIDのリスト
+            search_conditions: 検索条件、または条件のリスト（条件ごとにクエリを作成）
 
         Returns:
-            検索結果のリスト
+            (フォルダIDのグループのリスト, グループごとのクエリのリスト) のタプル
         """
-        results = []
-        batch = BatchHttpRequest()
+        if isinstance(search_conditions, str):
+            search_conditions = [search_conditions]
 
-        def callback(request_id, response, exception):
-            """バッチリクエストのコールバック"""
-            if exception:
-                logger.warning(f"Search error in folder {request_id}: {exception}")
-            else:
-                files = response.get('files', [])
-                results.extend(files)
+        groups = []
+        queries = []
+        for conditions in search_conditions:
+            condition_groups, condition_queries = self._build_condition_queries(folder_ids, conditions)
+            groups.extend(condition_groups)
+            queries.extend(condition_queries)
+        return groups, queries
 
-        # バッチにリクエストを追加
+    def _build_condition_queries(self, folder_ids: List[str], search_conditions: str) -> Tuple[List[List[str]], List[str]]:
+        """
+        1つの検索条件について、フォルダIDをまとめたクエリを作成
+        """
+        suffix = " and mimeType='application/pdf' and trashed=false"
+        if search_conditions:
+            suffix += f" and ({search_conditions})"
+
+        base_length = len(quote(f"(){suffix}"))
+        separator_length = len(quote(" or "))
+
+        groups = []
+        group = []
+        length = base_length
         for folder_id in folder_ids:
-            query = f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
-            if search_conditions:
-                query += f" and {search_conditions}"
+            clause_length = len(quote(f"'{folder_id}' in parents")) + (separator_length if group else 0)
+            if group and (len(group) >= self.parents_per_query or length + clause_length > self.max_query_length):
+                groups.append(group)
+                group = []
+                length = base_length
+                clause_length -= separator_length
+            group.append(folder_id)
+            length += clause_length
+        groups.append(group)
 
-            batch.add(
-                self.service.files().list(
-                    q=query,
-                    fields="files(id, name, mimeType, webViewLink)",
-                    pageSize=100
-                ),
-                callback=callback,
-                request_id=folder_id
+        queries = [
+            "(" + " or ".join(f"'{folder_id}' in parents" for folder_id in group) + ")" + suffix
+            for group in groups
+        ]
+        return groups, queries
+
+    @staticmethod
+    def _assign_to_parents(group: List[str], files: List[Dict], results: Dict[str, List[Dict]]):
+        """
+        まとめたクエリの結果を、グループ内の親フォルダごとに振り分ける
+
+        Args:
+            group: クエリにまとめたフォルダIDのリスト
+            files: クエリの検索結果
+            results: フォルダID → 検索結果（振り分け結果で更新される）
+        """
+        # 複数の親がグループ内にあるファイルは、フォルダごとに検索した場合と同じく先に検索するフォルダに振り分ける
+        positions = {folder_id: position for position, folder_id in enumerate(group)}
+        for file in files:
+            parent_id = min(
+                (parent for parent in file.get('parents', []) if parent in positions),
+                key=positions.get,
+                default=group[0],
             )
+            results.setdefault(parent_id, []).append(file)
+
+    def _execute_stage(self, requests: List[Tuple[int, Optional[str]]], queries: List[str], stage: int):
+        """
+        1ページ分のリクエスト群を100件ずつのバッチに分けて並列実行
+
+        Args:
+            requests: (クエリ番号, ページトークン) のリスト
+            queries: クエリのリスト
+            stage: 何段目のページ取得か（ログ用）
+
+        Returns:
+            ((クエリ番号, 検索結果) のリスト, 次ページの (クエリ番号, トークン) のリスト) のタプル
+        """
+        chunk_results = [([], []) for _ in range(0, len(requests), self.batch_size)]
+        for chunk_idx, results, next_pages in self._iter_stage(requests, queries, stage):
+            chunk_results[chunk_idx] = (results, next_pages)
+
+        # 完了順に依存しないよう、チャンク順に結合
+        stage_results = [result for results, _ in chunk_results for result in results]
+        next_pages = [page for _, pages in chunk_results for page in pages]
+        return stage_results, next_pages
 
-        # バッチを実行
-        batch.execute()
+    def _iter_stage(self, requests: List[Tuple[int, Optional[str]]], queries: List[str], stage: int):
+        """
+        リクエスト群を100件ずつのバッチに分けて並列実行し、完了したバッチから順に結果を返す
+
+        Args:
+            requests: (クエリ番号, ページトークン) のリスト
+            queries: クエリのリスト
+            stage: 何段目のページ取得か（ログ用）
+
+        Yields:
+            (チャンク番号, (クエリ番号, 検索結果) のリスト, 次ページの (クエリ番号, トークン) のリスト) のタプル
+        """
+        # 100件ずつのチャンクに分割
+        chunks = [requests[i:i+self.batch_size] for i in range(0, len(requests), self.batch_size)]
+
+        logger.info(
+            f"Stage {stage}: {len(requests)} requests in {len(chunks)} batches ({self.max_in_flight} in flight)"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {
+                executor.submit(self._execute_batch, chunk, queries): chunk_idx
+                for chunk_idx, chunk in enumerate(chunks)
+            }
+            try:
+                for future in as_completed(futures):
+                    chunk_idx = futures[future]
+                    try:
+                        results, next_pages = future.result()
+                    except Exception as e:
+                        logger.error(f"Error in batch {chunk_idx + 1}: {e}")
+                        continue
+
+                    logger.debug(f"Batch {chunk_idx + 1}/{len(chunks)}: found {sum(len(f) for _, f in results)} items")
+                    yield chunk_idx, results, next_pages
+            finally:
+                # 途中で打ち切られた場合、未着手のバッチは送信しない
+                for future in futures:
+                    future.cancel()
+
+    def _execute_batch(self, requests: List[Tuple[int, Optional[str]]], queries: List[str]):
+        """
+        単一のバッチリクエストを実行（一時的なエラーのサブリクエストは指数バックオフで再送）
+
+        Args:
+            requests: (クエリ番号, ページトークン) のリスト（最大100件）
+            queries: クエリのリスト
+
+        Returns:
+            ((クエリ番号, 検索結果) のリスト, 次ページの (クエリ番号, トークン) のリスト) のタプル
+        """
+        responses = {}
+        pending = list(range(len(requests)))
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                logger.warning(f"Retrying {len(pending)} search requests (attempt {attempt})")
+                _backoff(attempt - 1)
+
+            failed = []
+
+            def callback(request_id, response, exception):
+                """バッチリクエストのコールバック"""
+                if exception:
+                    retryable = _is_retryable(exception)
+                    DRIVE_SUBREQUEST_ERRORS.inc(kind='search', retryable=str(retryable).lower())
+                    if retryable:
+                        failed.append(int(request_id))
+                    else:
+                        logger.warning(f"Search error in query {requests[int(request_id)][0]}: {exception}")
+                else:
+                    responses[int(request_id)] = response
+
+            # バッチにリクエストを追加
+            batch = self.service.new_batch_http_request()
+            for index in pending:
+                query_idx, page_token = requests[index]
+                batch.add(
+                    self.service.files().list(
+                        q=queries[query_idx],
+                        fields="nextPageToken, files(id, name, mimeType, webViewLink, parents)",
+                        pageSize=self.page_size,
+                        pageToken=page_token
+                    ),
+                    callback=callback,
+                    request_id=str(index)
+                )
+
+            # バッチを実行（スレッドごとのHTTP接続を使用）
+            batch_start = time.perf_counter()
+            try:
+                batch.execute(http=authorized_http_for(self.service))
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                failed = [index for index in pending if index not in responses]
+            finally:
+                DRIVE_BATCH_SECONDS.observe(time.perf_counter() - batch_start, kind='search')
+
+            pending = failed
+            if not pending:
+                break
+        else:
+            logger.error(f"Giving up {len(pending)} search requests after {self.max_retries} retries")
+
+        results = []
+        next_pages = []
+        for index, (query_idx, _) in enumerate(requests):
+            response = responses.get(index)
+            if response is None:
+                continue
+            results.append((query_idx, response.get('files', [])))
+            if response.get('nextPageToken'):
+                next_pages.append((query_idx, response['nextPageToken']))
 
-        return results
+        return results, next_pages
@@ -0,0 +1,242 @@
+"""
+Drive クライアント: 認証情報と discovery 済みの service をプロセス内で再利用する
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import google_auth_httplib2
+import httplib2
+from django.conf import settings
+from google.oauth2 import service_account
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+# 非同期の検索パスで使用（未インストールなら同期のバッチ検索にフォールバック）
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import h2  # noqa: F401  httpx の HTTP/2 サポート
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/drive.metadata.readonly']
+
+
+class DriveCredentialsNotFound(Exception):
+    """サービスアカウントの認証情報が見つからない"""
+
+
+_lock = threading.Lock()
+_credentials = None
+_discovery_document = None
+_thread_local = threading.local()
+# イベントループごとの (非同期HTTPクライアント, ループの終了時に閉じるジェネレーター)（ループをまたいで使い回すことはできない）
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_credentials():
+    """
+    サービスアカウントの認証情報を取得（プロセス内で1度だけ読み込む）
+
+    Returns:
+        google.oauth2.service_account.Credentials
+
+    Raises:
+        DriveCredentialsNotFound: 環境変数にもファイルにも認証情報がない場合
+    """
+    global _credentials
+
+    if _credentials is not None:
+        return _credentials
+
+    with _lock:
+        if _credentials is None:
+            _credentials = _load_credentials()
+            logger.info("Loaded Drive service account credentials")
+    return _credentials
+
+
+def _load_credentials():
+    # 優先: 環境変数からJSON文字列を読み込む（デプロイ環境用）
+    json_creds = os.environ.get('GOOGLE_CREDENTIALS_JSON')
+    if json_creds:
+        return service_account.Credentials.from_service_account_info(json.loads(json_creds), scopes=SCOPES)
+
+    # フォールバック: ローカルファイルから読み込む
+    creds_file = settings.GOOGLE_SERVICE_ACCOUNT_FILE
+    if creds_file and not os.path.isabs(creds_file):
+        creds_path = os.path.join(settings.BASE_DIR, creds_file)
+    else:
+        creds_path = creds_file
+
+    if not creds_path or not os.path.exists(creds_path):
+        raise DriveCredentialsNotFound(
+            "Service account file not found. Please ensure 'service_account.json' is present "
+            "in the backend root or set GOOGLE_CREDENTIALS_JSON environment variable."
+        )
+    return service_account.Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+
+
+def _get_discovery_document() -> dict:
+    """
+    Drive v3 の discovery ドキュメント（ライブラリ同梱版）をパース済みで取得
+    """
+    global _discovery_document
+
+    if _discovery_document is None:
+        with _lock:
+            if _discovery_document is None:
+                _discovery_document = json.loads(discovery_cache.get_static_doc('drive', 'v3'))
+    return _discovery_document
+
+
+def _refresh_if_expiring(credentials):
+    """
+    アクセストークンが期限切れ間近なら先に更新（リクエスト中の401→再取得を避ける）
+    """
+    margin = timedelta(seconds=getattr(settings, 'DRIVE_TOKEN_REFRESH_MARGIN_SECONDS', 300))
+    if not _is_expiring(credentials, margin):
+        return
+
+    with _lock:
+        if not _is_expiring(credentials, margin):
+            return
+        credentials.refresh(google_auth_httplib2.Request(httplib2.Http()))
+        logger.info("Refreshed Drive access token")
+
+
+def _is_expiring(credentials, margin: timedelta) -> bool:
+    """
+    アクセストークンが未取得か、margin 以内に期限切れになるかチェック
+    """
+    expiry = credentials.expiry
+    if not credentials.token or not expiry:
+        return True
+    # google-auth の expiry はタイムゾーンなしのUTC
+    if expiry.tzinfo is None:
+        expiry = expiry.replace(tzinfo=timezone.utc)
+    return expiry - margin <= datetime.now(timezone.utc)
+
+
+def get_authorized_http(credentials=None):
+    """
+    スレッドごとの認証済みHTTPを取得（httplib2.Http はスレッドセーフでないため）
+
+    同じスレッドでは同じ接続を使い回すので、keep-alive で接続が再利用される
+
+    Args:
+        credentials: 認証情報（None なら共有の認証情報）
+
+    Returns:
+        google_auth_httplib2.AuthorizedHttp
+    """
+    credentials = credentials or get_credentials()
+    http = getattr(_thread_local, 'http', None)
+    if http is None or http.credentials is not credentials:
+        timeout = getattr(settings, 'DRIVE_HTTP_TIMEOUT_SECONDS', 60)
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+        _thread_local.http = http
+    return http
+
+
+def authorized_http_for(service) -> Optional[google_auth_httplib2.AuthorizedHttp]:
+    """
+    service の認証情報でスレッドごとの認証済みHTTPを取得
+
+    Args:
+        service: Google Drive API service instance
+
+    Returns:
+        AuthorizedHttp（認証情報を持たない service の場合は None = service 既定のHTTPを使用）
+    """
+    credentials = getattr(getattr(service, '_http', None), 'credentials', None)
+    if credentials is None:
+        return None
+    return get_authorized_http(credentials)
+
+
+def get_drive_service():
+    """
+    Drive API の service を取得
+
+    認証情報と discovery ドキュメントはプロセス内で共有し、service はスレッドごとに
+    1度だけ構築して使い回す
+
+    Returns:
+        Google Drive API service instance
+
+    Raises:
+        DriveCredentialsNotFound: 認証情報が見つからない場合
+    """
+    credentials = get_credentials()
+    _refresh_if_expiring(credentials)
+
+    service = getattr(_thread_local, 'service', None)
+    if service is None or service._http.credentials is not credentials:
+        service = build_from_document(_get_discovery_document(), http=get_authorized_http(credentials))
+        _thread_local.service = service
+    return service
+
+
+def get_access_token() -> str:
+    """
+    Drive API のアクセストークンを取得（期限切れ間近なら先に更新）
+
+    Returns:
+        アクセストークン
+
+    Raises:
+        DriveCredentialsNotFound: 認証情報が見つからない場合
+    """
+    credentials = get_credentials()
+    _refresh_if_expiring(credentials)
+    return credentials.token
+
+
+async def get_async_http_client():
+    """
+    実行中のイベントループで共有する非同期HTTPクライアントを取得
+
+    HTTP/2 が使える場合は1つの接続に複数のリクエストを多重化する。ASGI では
+    プロセス内で1つのループを使い続けるので、接続はリクエストをまたいで再利用される。
+    WSGI（async_to_sync）ではリクエストごとにループが作られるので、ループの終了時に閉じる
+
+    Returns:
+        httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+    client, closer = _async_clients.get(loop, (None, None))
+    if client is None or client.is_closed:
+        timeout = getattr(settings, 'DRIVE_HTTP_TIMEOUT_SECONDS', 60)
+        max_connections = getattr(settings, 'SEARCH_ASYNC_MAX_CONCURRENCY', 32)
+        client = httpx.AsyncClient(
+            http2=HAS_HTTP2,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        # 開始した非同期ジェネレーターは、ループの終了時（shutdown_asyncgens）に閉じられる
+        closer = _close_with_loop(client)
+        await closer.asend(None)
+        _async_clients[loop] = (client, closer)
+    return client
+
+
+async def _close_with_loop(client):
+    """ループが終了するまで待機し、終了時にクライアントを閉じる"""
+    try:
+        yield
+    finally:
+        await client.aclose()
@@ -0,0 +1,444 @@
+"""
+Drive API の代用品: 合成したフォルダツリーを返すメモリ上の service（ベンチマーク用）
+
+files().list（ページング・クエリ）・バッチリクエスト・Changes API を実装し、
+呼び出しごとの遅延とレート制限エラーを乱数のシードで再現可能に注入できる。
+特定のクエリを指定したステータスで失敗させることもできる（テスト用）
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+import httplib2
+from googleapiclient.errors import BatchError, HttpError
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+PDF_MIME_TYPE = 'application/pdf'
+
+MAX_BATCH_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 合成するファイル名に使う語（類義語辞書の見出し語と、その表記ゆれを含む）
+NAME_WORDS = [
+    'hymn', '賛美歌', 'さんびか', 'christmas', 'クリスマス', 'Xmas', 'easter', 'イースター',
+    'praise', 'worship', '礼拝', 'song', 'うた', 'prayer', '祈り', 'score', '楽譜',
+    'birthday', '誕生日', 'alleluia', 'ハレルヤ', 'document', '資料', 'music', '音楽',
+]
+
+
+def make_tree(breadth: int = 5, depth: int = 4, files_per_folder: int = 10, seed: int = 0, root_id: str = 'root') -> Dict[str, Dict]:
+    """
+    合成したフォルダツリーを作成
+
+    Args:
+        breadth: 各フォルダのサブフォルダ数
+        depth: ルートからの階層数
+        files_per_folder: 各フォルダ（ルートを除く）のファイル（PDF）数
+        seed: ファイル名を決める乱数のシード
+        root_id: ルートフォルダID（ルート自体は含めない）
+
+    Returns:
+        ファイルID → Drive API の files と同じ形式の dict
+    """
+    rng = random.Random(seed)
+    items = {}
+    level = [root_id]
+    counter = 0
+
+    for _ in range(depth):
+        next_level = []
+        for parent_id in level:
+            for _ in range(breadth):
+                counter += 1
+                folder_id = f'folder-{counter}'
+                items[folder_id] = _item(folder_id, f'{rng.choice(NAME_WORDS)} {counter}', FOLDER_MIME_TYPE, parent_id)
+                next_level.append(folder_id)
+                # 末端を含むすべてのフォルダにファイルを置く
+                for _ in range(files_per_folder):
+                    counter += 1
+                    file_id = f'file-{counter}'
+                    name = f'{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {counter}.pdf'
+                    items[file_id] = _item(file_id, name, PDF_MIME_TYPE, folder_id)
+        level = next_level
+
+    return items
+
+
+def _item(item_id: str, name: str, mime_type: str, parent_id: str) -> Dict:
+    return {
+        'id': item_id,
+        'name': name,
+        'mimeType': mime_type,
+        'parents': [parent_id],
+        'trashed': False,
+        'webViewLink': f'https://drive.google.com/file/d/{item_id}/view',
+    }
+
+
+class FakeDriveService:
+    """Drive API service の代用品（googleapiclient の service と同じ呼び出し方で使える）"""
+
+    def __init__(self, items: Dict[str, Dict], latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            items: ファイルID → ファイル情報（make_tree の戻り値）
+            latency: HTTPリクエスト1回あたりの遅延（秒、バッチは1回として数える）
+            jitter: 遅延のゆらぎ（latency に対する割合）
+            error_rate: 各リクエスト（バッチ内の個々のリクエストを含む）が 429 になる確率
+            seed: 遅延とエラーを決める乱数のシード
+        """
+        self.items = items
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.change_log = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._children = {}
+        # [クエリに含まれる文字列, メソッド, ステータス, 残り回数（None なら無制限）]
+        self._failures = []
+        for item in items.values():
+            for parent_id in item['parents']:
+                self._children.setdefault(parent_id, []).append(item)
+
+    def files(self):
+        return _Files(self)
+
+    def changes(self):
+        return _Changes(self)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None):
+        return _BatchHttpRequest(self, callback)
+
+    def reset_calls(self):
+        """呼び出し回数をリセット"""
+        with self._lock:
+            self.calls.clear()
+
+    def fail_requests(self, match: str = '', status: int = 500, times: Optional[int] = 1, method: str = 'files.list'):
+        """
+        クエリに match を含むリクエストを、指定したステータスで失敗させる
+
+        Args:
+            match: クエリに含まれる文字列（空ならすべて）
+            status: 返すHTTPステータス
+            times: 失敗させる回数（None なら解除するまで常に）
+            method: 対象のメソッド（'batch' ならバッチリクエスト全体）
+        """
+        with self._lock:
+            self._failures.append([match, method, status, times])
+
+    def update_item(self, item: Dict):
+        """
+        ファイルを追加・変更し、Changes API の変更として記録
+        """
+        with self._lock:
+            old = self.items.get(item['id'])
+            if old is not None:
+                for parent_id in old['parents']:
+                    self._children[parent_id] = [child for child in self._children.get(parent_id, []) if child['id'] != item['id']]
+            self.items[item['id']] = item
+            for parent_id in item['parents']:
+                self._children.setdefault(parent_id, []).append(item)
+            self.change_log.append({'fileId': item['id'], 'removed': False, 'file': dict(item)})
+
+    def remove_item(self, item_id: str):
+        """
+        ファイルを削除し、Changes API の変更として記録
+        """
+        with self._lock:
+            item = self.items.pop(item_id, None)
+            if item is not None:
+                for parent_id in item['parents']:
+                    self._children[parent_id] = [child for child in self._children.get(parent_id, []) if child['id'] != item_id]
+            self.change_log.append({'fileId': item_id, 'removed': True})
+
+    def _request(self, method: str, handler: Callable, in_batch: bool = False, query: str = ''):
+        """
+        1リクエストを処理（遅延・エラーの注入と呼び出し回数の記録）
+        """
+        with self._lock:
+            self.calls[method] += 1
+            status = self._injected_status(method, query)
+            if status is None and self._rng.random() < self.error_rate:
+                status = 429
+            delay = self._delay() if not in_batch else 0.0
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            with self._lock:
+                self.calls['errors'] += 1
+            message = 'rateLimitExceeded' if status == 429 else 'backendError'
+            raise HttpError(
+                httplib2.Response({'status': status}),
+                json.dumps({'error': {'code': status, 'message': message}}).encode('utf-8'),
+            )
+        return handler()
+
+    def _injected_status(self, method: str, query: str) -> Optional[int]:
+        """
+        fail_requests で指定した失敗に該当すればそのステータスを返す（ロックを取得して呼ぶ）
+        """
+        for failure in self._failures:
+            match, failure_method, status, times = failure
+            if failure_method != method or match not in query:
+                continue
+            if times is not None:
+                if times <= 0:
+                    continue
+                failure[3] = times - 1
+            return status
+        return None
+
+    def _delay(self) -> float:
+        if not self.latency:
+            return 0.0
+        return max(0.0, self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+
+    def _list(self, q: str = '', pageSize: int = 100, pageToken: Optional[str] = None, orderBy: Optional[str] = None, **kwargs) -> Dict:
+        """
+        files.list: クエリに一致するファイルの1ページを返す（フィールド指定は無視して全項目を返す）
+        """
+        predicate, parent_ids = _parse_query(q)
+        with self._lock:
+            if parent_ids is not None:
+                candidates = [item for parent_id in parent_ids for item in self._children.get(parent_id, [])]
+            else:
+                candidates = list(self.items.values())
+
+        matched = {item['id']: item for item in candidates if predicate(item)}
+        if orderBy and orderBy.startswith('folder'):
+            files = sorted(matched.values(), key=lambda item: (item['mimeType'] != FOLDER_MIME_TYPE, item['name'], item['id']))
+        else:
+            files = sorted(matched.values(), key=lambda item: item['id'])
+
+        start = int(pageToken or 0)
+        end = start + min(pageSize or 100, MAX_PAGE_SIZE)
+        response = {'files': [{key: value for key, value in item.items() if key != 'trashed'} for item in files[start:end]]}
+        if end < len(files):
+            response['nextPageToken'] = str(end)
+        return response
+
+    def _list_changes(self, pageToken: str, pageSize: int = 100, **kwargs) -> Dict:
+        """
+        changes.list: 同期トークン（変更ログの位置）以降の変更を返す
+        """
+        try:
+            start = int(pageToken)
+        except (TypeError, ValueError):
+            raise HttpError(httplib2.Response({'status': 400}), b'{"error": {"code": 400, "message": "Invalid Value"}}')
+        with self._lock:
+            changes = self.change_log[start:start + pageSize]
+            total = len(self.change_log)
+        response = {'changes': changes}
+        if start + pageSize < total:
+            response['nextPageToken'] = str(start + pageSize)
+        else:
+            response['newStartPageToken'] = str(total)
+        return response
+
+
+class _Request:
+    """execute() で実行するリクエスト（googleapiclient の HttpRequest に相当）"""
+
+    def __init__(self, service: FakeDriveService, method: str, handler: Callable, query: str = ''):
+        self.service = service
+        self.method = method
+        self.handler = handler
+        self.query = query
+
+    def execute(self, http=None, num_retries: int = 0):
+        return self.service._request(self.method, self.handler, query=self.query)
+
+
+class _Files:
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def list(self, **kwargs):
+        return _Request(self.service, 'files.list', lambda: self.service._list(**kwargs), kwargs.get('q', ''))
+
+
+class _Changes:
+    def __init__(self, service: FakeDriveService):
+        self.service = service
+
+    def getStartPageToken(self, **kwargs):
+        return _Request(self.service, 'changes.getStartPageToken', lambda: {'startPageToken': str(len(self.service.change_log))})
+
+    def list(self, **kwargs):
+        return _Request(self.service, 'changes.list', lambda: self.service._list_changes(**kwargs))
+
+
+class _BatchHttpRequest:
+    """バッチリクエスト（HTTPリクエスト1回分の遅延で、中の各リクエストを順にコールバックへ渡す）"""
+
+    def __init__(self, service: FakeDriveService, callback: Optional[Callable]):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: _Request, callback: Optional[Callable] = None, request_id: Optional[str] = None):
+        if len(self.requests) >= MAX_BATCH_SIZE:
+            raise BatchError(f"Exceeded maximum calls({MAX_BATCH_SIZE}) in a single batch request.")
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests) + 1)))
+
+    def execute(self, http=None):
+        self.service._request('batch', lambda: None)
+        for request, callback, request_id in self.requests:
+            try:
+                response, exception = self.service._request(request.method, request.handler, in_batch=True, query=request.query), None
+            except HttpError as e:
+                response, exception = None, e
+            if callback is not None:
+                callback(request_id, response, exception)
+
+
+def _parse_query(query: str):
+    """
+    Drive のクエリ（and / or / not・括弧・in parents・name contains・比較）を判定関数に変換
+
+    Returns:
+        (判定関数, クエリが対象を限定している親フォルダIDの集合（限定していなければ None）) のタプル
+    """
+    tokens = _tokenize(query)
+    if not tokens:
+        return (lambda item: True), None
+    parser = _QueryParser(tokens)
+    predicate, parent_ids = parser.parse_or()
+    if parser.position != len(tokens):
+        raise ValueError(f"Unexpected token in query: {tokens[parser.position]}")
+    return predicate, parent_ids
+
+
+_TOKEN_PATTERN = re.compile(r"\s*(?:('(?:[^'\\]|\\.)*')|(!=|=|\(|\))|([A-Za-z_]+))")
+
+
+def _tokenize(query: str) -> List[str]:
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid query near: {query[position:]}")
+        tokens.append(next(group for group in match.groups() if group is not None))
+        position = match.end()
+    return tokens
+
+
+def _unquote(token: str) -> str:
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
+
+
+class _QueryParser:
+    """再帰下降パーサー（or < and < not < 項）"""
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        predicates = [self.parse_and()]
+        while self.peek() == 'or':
+            self.take()
+            predicates.append(self.parse_and())
+        if len(predicates) == 1:
+            return predicates[0]
+        # どれか1つでも親を限定していなければ全体も限定しない
+        parent_sets = [parent_ids for _, parent_ids in predicates]
+        parent_ids = None if any(ids is None for ids in parent_sets) else set().union(*parent_sets)
+        functions = [function for function, _ in predicates]
+        return (lambda item: any(function(item) for function in functions)), parent_ids
+
+    def parse_and(self):
+        predicates = [self.parse_not()]
+        while self.peek() == 'and':
+            self.take()
+            predicates.append(self.parse_not())
+        if len(predicates) == 1:
+            return predicates[0]
+        # どれか1つが親を限定していれば全体も限定される
+        parent_sets = [parent_ids for _, parent_ids in predicates if parent_ids is not None]
+        parent_ids = min(parent_sets, key=len) if parent_sets else None
+        functions = [function for function, _ in predicates]
+        return (lambda item: all(function(item) for function in functions)), parent_ids
+
+    def parse_not(self):
+        if self.peek() == 'not':
+            self.take()
+            function, _ = self.parse_not()
+            return (lambda item: not function(item)), None
+        if self.peek() == '(':
+            self.take()
+            predicate = self.parse_or()
+            if self.take() != ')':
+                raise ValueError("Expected ')'")
+            return predicate
+        return self.parse_term()
+
+    def parse_term(self):
+        token = self.take()
+        if token.startswith("'"):
+            # 'ID' in parents
+            value = _unquote(token)
+            if self.take() != 'in' or self.take() != 'parents':
+                raise ValueError(f"Unsupported term: {token}")
+            return (lambda item: value in item['parents']), {value}
+
+        field = token
+        operator = self.take()
+        operand = self.take()
+        if operand.startswith("'"):
+            value = _unquote(operand)
+        elif operand in ('true', 'false'):
+            value = operand == 'true'
+        else:
+            raise ValueError(f"Unsupported value: {operand}")
+
+        if operator == 'contains':
+            value = str(value).lower()
+            if field == 'name':
+                # Drive の name contains は語の前方一致（"HelloWorld" は 'Hello' に一致し 'World' には一致しない）
+                return (lambda item: _matches_word_prefix(str(item.get(field, '')).lower(), value)), None
+            return (lambda item: value in str(item.get(field, '')).lower()), None
+        if operator == '=':
+            return (lambda item: item.get(field) == value), None
+        if operator == '!=':
+            return (lambda item: item.get(field) != value), None
+        raise ValueError(f"Unsupported operator: {operator}")
+
+
+def _matches_word_prefix(name: str, value: str) -> bool:
+    """
+    名前の語の先頭（名前の先頭・区切り文字の直後・英数字とそれ以外の境目）から value が始まるか
+    """
+    if not value:
+        return True
+    position = name.find(value)
+    while position != -1:
+        if position == 0 or _is_word_boundary(name[position - 1], name[position]):
+            return True
+        position = name.find(value, position + 1)
+    return False
+
+
+def _is_word_boundary(previous: str, current: str) -> bool:
+    if not previous.isalnum():
+        return True
+    return previous.isascii() != current.isascii()
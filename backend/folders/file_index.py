@@ -0,0 +1,230 @@
+"""
+ファイル名インデックス: クロール時に収集したPDFのメタデータをローカルDBで検索する
+"""
+import logging
+from typing import List, Dict, Iterable, Optional
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from .models import FileIndex, FolderCache
+
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPE = 'application/pdf'
+
+# 全文検索インデックスが効く最小文字数（trigram / ngram）
+MIN_FULL_TEXT_TERM_LENGTH = 3
+
+
+class FileIndexService:
+    """ファイル名インデックスの保存・検索サービス"""
+
+    _has_sqlite_fts = None
+
+    def __init__(self):
+        self.write_batch_size = getattr(settings, 'FOLDER_CACHE_WRITE_BATCH_SIZE', 500)
+
+    def replace_subtree(self, root_folder_id: str, tree: Dict[str, Dict], files: List[Dict], kept_tree_paths: Iterable[str] = ()):
+        """
+        ルート配下のファイルを一括upsertし、見つからなくなったファイルを無効化
+
+        Args:
+            root_folder_id: ルートフォルダID
+            tree: フォルダID → フォルダ情報（tree_path 付き）
+            files: クロールで見つかったファイル情報のリスト
+            kept_tree_paths: 一覧を取得できなかったフォルダの経路（配下のファイルは無効化しない）
+        """
+        root_tree_path = tree[root_folder_id]['tree_path']
+        with transaction.atomic():
+            saved_ids = self.save_files(files, tree)
+            stale_ids = set(self._subtree(root_tree_path).filter(is_active=True).values_list('file_id', flat=True)) - saved_ids
+            for tree_path in kept_tree_paths:
+                stale_ids -= set(self._subtree(tree_path).values_list('file_id', flat=True))
+            self.deactivate(stale_ids)
+            FolderCache.objects.filter(folder_id=root_folder_id).update(files_indexed=True)
+
+        logger.info(f"Indexed {len(saved_ids)} files, deactivated {len(stale_ids)} removed files")
+
+    def save_files(self, files: List[Dict], tree: Dict[str, Dict]) -> set:
+        """
+        親フォルダがツリーに含まれるファイルをチャンク単位でupsert
+
+        Args:
+            files: ファイル情報（id, name, mimeType, webViewLink, parent_id）のリスト
+            tree: フォルダID → フォルダ情報（tree_path 付き）
+
+        Returns:
+            保存したファイルIDの集合
+        """
+        rows = {
+            file['id']: FileIndex(
+                file_id=file['id'],
+                parent_id=file['parent_id'],
+                name=file['name'],
+                mime_type=file.get('mimeType', PDF_MIME_TYPE),
+                web_view_link=file.get('webViewLink', ''),
+                tree_path=tree[file['parent_id']]['tree_path'],
+                is_active=True,
+            )
+            for file in files
+            if file['parent_id'] in tree
+        }
+
+        # MySQL は衝突対象カラムの指定をサポートしない
+        unique_fields = ['file_id'] if connection.features.supports_update_conflicts_with_target else None
+        FileIndex.objects.bulk_create(
+            list(rows.values()),
+            batch_size=self.write_batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['parent_id', 'name', 'mime_type', 'web_view_link', 'tree_path', 'is_active', 'last_updated'],
+        )
+        return set(rows)
+
+    def deactivate(self, file_ids: Iterable[str]):
+        """
+        指定ファイルを無効化
+
+        Args:
+            file_ids: ファイルIDのリスト
+        """
+        file_ids = list(file_ids)
+        # 更新日時も進める（入力候補のインデックスが差分を検出できるように）
+        for i in range(0, len(file_ids), self.write_batch_size):
+            FileIndex.objects.filter(file_id__in=file_ids[i:i+self.write_batch_size]).update(is_active=False, last_updated=timezone.now())
+
+    def deactivate_in_folders(self, folder_ids: Iterable[str]):
+        """
+        指定フォルダ直下のファイルを無効化
+
+        Args:
+            folder_ids: フォルダIDのリスト
+        """
+        folder_ids = list(folder_ids)
+        for i in range(0, len(folder_ids), self.write_batch_size):
+            FileIndex.objects.filter(parent_id__in=folder_ids[i:i+self.write_batch_size]).update(is_active=False, last_updated=timezone.now())
+
+    def move_folder_files(self, folder_id: str, tree_path: str):
+        """
+        フォルダの移動に合わせて直下のファイルの経路を更新
+
+        Args:
+            folder_id: フォルダID
+            tree_path: フォルダの新しい経路
+        """
+        FileIndex.objects.filter(parent_id=folder_id).update(tree_path=tree_path, last_updated=timezone.now())
+
+    def is_indexed(self, root_folder_id: str) -> bool:
+        """
+        ルート（またはその祖先）のクロールでファイルがインデックス済みかチェック
+
+        Args:
+            root_folder_id: ルートフォルダID
+
+        Returns:
+            True if indexed, False otherwise
+        """
+        tree_path = FolderCache.objects.filter(folder_id=root_folder_id, is_active=True).values_list('tree_path', flat=True).first()
+        if not tree_path:
+            return False
+        ancestor_ids = tree_path.strip('/').split('/')
+        return FolderCache.objects.filter(folder_id__in=ancestor_ids, files_indexed=True).exists()
+
+    def search(self, root_folder_id: str, keyword_groups: List[List[str]], limit: Optional[int] = None) -> List[Dict]:
+        """
+        ルート配下のファイルをローカルインデックスから検索（グループ間はAND、グループ内はOR）
+
+        Args:
+            root_folder_id: ルートフォルダID
+            keyword_groups: キーワードごとの類義語リスト
+            limit: 最大件数（None なら無制限）
+
+        Returns:
+            検索結果のリスト（Drive API の files と同じ形式）
+        """
+        tree_path = FolderCache.objects.filter(folder_id=root_folder_id).values_list('tree_path', flat=True).first()
+        if not tree_path:
+            return []
+
+        files = self._subtree(tree_path).filter(is_active=True, mime_type=PDF_MIME_TYPE)
+        for terms in keyword_groups:
+            terms = [term for term in terms if term]
+            if terms:
+                files = files.filter(self._name_matches(terms))
+
+        files = files.order_by('name').values('file_id', 'name', 'mime_type', 'web_view_link', 'parent_id')
+        if limit:
+            files = files[:limit]
+
+        return [
+            {
+                'id': file['file_id'],
+                'name': file['name'],
+                'mimeType': file['mime_type'],
+                'webViewLink': file['web_view_link'],
+                'parents': [file['parent_id']],
+            }
+            for file in files
+        ]
+
+    def _name_matches(self, terms: List[str]) -> Q:
+        """
+        いずれかの語をファイル名に含む条件（全文検索インデックスが使える語はインデックス経由）
+
+        Args:
+            terms: 類義語のリスト
+
+        Returns:
+            Q オブジェクト
+        """
+        condition = Q()
+        full_text_terms = []
+        for term in terms:
+            if self._can_use_full_text_index(term):
+                full_text_terms.append(term)
+            else:
+                condition |= Q(name__icontains=term)
+
+        if full_text_terms:
+            if connection.vendor == 'mysql':
+                sql = "SELECT file_id FROM file_index WHERE MATCH(name) AGAINST (%s IN BOOLEAN MODE)"
+                params = [' '.join('"' + term.replace('"', ' ') + '"' for term in full_text_terms)]
+            else:
+                # ESCAPE を付けると trigram インデックスが使われず全件走査になる
+                sql = "SELECT file_id FROM file_index_fts WHERE " + " OR ".join(["name LIKE %s"] * len(full_text_terms))
+                params = ['%' + term + '%' for term in full_text_terms]
+            condition |= Q(file_id__in=RawSQL(sql, params))
+
+        return condition
+
+    def _can_use_full_text_index(self, term: str) -> bool:
+        """
+        語を全文検索インデックスで検索できるかチェック（短い語と、SQLite で LIKE のワイルドカードを含む語は不可）
+        """
+        if len(term) < MIN_FULL_TEXT_TERM_LENGTH or not self._has_full_text_index():
+            return False
+        return connection.vendor != 'sqlite' or ('%' not in term and '_' not in term)
+
+    def _has_full_text_index(self) -> bool:
+        """
+        全文検索インデックスが利用可能かチェック
+        """
+        if connection.vendor == 'mysql':
+            return True
+        if connection.vendor != 'sqlite':
+            return False
+
+        cls = type(self)
+        if cls._has_sqlite_fts is None:
+            cls._has_sqlite_fts = 'file_index_fts' in connection.introspection.table_names()
+        return cls._has_sqlite_fts
+
+    @staticmethod
+    def _subtree(tree_path: str):
+        """
+        経路が tree_path で始まるファイルを1回のインデックス範囲検索で取得
+        """
+        return FileIndex.objects.filter(tree_path__gte=tree_path, tree_path__lt=tree_path[:-1] + '0')
@@ -0,0 +1,274 @@
+"""
+排他制御: DBロック（ワーカー間）と single-flight（同じ処理の同時実行を1回にまとめる）
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .metrics import SINGLE_FLIGHT_CALLS
+from .models import CacheLock
+
+
+logger = logging.getLogger(__name__)
+
+
+def acquire_lock(name: str, owner: str, ttl_seconds: int) -> bool:
+    """
+    DBロックを取得（期限切れのロックは奪う）
+
+    Args:
+        name: ロック名
+        owner: 取得者の識別子
+        ttl_seconds: ロックの有効期間（取得者が落ちても期限が来れば解放される）
+
+    Returns:
+        取得できた場合 True
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    # 期限切れのロックを奪う（条件付き UPDATE なので奪えるのは1ワーカーだけ）
+    if CacheLock.objects.filter(name=name, expires_at__lte=now).update(owner=owner, expires_at=expires_at):
+        return True
+
+    try:
+        with transaction.atomic():
+            CacheLock.objects.create(name=name, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lock(name: str, owner: str):
+    """
+    自分が保持しているDBロックを解放
+    """
+    CacheLock.objects.filter(name=name, owner=owner).delete()
+
+
+class SingleFlightTimeout(Exception):
+    """実行中の処理（他のワーカーを含む）を待ちきれず、代わりに返せる結果もない"""
+
+    def __init__(self, key: str, retry_after: int):
+        super().__init__(f"Timed out waiting for {key}, which is still running")
+        self.key = key
+        # クライアントに再試行を促すまでの秒数
+        self.retry_after = retry_after
+
+
+class _Call:
+    """実行中の処理（完了を待つ側は event を待って結果を共有する）"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    同じキーの処理が同時に要求された場合に、1回だけ実行して結果を共有する
+
+    プロセス内では先に来た呼び出し（リーダー）の完了を他の呼び出しが待つ。ワーカー間では
+    リーダーがキーと同名のDBロックを取り、取れなかった場合は他のワーカーの結果が
+    lookup で見えるようになるまで待つ。待つのは SINGLE_FLIGHT_WAIT_SECONDS まで
+    （ワーカーのタイムアウトより短くする）で、待ちきれなければ fallback の値（古い結果など）を返すか
+    SingleFlightTimeout を送出する
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 処理の種類（メトリクスのラベル）
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+    def do(self, key: str, fn: Callable, lookup: Optional[Callable] = None, lock_seconds: Optional[int] = None,
+           fallback: Optional[Callable] = None):
+        """
+        fn を実行して結果を返す（同じキーで実行中の処理があればその結果を待つ）
+
+        Args:
+            key: 処理のキー（DBロック名を兼ねる）
+            fn: 実行する処理
+            lookup: 他のワーカーが保存した結果を取得する関数（未保存なら None を返す）
+            lock_seconds: DBロックの有効期間（None なら SINGLE_FLIGHT_LOCK_SECONDS）
+            fallback: 待ちきれなかった場合に代わりに返す値を取得する関数（なければ None を返す）
+
+        Returns:
+            fn の結果
+
+        Raises:
+            SingleFlightTimeout: 待ちきれず、fallback の値もない場合
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='shared')
+            if not call.event.wait(self._wait_seconds()):
+                return self._give_up(key, fallback)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_exclusive(key, fn, lookup, lock_seconds, fallback)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def do_async(self, key: str, fn: Callable, lookup: Optional[Callable] = None, lock_seconds: Optional[int] = None,
+                       fallback: Optional[Callable] = None):
+        """
+        do の非同期版（fn はコルーチン関数、lookup と fallback は同期関数）
+
+        同じイベントループ内の呼び出しは1つのタスクを待つ
+        """
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        if task is not None:
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='shared')
+            try:
+                # 待っている側がキャンセル・タイムアウトしても共有のタスクは止めない
+                return await asyncio.wait_for(asyncio.shield(task), self._wait_seconds())
+            except asyncio.TimeoutError:
+                return await sync_to_async(self._give_up)(key, fallback)
+
+        task = asyncio.ensure_future(self._run_exclusive_async(key, fn, lookup, lock_seconds, fallback))
+        self._tasks[task_key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        return await asyncio.shield(task)
+
+    def _give_up(self, key: str, fallback: Optional[Callable]):
+        """
+        待ちきれなかった場合に fallback の値を返す（なければ SingleFlightTimeout）
+        """
+        result = fallback() if fallback else None
+        if result is not None:
+            logger.warning(f"Gave up waiting for {key}, returning a fallback result")
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='fallback')
+            return result
+        logger.warning(f"Gave up waiting for {key}")
+        SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='timeout')
+        raise SingleFlightTimeout(key, max(1, int(self._wait_seconds())))
+
+    @staticmethod
+    def _wait_seconds() -> float:
+        return getattr(settings, 'SINGLE_FLIGHT_WAIT_SECONDS', 20)
+
+    def _run_exclusive(self, key: str, fn: Callable, lookup: Optional[Callable], lock_seconds: Optional[int],
+                       fallback: Optional[Callable] = None):
+        """
+        DBロックを取って fn を実行（他のワーカーが実行中ならその結果を待つ）
+        """
+        if not getattr(settings, 'SINGLE_FLIGHT_CROSS_WORKER', True):
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+            return fn()
+
+        owner = self._owner()
+        lock_seconds = lock_seconds or getattr(settings, 'SINGLE_FLIGHT_LOCK_SECONDS', 120)
+        deadline = time.monotonic() + self._wait_seconds()
+        waited = False
+
+        while True:
+            try:
+                acquired = acquire_lock(key, owner, lock_seconds)
+            except Exception as e:
+                logger.warning(f"Failed to acquire lock {key}, running without it: {e}")
+                SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+                return fn()
+
+            if acquired:
+                try:
+                    # 待っている間に他のワーカーが完了していればその結果を使う
+                    result = lookup() if waited and lookup else None
+                    if result is not None:
+                        SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='remote')
+                        return result
+                    SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+                    return fn()
+                finally:
+                    release_lock(key, owner)
+
+            if time.monotonic() >= deadline:
+                return self._give_up(key, fallback)
+
+            waited = True
+            time.sleep(getattr(settings, 'SINGLE_FLIGHT_POLL_SECONDS', 0.5))
+            result = lookup() if lookup else None
+            if result is not None:
+                SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='remote')
+                return result
+
+    async def _run_exclusive_async(self, key: str, fn: Callable, lookup: Optional[Callable], lock_seconds: Optional[int],
+                                   fallback: Optional[Callable] = None):
+        """
+        _run_exclusive の非同期版（DBアクセスはスレッドで実行）
+        """
+        if not getattr(settings, 'SINGLE_FLIGHT_CROSS_WORKER', True):
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+            return await fn()
+
+        owner = self._owner()
+        lock_seconds = lock_seconds or getattr(settings, 'SINGLE_FLIGHT_LOCK_SECONDS', 120)
+        deadline = time.monotonic() + self._wait_seconds()
+        waited = False
+
+        while True:
+            try:
+                acquired = await sync_to_async(acquire_lock)(key, owner, lock_seconds)
+            except Exception as e:
+                logger.warning(f"Failed to acquire lock {key}, running without it: {e}")
+                SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+                return await fn()
+
+            if acquired:
+                try:
+                    result = await sync_to_async(lookup)() if waited and lookup else None
+                    if result is not None:
+                        SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='remote')
+                        return result
+                    SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+                    return await fn()
+                finally:
+                    await sync_to_async(release_lock)(key, owner)
+
+            if time.monotonic() >= deadline:
+                return await sync_to_async(self._give_up)(key, fallback)
+
+            waited = True
+            await asyncio.sleep(getattr(settings, 'SINGLE_FLIGHT_POLL_SECONDS', 0.5))
+            result = await sync_to_async(lookup)() if lookup else None
+            if result is not None:
+                SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='remote')
+                return result
+
+    @staticmethod
+    def _owner() -> str:
+        return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+# 同じ検索（ルートフォルダ + 正規化クエリ）をまとめる
+search_flight = SingleFlight('search')
+# 同じフォルダツリーの再構築をまとめる
+folder_cache_flight = SingleFlight('folder_cache')
@@ -0,0 +1,208 @@
+import json
+import math
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from search.query_planner import plan_name_conditions, prune_keyword_groups
+from search.synonyms import synonym_dict
+from folders.cache_service import BatchSearchService, FolderCacheService
+from folders.fake_drive import FakeDriveService, make_tree
+from folders.file_index import FileIndexService
+from folders.models import SynonymCache
+from folders.ranking import SearchResultRanker
+
+
+ROOT_FOLDER_ID = 'benchmark-root'
+
+DEFAULT_QUERIES = ['hymn', 'christmas hymn', 'クリスマス', 'praise worship', '楽譜 song', 'easter prayer']
+
+
+class Command(BaseCommand):
+    help = '模擬の Drive でキャッシュ構築・差分同期・類義語展開・検索の性能を計測する（使い捨てのテスト用データベースで実行する）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--breadth', type=int, default=5, help='各フォルダのサブフォルダ数')
+        parser.add_argument('--depth', type=int, default=4, help='ツリーの階層数')
+        parser.add_argument('--files', type=int, default=10, help='各フォルダのファイル数')
+        parser.add_argument('--latency-ms', type=float, default=20.0, help='Drive へのHTTPリクエスト1回あたりの遅延（ミリ秒）')
+        parser.add_argument('--jitter', type=float, default=0.2, help='遅延のゆらぎ（遅延に対する割合）')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='各リクエストがレート制限（429）になる確率')
+        parser.add_argument('--backoff', type=float, help='リトライ時のバックオフ（秒）。省略時は DRIVE_API_BACKOFF_SECONDS')
+        parser.add_argument('--iterations', type=int, default=3, help='各段階の繰り返し回数')
+        parser.add_argument('--changes', type=int, default=50, help='差分同期の1回あたりの変更数')
+        parser.add_argument('--query', action='append', dest='queries', help='検索クエリ（複数指定可）')
+        parser.add_argument('--seed', type=int, default=0, help='ツリー・遅延・エラーを決める乱数のシード')
+        parser.add_argument('--output', help='結果を JSON で書き出すパス')
+        parser.add_argument('--compare', help='比較対象（以前の --output）の JSON')
+        parser.add_argument('--allow-db', action='store_true', help='SQLite 以外でも実行する（同じサーバーに test_<名前> のデータベースを作り直す）')
+
+    def handle(self, *args, **options):
+        if options['iterations'] <= 0:
+            raise CommandError('--iterations must be positive')
+        # 使い捨てのデータベースは本番と同じサーバーに作られ、同名のものがあれば削除される
+        if connection.vendor != 'sqlite' and not options['allow_db']:
+            raise CommandError(
+                f"Refusing to create a throwaway database on the configured {connection.vendor} server; "
+                f"use a SQLite settings module or pass --allow-db"
+            )
+
+        items = make_tree(options['breadth'], options['depth'], options['files'], options['seed'], ROOT_FOLDER_ID)
+        service = FakeDriveService(
+            items,
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        folder_count = sum(1 for item in items.values() if item['mimeType'] == 'application/vnd.google-apps.folder')
+        self.stdout.write(f"Synthetic tree: {folder_count} folders, {len(items) - folder_count} files")
+
+        overrides = {
+            'ENABLE_FILE_INDEX': True,
+            'FOLDER_CACHE_INCREMENTAL_SYNC': True,
+            # 共有キャッシュ・バックグラウンドの書き込みは取り消せないので、プロセス内で同期的に行う
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+            'CACHE_WRITE_BEHIND': False,
+        }
+        if options['backoff'] is not None:
+            overrides['DRIVE_API_BACKOFF_SECONDS'] = options['backoff']
+
+        # 稼働中のデータベースには触れない（SQLite で書き込みロックを持ち続けないように）。
+        # テストと同じ方法で別のデータベースを作って移行し、終わったら削除する
+        self.stdout.write("Creating a throwaway database...")
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                results = self._run(service, options['queries'] or DEFAULT_QUERIES, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            synonym_dict.clear_memory_cache()
+
+        report = {
+            'config': {key: options[key] for key in ('breadth', 'depth', 'files', 'latency_ms', 'jitter', 'error_rate', 'iterations', 'changes', 'seed')},
+            'stages': results,
+        }
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)['stages']
+        self._print_report(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def _run(self, service, queries, options):
+        """
+        各段階を計測し、段階名 → 集計結果 を返す
+        """
+        cache_service = FolderCacheService(service)
+        search_service = BatchSearchService(service)
+        file_index = FileIndexService()
+        stages = {}
+
+        # 1. フォルダツリーの全体クロール
+        stages['build_folder_cache'] = self._measure(
+            service, options['iterations'], lambda: cache_service.build_folder_cache(ROOT_FOLDER_ID)
+        )
+        folder_ids = cache_service._get_cached_folder_ids(ROOT_FOLDER_ID)
+
+        # 2. 差分同期（毎回 --changes 件の名前変更を反映）
+        file_ids = sorted(item_id for item_id, item in service.items.items() if item['mimeType'] != 'application/vnd.google-apps.folder')
+        sync_round = {'n': 0}
+
+        def sync():
+            sync_round['n'] += 1
+            for file_id in file_ids[:options['changes']]:
+                service.update_item(dict(service.items[file_id], name=f"{service.items[file_id]['name']} r{sync_round['n']}"))
+            cache_service.sync_folder_cache(ROOT_FOLDER_ID)
+
+        stages['sync_folder_cache'] = self._measure(service, options['iterations'], sync)
+
+        # 3. 類義語展開（DB・メモリ上のキャッシュなし / あり）
+        keyword_lists = [query.replace('　', ' ').split() for query in queries]
+
+        def expand_cold():
+            synonym_dict.clear_memory_cache(shared=True)
+            SynonymCache.objects.all().delete()
+            for keywords in keyword_lists:
+                synonym_dict.get_synonyms_many(keywords)
+
+        def expand_warm():
+            for keywords in keyword_lists:
+                synonym_dict.get_synonyms_many(keywords)
+
+        stages['synonyms_cold'] = self._measure(service, options['iterations'], expand_cold, operations=len(queries))
+        stages['synonyms_warm'] = self._measure(service, options['iterations'], expand_warm, operations=len(queries))
+
+        plans = []
+        for keywords in keyword_lists:
+            synonyms = synonym_dict.get_synonyms_many(keywords)
+            keyword_groups = prune_keyword_groups([synonyms[keyword] for keyword in keywords])
+            ranker = SearchResultRanker([(keyword, synonyms[keyword]) for keyword in keywords])
+            plans.append((keyword_groups, ranker))
+
+        # 4. Drive へのバッチ検索
+        def drive_search():
+            for keyword_groups, _ in plans:
+                search_service.batch_search(folder_ids, plan_name_conditions(keyword_groups, settings.SEARCH_CONDITION_MAX_LENGTH))
+
+        stages['batch_search'] = self._measure(service, options['iterations'], drive_search, operations=len(queries))
+
+        # 5. ローカルのファイル名インデックスでの検索とランキング
+        def index_search():
+            for keyword_groups, ranker in plans:
+                ranker.rank(ROOT_FOLDER_ID, file_index.search(ROOT_FOLDER_ID, keyword_groups))
+
+        stages['index_search'] = self._measure(service, options['iterations'], index_search, operations=len(queries))
+
+        return stages
+
+    @staticmethod
+    def _measure(service, iterations, fn, operations=1):
+        """
+        fn を iterations 回実行し、1回あたりの所要時間の分布と Drive API の呼び出し回数を集計
+
+        Args:
+            service: FakeDriveService
+            iterations: 繰り返し回数
+            fn: 計測する処理
+            operations: fn 1回に含まれる操作数（スループットの計算に使う）
+
+        Returns:
+            集計結果の dict
+        """
+        durations = []
+        service.reset_calls()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+
+        total = sum(durations)
+        return {
+            'runs': iterations,
+            'p50_ms': round(_percentile(durations, 0.5) * 1000, 2),
+            'p95_ms': round(_percentile(durations, 0.95) * 1000, 2),
+            'ops_per_sec': round(iterations * operations / total, 2) if total else None,
+            'api_calls': {method: count // iterations for method, count in sorted(service.calls.items())},
+        }
+
+    def _print_report(self, results, baseline=None):
+        self.stdout.write(f"{'stage':<20} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10}  api calls / run")
+        for name, result in results.items():
+            line = f"{name:<20} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['ops_per_sec'] or 0:>10.2f}  "
+            line += ', '.join(f'{method}={count}' for method, count in result['api_calls'].items()) or '-'
+            if baseline and name in baseline and baseline[name]['p50_ms']:
+                change = (result['p50_ms'] - baseline[name]['p50_ms']) / baseline[name]['p50_ms'] * 100
+                line += f"  (p50 {change:+.1f}% vs baseline)"
+            self.stdout.write(line)
+
+
+def _percentile(values, fraction):
+    """最近傍順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
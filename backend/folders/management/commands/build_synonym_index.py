@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from folders.models import SynonymCache
+from search.synonym_index import INDEX_PATH, save_index
+from search.synonyms import synonym_dict
+
+
+class Command(BaseCommand):
+    help = '類義語辞書を展開インデックス（search/synonym_index.json）にコンパイルする'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=INDEX_PATH, help='出力先のパス')
+
+    def handle(self, *args, **options):
+        index = synonym_dict.compile_index()
+        save_index(index, options['output'])
+
+        # 古い辞書で生成した展開結果を破棄
+        synonym_dict.index = index
+        synonym_dict.clear_memory_cache(shared=True)
+        deleted, _ = SynonymCache.objects.all().delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(index['groups'])} groups / {len(index['variants'])} variants to {options['output']} "
+            f"(cleared {deleted} cached expansions)"
+        ))
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from folders.cache_jobs import enqueue_refresh, run_job, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'フォルダキャッシュを更新する（--interval を指定すると定期実行するスケジューラとして動作）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder-id', default=settings.GOOGLE_DRIVE_FOLDER_ID, help='ルートフォルダID')
+        parser.add_argument('--force', action='store_true', help='差分同期せず全体を再構築する')
+        parser.add_argument('--pending', action='store_true', help='登録済みのジョブだけを実行する')
+        parser.add_argument('--interval', type=int, default=0, help='更新の間隔（秒）。0 なら1回だけ実行')
+
+    def handle(self, *args, **options):
+        while True:
+            if options['pending']:
+                count = run_pending_jobs()
+                self.stdout.write(f"Ran {count} pending cache jobs")
+            else:
+                self._refresh(options['folder_id'], options['force'])
+
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
+
+    def _refresh(self, folder_id, force):
+        # このプロセス内で実行する（ジョブとして記録し、他のワーカーとはロックで排他）
+        job = enqueue_refresh(folder_id, force=force, run_in_process=False)
+        job = run_job(job.id) or job
+        self.stdout.write(f"Cache job {job.id}: {job.status} ({job.folder_count or 0} folders) {job.message}".rstrip())
@@ -0,0 +1,56 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from folders.cache_jobs import enqueue_refresh, run_job
+from folders.cache_service import FolderCacheService
+from folders.drive_client import get_drive_service
+from folders.file_index import FileIndexService
+from folders.snapshot import export_snapshot, import_snapshot
+from folders.tiered_cache import write_behind
+from search.synonyms import synonym_dict
+
+
+class Command(BaseCommand):
+    help = 'フォルダツリー・ファイルインデックス・類義語のキャッシュを事前に構築する（スナップショットの書き出し/取り込みも可能）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folder-id', default=settings.GOOGLE_DRIVE_FOLDER_ID, help='ルートフォルダID')
+        parser.add_argument('--force', action='store_true', help='キャッシュが新しくても再構築する')
+        parser.add_argument('--import', dest='import_path', help='このスナップショットを取り込む（Drive はクロールしない）')
+        parser.add_argument('--export', dest='export_path', help='構築後のキャッシュをこのパスに書き出す')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+
+        if options['import_path']:
+            counts = import_snapshot(options['import_path'])
+            self.stdout.write(f"Imported snapshot {options['import_path']}: {counts}")
+        else:
+            self._warm_folder_cache(options['folder_id'], options['force'])
+
+        # 辞書の全見出し語を展開して SynonymCache に保存
+        synonyms = synonym_dict.get_synonyms_many(synonym_dict.dictionary.keys())
+        # DB への保存はバックグラウンドで行われるので、書き出し・終了の前に書き終える
+        write_behind.flush()
+        self.stdout.write(f"Expanded {len(synonyms)} synonym entries")
+
+        if options['export_path']:
+            counts = export_snapshot(options['export_path'])
+            self.stdout.write(f"Exported snapshot {options['export_path']}: {counts}")
+
+        self.stdout.write(self.style.SUCCESS(f"Cache warmed in {time.time() - start_time:.2f}s"))
+
+    def _warm_folder_cache(self, folder_id, force):
+        cache_service = FolderCacheService(get_drive_service())
+        file_index = FileIndexService()
+
+        # ファイルインデックスは差分同期では作られないので、未作成なら全体を構築
+        needs_index = cache_service.index_files and not file_index.is_indexed(folder_id)
+        if not force and not needs_index and cache_service._is_cache_fresh(folder_id):
+            self.stdout.write(f"Folder cache for {folder_id} is fresh, skipping crawl")
+            return
+
+        # Web ワーカーの更新ジョブとはロックで排他
+        job = enqueue_refresh(folder_id, force=force or needs_index, run_in_process=False)
+        job = run_job(job.id) or job
+        self.stdout.write(f"Cache job {job.id}: {job.status} ({job.folder_count or 0} folders) {job.message}".rstrip())
@@ -0,0 +1,191 @@
+"""
+メトリクス: 検索パイプラインの段階ごとの所要時間・Drive API の呼び出し・キャッシュのヒット率を集計し、
+Prometheus のテキスト形式で出力する
+
+値はプロセスごとに保持する（gunicorn のワーカーごとに別々に集計される）
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+# 所要時間（秒）のバケット
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 件数のバケット
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_registry: List['_Metric'] = []
+
+
+class _Metric(ABC):
+    type_name = ''
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            values = dict(self._values)
+        for key in sorted(values):
+            lines.extend(self._render_value(key, values[key]))
+        return lines
+
+    @abstractmethod
+    def _render_value(self, key, value) -> List[str]:
+        """1つのラベルの組の値を出力行にする"""
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}"]
+
+
+class Histogram(_Metric):
+    """値の分布（バケットごとの件数・合計・件数）"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts = list(counts)
+                counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = self._format_labels(key, (('le', _format_number(bound)),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', '+Inf'),))} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render() -> str:
+    """
+    全メトリクスを Prometheus のテキスト形式で出力
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+SEARCH_STAGE_SECONDS = Histogram(
+    'drive_explorer_stage_seconds', 'Time spent in each stage of a request', ('view', 'stage')
+)
+SEARCH_RESULTS = Histogram(
+    'drive_explorer_search_results', 'Number of results returned by a search', ('source',), buckets=COUNT_BUCKETS
+)
+DRIVE_BATCH_SECONDS = Histogram(
+    'drive_explorer_drive_batch_seconds', 'Latency of a single Drive batch request', ('kind',)
+)
+DRIVE_SUBREQUEST_ERRORS = Counter(
+    'drive_explorer_drive_subrequest_errors_total', 'Failed Drive sub-requests inside batch requests', ('kind', 'retryable')
+)
+CACHE_REQUESTS = Counter(
+    'drive_explorer_cache_requests_total', 'Cache lookups by cache and result (hit / miss / stale)', ('cache', 'result')
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    'drive_explorer_single_flight_total',
+    'Coalesced calls by role (leader = ran it, shared = waited in-process, remote = used another worker\'s result, '
+    'fallback / timeout = gave up waiting and returned a fallback / an error)',
+    ('flight', 'role')
+)
+
+
+class StageTimer:
+    """1リクエスト内の段階ごとの所要時間を計測し、ヒストグラムと Server-Timing ヘッダーに使う"""
+
+    def __init__(self, view: str):
+        """
+        Args:
+            view: 計測対象のビュー名（メトリクスのラベル）
+        """
+        self.view = view
+        self.start_time = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        with ブロックの所要時間を段階 name として記録
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        SEARCH_STAGE_SECONDS.observe(seconds, view=self.view, stage=name)
+
+    def finish(self) -> float:
+        """
+        リクエスト全体の所要時間を total として記録
+        """
+        total = time.perf_counter() - self.start_time
+        self.record('total', total)
+        return total
+
+    def as_ms(self) -> Dict[str, int]:
+        """
+        段階名_ms → ミリ秒
+        """
+        return {f'{name}_ms': round(seconds * 1000) for name, seconds in self.durations.items()}
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing ヘッダーの値（例: "cache;dur=12.3, search;dur=450.1"）
+        """
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.durations.items())
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='last_accessed',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='searchresultcache',
+            name='root_folder_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0002_searchresultcache_lru'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriveSyncState',
+            fields=[
+                ('root_folder_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('start_page_token', models.CharField(max_length=255)),
+                ('last_synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'drive_sync_state',
+            },
+        ),
+    ]
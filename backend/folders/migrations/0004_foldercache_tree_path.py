@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+def backfill_tree_paths(apps, schema_editor):
+    """既存のキャッシュ行に parent_id から祖先IDの経路を設定"""
+    FolderCache = apps.get_model('folders', 'FolderCache')
+    parents = dict(FolderCache.objects.values_list('folder_id', 'parent_id'))
+    tree_paths = {}
+
+    def resolve(folder_id):
+        chain = []
+        while folder_id is not None and folder_id not in tree_paths and folder_id not in chain:
+            chain.append(folder_id)
+            folder_id = parents.get(folder_id)
+        prefix = tree_paths.get(folder_id, '/')
+        for node_id in reversed(chain):
+            prefix = f"{prefix}{node_id}/"
+            tree_paths[node_id] = prefix
+
+    for folder_id in parents:
+        resolve(folder_id)
+        FolderCache.objects.filter(folder_id=folder_id).update(tree_path=tree_paths[folder_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0003_drivesyncstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foldercache',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=768),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
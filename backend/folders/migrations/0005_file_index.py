@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:58
+
+from django.db import migrations, models
+
+
+SQLITE_FTS_STATEMENTS = [
+    # trigram トークナイザで日本語を含む部分一致検索をインデックス化（SQLite 3.34+）
+    "CREATE VIRTUAL TABLE file_index_fts USING fts5(file_id UNINDEXED, name, tokenize='trigram')",
+    """CREATE TRIGGER file_index_fts_insert AFTER INSERT ON file_index BEGIN
+        INSERT INTO file_index_fts (file_id, name) VALUES (new.file_id, new.name);
+    END""",
+    """CREATE TRIGGER file_index_fts_update AFTER UPDATE OF name ON file_index BEGIN
+        UPDATE file_index_fts SET name = new.name WHERE file_id = old.file_id;
+    END""",
+    """CREATE TRIGGER file_index_fts_delete AFTER DELETE ON file_index BEGIN
+        DELETE FROM file_index_fts WHERE file_id = old.file_id;
+    END""",
+]
+
+
+def create_full_text_index(apps, schema_editor):
+    """DBごとの全文検索インデックスを作成（作成できない場合は部分一致検索で代替）"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(name, tokenize='trigram')")
+                cursor.execute("DROP TABLE temp.fts_probe")
+        except Exception:
+            return
+        for statement in SQLITE_FTS_STATEMENTS:
+            schema_editor.execute(statement)
+    elif vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE file_index ADD FULLTEXT INDEX file_index_name_ngram (name) WITH PARSER ngram")
+
+
+def drop_full_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in ('file_index_fts_insert', 'file_index_fts_update', 'file_index_fts_delete'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute("DROP TABLE IF EXISTS file_index_fts")
+    elif vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE file_index DROP INDEX file_index_name_ngram")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0004_foldercache_tree_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileIndex',
+            fields=[
+                ('file_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('parent_id', models.CharField(db_index=True, max_length=255)),
+                ('name', models.CharField(max_length=512)),
+                ('mime_type', models.CharField(max_length=255)),
+                ('web_view_link', models.TextField(blank=True, default='')),
+                ('tree_path', models.CharField(db_index=True, max_length=768)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 'file_index',
+            },
+        ),
+        migrations.AddField(
+            model_name='foldercache',
+            name='files_indexed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0005_file_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolderListingCache',
+            fields=[
+                ('folder_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('items_json', models.JSONField()),
+                ('etag', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'folder_listing_cache',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:15
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('folders', '0006_folderlistingcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('root_folder_id', models.CharField(db_index=True, max_length=255)),
+                ('force', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('skipped', 'Skipped')], db_index=True, default='queued', max_length=16)),
+                ('progress', models.IntegerField(default=0)),
+                ('folder_count', models.IntegerField(blank=True, null=True)),
+                ('message', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'cache_job',
+            },
+        ),
+        migrations.CreateModel(
+            name='CacheLock',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=255)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'cache_lock',
+            },
+        ),
+    ]
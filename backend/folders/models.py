@@ -1,4 +1,6 @@
+import uuid
 from django.db import models
+from django.utils import timezone
 
 
 class FolderCache(models.Model):
@@ -7,8 +9,10 @@ class FolderCache(models.Model):
     parent_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
     name = models.CharField(max_length=512)
     path = models.TextField()  # 表示用の完全パス
+    tree_path = models.CharField(max_length=768, blank=True, default='', db_index=True)  # 祖先IDの経路（例: /root/child/）
     last_updated = models.DateTimeField(auto_now=True, db_index=True)
     is_active = models.BooleanField(default=True)
+    files_indexed = models.BooleanField(default=False)  # 配下のファイルが FileIndex に登録済みか
 
     class Meta:
         db_table = 'folder_cache'
@@ -17,13 +21,48 @@ class FolderCache(models.Model):
         return f"{self.name} ({self.folder_id})"
 
 
+class FileIndex(models.Model):
+    """ファイル名検索用のローカルインデックス（PDFのメタデータ）"""
+    file_id = models.CharField(max_length=255, primary_key=True)
+    parent_id = models.CharField(max_length=255, db_index=True)
+    name = models.CharField(max_length=512)
+    mime_type = models.CharField(max_length=255)
+    web_view_link = models.TextField(blank=True, default='')
+    tree_path = models.CharField(max_length=768, db_index=True)  # 親フォルダの経路
+    last_updated = models.DateTimeField(auto_now=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = 'file_index'
+
+    def __str__(self):
+        return f"{self.name} ({self.file_id})"
+
+
+class FolderListingCache(models.Model):
+    """フォルダ直下の一覧（ナビゲーション用）のキャッシュ"""
+    folder_id = models.CharField(max_length=255, primary_key=True)
+    items_json = models.JSONField()
+    etag = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'folder_listing_cache'
+
+    def __str__(self):
+        return f"Listing for: {self.folder_id}"
+
+
 class SearchResultCache(models.Model):
     """検索結果のキャッシュ"""
     query_hash = models.CharField(max_length=64, primary_key=True)
     query_text = models.TextField()
+    root_folder_id = models.CharField(max_length=255, blank=True, default='', db_index=True)
     results_json = models.JSONField()
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(db_index=True)
+    last_accessed = models.DateTimeField(default=timezone.now, db_index=True)  # LRU用
 
     class Meta:
         db_table = 'search_result_cache'
@@ -43,3 +82,62 @@ class SynonymCache(models.Model):
 
     def __str__(self):
         return f"Synonyms for: {self.word}"
+
+
+class DriveSyncState(models.Model):
+    """Drive Changes API による差分同期の状態"""
+    root_folder_id = models.CharField(max_length=255, primary_key=True)
+    start_page_token = models.CharField(max_length=255)
+    last_synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'drive_sync_state'
+
+    def __str__(self):
+        return f"Sync state for: {self.root_folder_id}"
+
+
+class CacheLock(models.Model):
+    """ワーカー間で処理を1つに絞るためのロック（期限切れのロックは奪える）"""
+    name = models.CharField(max_length=255, primary_key=True)
+    owner = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'cache_lock'
+
+    def __str__(self):
+        return f"Lock {self.name} held by {self.owner}"
+
+
+class CacheJob(models.Model):
+    """フォルダキャッシュのバックグラウンド更新ジョブ"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SKIPPED, 'Skipped'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    root_folder_id = models.CharField(max_length=255, db_index=True)
+    force = models.BooleanField(default=False)  # True なら差分同期せず全体を再構築
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    progress = models.IntegerField(default=0)  # クロール済みのフォルダ数
+    folder_count = models.IntegerField(null=True, blank=True)
+    message = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'cache_job'
+
+    def __str__(self):
+        return f"Cache job {self.id} ({self.status})"
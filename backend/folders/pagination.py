@@ -0,0 +1,130 @@
+"""
+カーソル方式のページング: サーバー側に保持した結果セット（検索結果キャッシュ・一覧キャッシュ）から1ページ分を切り出す
+"""
+import base64
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+class InvalidCursor(Exception):
+    """カーソルの形式が不正"""
+
+
+class CursorExpired(Exception):
+    """カーソルを発行した時点から結果セットが変わった"""
+
+
+def result_set_version(items: List[Dict]) -> str:
+    """
+    結果セットの版（ファイルIDの並びのハッシュ）を計算
+
+    Args:
+        items: 結果セット
+
+    Returns:
+        版を表す文字列
+    """
+    digest = hashlib.sha256('\n'.join(item['id'] for item in items).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def encode_cursor(offset: int, version: str) -> str:
+    """
+    次ページの位置と結果セットの版をカーソル文字列にする
+    """
+    payload = json.dumps({'o': offset, 'v': version}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    カーソル文字列から (位置, 結果セットの版) を取り出す
+
+    Raises:
+        InvalidCursor: カーソルの形式が不正な場合
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset, version = int(payload['o']), str(payload['v'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if offset < 0:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return offset, version
+
+
+def paginate(items: List[Dict], limit: int, cursor: Optional[str], version: str) -> Tuple[List[Dict], Optional[str]]:
+    """
+    結果セットから1ページ分を切り出す
+
+    Args:
+        items: 結果セット
+        limit: 1ページの件数
+        cursor: 前のページで返したカーソル（None なら先頭から）
+        version: 結果セットの版
+
+    Returns:
+        (ページ内の要素のリスト, 次ページのカーソル（最後のページなら None）) のタプル
+
+    Raises:
+        InvalidCursor: カーソルの形式が不正な場合
+        CursorExpired: カーソル発行後に結果セットが変わった場合
+    """
+    offset = 0
+    if cursor:
+        offset, cursor_version = decode_cursor(cursor)
+        if cursor_version != version:
+            raise CursorExpired("Result set has changed since the cursor was issued")
+
+    end = offset + limit
+    next_cursor = encode_cursor(end, version) if end < len(items) else None
+    return items[offset:end], next_cursor
+
+
+def paginate_request(query_params, items: List[Dict], version: str, default_limit: int = 0, max_limit: int = 500) -> Tuple[int, object, Dict[str, str]]:
+    """
+    ?limit= と ?cursor= に従って結果セットから1ページ分のレスポンス内容を作る
+
+    limit 指定時は {"items", "next_cursor", "total"} を返す。未指定の場合は配列を返し、
+    default_limit 件で切った場合は次ページのカーソルを X-Next-Cursor ヘッダーで返す
+
+    Args:
+        query_params: リクエストのクエリパラメータ
+        items: 結果セット
+        version: 結果セットの版
+        default_limit: limit 未指定時の件数（0 なら全件）
+        max_limit: limit の上限
+
+    Returns:
+        (ステータスコード, 本文, ヘッダー) のタプル
+    """
+    try:
+        limit = _parse_limit(query_params.get('limit'), max_limit)
+        page, next_cursor = paginate(items, limit or default_limit or len(items) or 1, query_params.get('cursor'), version)
+    except CursorExpired as e:
+        return 410, {"error": str(e)}, {}
+    except InvalidCursor as e:
+        return 400, {"error": str(e)}, {}
+
+    if limit is not None:
+        return 200, {"items": page, "next_cursor": next_cursor, "total": len(items)}, {}
+    return 200, page, ({'X-Next-Cursor': next_cursor} if next_cursor else {})
+
+
+def _parse_limit(limit: Optional[str], max_limit: int) -> Optional[int]:
+    """
+    limit を整数に変換（未指定なら None）
+
+    Raises:
+        InvalidCursor: 正の整数でない場合
+    """
+    if limit is None:
+        return None
+    try:
+        value = int(limit)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        raise InvalidCursor(f"Invalid limit: {limit}")
+    return min(value, max_limit)
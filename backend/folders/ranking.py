@@ -0,0 +1,110 @@
+"""
+検索結果のランキング: ファイルIDで重複を除き、キーワードとの一致度でスコアを付けて並べ替える
+"""
+import logging
+from typing import Dict, List, Tuple
+from .models import FolderCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class SearchResultRanker:
+    """検索結果のスコアリングと並べ替え"""
+
+    # 入力したキーワードそのものの一致は、類義語での一致より優先
+    EXACT_MATCH_SCORE = 100
+    SYNONYM_MATCH_SCORE = 60
+    # ファイル名の先頭に近い位置での一致ほど加点
+    POSITION_SCORE = 20
+    # ルートから深い階層のファイルほど減点（上限あり）
+    DEPTH_PENALTY = 2
+    MAX_DEPTH_PENALTY = 10
+
+    def __init__(self, keyword_synonyms: List[Tuple[str, List[str]]]):
+        """
+        Args:
+            keyword_synonyms: (入力キーワード, 類義語リスト) のリスト
+        """
+        self.keyword_synonyms = [
+            (keyword.casefold(), [synonym.casefold() for synonym in synonyms if synonym])
+            for keyword, synonyms in keyword_synonyms
+        ]
+
+    def rank(self, root_folder_id: str, items: List[Dict]) -> List[Dict]:
+        """
+        重複を除いてスコアの高い順に並べ替え（同点は名前順）
+
+        Args:
+            root_folder_id: ルートフォルダID
+            items: 検索結果のリスト
+
+        Returns:
+            並べ替えた検索結果のリスト
+        """
+        unique = {}
+        for item in items:
+            unique.setdefault(item['id'], item)
+
+        depths = self._folder_depths(root_folder_id, {
+            parent for item in unique.values() for parent in item.get('parents', [])[:1]
+        })
+        scored = [
+            (self.score(item, depths.get((item.get('parents') or [None])[0], 0)), item)
+            for item in unique.values()
+        ]
+        scored.sort(key=lambda pair: (-pair[0], pair[1]['name'], pair[1]['id']))
+        return [item for _, item in scored]
+
+    def score(self, item: Dict, depth: int) -> float:
+        """
+        1件のスコアを計算
+
+        Args:
+            item: 検索結果
+            depth: 親フォルダのルートからの深さ
+
+        Returns:
+            スコア
+        """
+        name = item.get('name', '').casefold()
+        score = 0.0
+        for keyword, synonyms in self.keyword_synonyms:
+            position = name.find(keyword)
+            if position >= 0:
+                score += self.EXACT_MATCH_SCORE
+            else:
+                positions = [p for p in (name.find(synonym) for synonym in synonyms) if p >= 0]
+                if not positions:
+                    continue
+                position = min(positions)
+                score += self.SYNONYM_MATCH_SCORE
+            score += self.POSITION_SCORE * (1 - position / max(len(name), 1))
+
+        return score - min(depth * self.DEPTH_PENALTY, self.MAX_DEPTH_PENALTY)
+
+    @staticmethod
+    def _folder_depths(root_folder_id: str, folder_ids, chunk_size: int = 500) -> Dict[str, int]:
+        """
+        キャッシュ済みのフォルダツリーから、ルートを0とした各フォルダの深さを取得
+
+        Args:
+            root_folder_id: ルートフォルダID
+            folder_ids: フォルダIDの集合
+
+        Returns:
+            フォルダID → 深さ（キャッシュにないフォルダは含まない）
+        """
+        root_path = FolderCache.objects.filter(folder_id=root_folder_id).values_list('tree_path', flat=True).first()
+        if not root_path:
+            return {}
+
+        root_depth = root_path.count('/')
+        folder_ids = list(folder_ids)
+        depths = {}
+        for i in range(0, len(folder_ids), chunk_size):
+            for folder_id, tree_path in FolderCache.objects.filter(
+                folder_id__in=folder_ids[i:i+chunk_size]
+            ).values_list('folder_id', 'tree_path'):
+                depths[folder_id] = max(tree_path.count('/') - root_depth, 0)
+        return depths
@@ -0,0 +1,114 @@
+"""
+キャッシュのスナップショット: フォルダツリー・ファイルインデックス・同期トークン・類義語をファイルに書き出し/取り込む
+"""
+import gzip
+import json
+import logging
+from typing import Dict
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import DriveSyncState, FileIndex, FolderCache, SynonymCache
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# スナップショットに含めるモデル（検索結果・一覧のキャッシュは寿命が短いので含めない）
+SNAPSHOT_MODELS = [FolderCache, FileIndex, DriveSyncState, SynonymCache]
+
+
+def export_snapshot(path: str) -> Dict[str, int]:
+    """
+    キャッシュを gzip 圧縮した JSON に書き出す
+
+    Args:
+        path: 出力先のパス
+
+    Returns:
+        テーブル名 → 書き出した行数
+    """
+    tables = {
+        model._meta.db_table: list(model.objects.values(*_field_names(model)))
+        for model in SNAPSHOT_MODELS
+    }
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': timezone.now(),
+        'tables': tables,
+    }
+
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+    counts = {table: len(rows) for table, rows in tables.items()}
+    logger.info(f"Exported cache snapshot to {path}: {counts}")
+    return counts
+
+
+def import_snapshot(path: str) -> Dict[str, int]:
+    """
+    スナップショットを取り込む（既存の行は上書きし、更新日時も書き出した時点の値に戻す）
+
+    Args:
+        path: スナップショットのパス
+
+    Returns:
+        テーブル名 → 取り込んだ行数
+
+    Raises:
+        ValueError: 対応していない形式の場合
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        snapshot = json.load(f)
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {snapshot.get('version')}")
+
+    batch_size = getattr(settings, 'FOLDER_CACHE_WRITE_BATCH_SIZE', 500)
+    counts = {}
+    with transaction.atomic():
+        for model in SNAPSHOT_MODELS:
+            rows = snapshot['tables'].get(model._meta.db_table, [])
+            counts[model._meta.db_table] = len(rows)
+            if not rows:
+                continue
+
+            datetime_fields = [
+                field.name for field in model._meta.concrete_fields
+                if field.get_internal_type() == 'DateTimeField'
+            ]
+            for row in rows:
+                for name in datetime_fields:
+                    if row.get(name):
+                        row[name] = parse_datetime(row[name])
+
+            # MySQL は衝突対象カラムの指定をサポートしない
+            pk_name = model._meta.pk.name
+            unique_fields = [pk_name] if connection.features.supports_update_conflicts_with_target else None
+            model.objects.bulk_create(
+                [model(**row) for row in rows],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=[name for name in _field_names(model) if name != pk_name],
+            )
+
+            # bulk_create は auto_now の日時を取り込んだ時刻で上書きするため、書き出した値に戻す
+            # （古いスナップショットのツリーが新しいとみなされ、同期されないまま使われないように）
+            auto_fields = [
+                field.name for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            ]
+            if auto_fields:
+                model.objects.bulk_update([model(**row) for row in rows], auto_fields, batch_size=batch_size)
+
+    logger.info(f"Imported cache snapshot from {path}: {counts}")
+    return counts
+
+
+def _field_names(model):
+    return [field.name for field in model._meta.concrete_fields]
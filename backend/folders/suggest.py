@@ -0,0 +1,333 @@
+"""
+入力候補: キャッシュ済みのフォルダ名・ファイル名と類義語辞書の語から、前方一致で検索語の候補を返す
+
+正規化したキー（かな・ローマ字の読みを含む）のソート済み配列を二分探索する。インデックスは
+プロセス内に保持し、フォルダキャッシュ・ファイルインデックスの更新日時を見て変わった行だけを反映する。
+作成・反映はバックグラウンドのスレッドで行い、変更の有無は階層キャッシュの版で確認する（リクエストごとに DB へは問い合わせない）
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+from django.db import connection
+from search.synonyms import HAS_JACONV, HAS_ROMKAN, synonym_dict
+from .models import FileIndex, FolderCache
+from .tiered_cache import TieredCache
+
+if HAS_JACONV:
+    import jaconv
+if HAS_ROMKAN:
+    import romkan
+
+
+logger = logging.getLogger(__name__)
+
+# 名前を語に分割する区切り（空白・記号・括弧類）
+WORD_SEPARATOR = re.compile(r"[\s_\-.,;:!?/\\()\[\]{}<>「」『』【】（）・、。～〜]+")
+# 拡張子
+EXTENSION = re.compile(r"\.[A-Za-z0-9]{1,5}$")
+
+# フォルダキャッシュ・ファイルインデックスの版（更新のたびに変わり、全ワーカーのインデックスに反映を促す）
+_data_versions = TieredCache('suggest_version', l1_seconds=getattr(settings, 'SUGGEST_REFRESH_SECONDS', 5))
+DATA_VERSION_KEY = 'data'
+
+
+def mark_changed() -> str:
+    """
+    フォルダキャッシュ・ファイルインデックスが更新されたことを全ワーカーに知らせる
+
+    Returns:
+        新しい版
+    """
+    version = uuid.uuid4().hex
+    _data_versions.set(DATA_VERSION_KEY, version)
+    return version
+
+
+def split_words(name: str) -> List[str]:
+    """
+    フォルダ名・ファイル名を候補にする語に分割（拡張子・数字だけの語・1文字の英数字は除く）
+    """
+    words = []
+    for word in WORD_SEPARATOR.split(EXTENSION.sub('', name or '')):
+        if not word or word.isdigit() or (len(word) < 2 and word.isascii()):
+            continue
+        words.append(word)
+    return words
+
+
+def reading_keys(term: str) -> List[str]:
+    """
+    語の検索キー（正規化した表記・ひらがな読み・ローマ字読み）を返す
+    """
+    normalized = synonym_dict.normalize(term)
+    keys = [normalized]
+    if HAS_JACONV:
+        hiragana = jaconv.kata2hira(normalized)
+        keys.append(hiragana)
+        if HAS_ROMKAN and not normalized.isascii():
+            try:
+                romaji = romkan.to_roma(hiragana)
+            except Exception:
+                romaji = ''
+            # かな以外（漢字など）が残る場合は読みとして使えない
+            if romaji and romaji.isascii():
+                keys.append(romaji)
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def query_key(prefix: str) -> str:
+    """
+    入力中の文字列を検索キーの形に揃える（カタカナはひらがなに）
+    """
+    normalized = synonym_dict.normalize(prefix)
+    if HAS_JACONV:
+        normalized = jaconv.kata2hira(normalized)
+    return normalized
+
+
+class _Term:
+    """候補の語（出現する経路ごとの件数と、辞書の語かどうか）"""
+    __slots__ = ('keys', 'paths', 'in_dictionary')
+
+    def __init__(self, keys: List[str]):
+        self.keys = keys
+        self.paths = Counter()
+        self.in_dictionary = False
+
+    @property
+    def count(self) -> int:
+        return sum(self.paths.values())
+
+
+class SuggestIndex:
+    """前方一致で語の候補を返すインデックス（プロセス内で共有）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # DB からの読み込みは1度に1つだけ（候補の検索は self._lock だけを取る）
+        self._refresh_lock = threading.Lock()
+        # (キー, 語) のソート済み配列
+        self._keys = []
+        self._terms: Dict[str, _Term] = {}
+        # 要素ID → (名前, 経路)（変更時に古い名前の語を取り除くため）
+        self._items: Dict[str, tuple] = {}
+        # 配列への反映を待っている (キー, 語)
+        self._added = []
+        self._removed = []
+        self._watermarks = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._ready = False
+        self._dictionary_loaded = False
+
+    def suggest(self, prefix: str, root_folder_id: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """
+        前方一致する語の候補を返す（インデックスの作成中は空のリスト）
+
+        Args:
+            prefix: 入力中の文字列
+            root_folder_id: このフォルダ配下に出現する語に絞る（辞書の語は常に含める）
+            limit: 最大件数
+
+        Returns:
+            {"term", "count"（配下での出現数）, "synonym"（辞書の語か）} のリスト（完全一致・出現数の多い順）
+        """
+        key = query_key(prefix)
+        if not key:
+            return []
+        self.refresh_if_changed()
+        if not self._ready:
+            return []
+
+        scan_limit = getattr(settings, 'SUGGEST_SCAN_LIMIT', 2000)
+        candidates = {}
+        with self._lock:
+            root_tree_path = self._items.get(root_folder_id, (None, None))[1] if root_folder_id else None
+            position = bisect_left(self._keys, (key, ''))
+            for matched_key, word in self._keys[position:position + scan_limit]:
+                if not matched_key.startswith(key):
+                    break
+                if word in candidates:
+                    continue
+                term = self._terms[word]
+                if root_tree_path:
+                    count = sum(n for path, n in term.paths.items() if path.startswith(root_tree_path))
+                else:
+                    count = term.count
+                if count or term.in_dictionary:
+                    candidates[word] = (matched_key == key, count, term.in_dictionary)
+
+        ranked = sorted(candidates.items(), key=lambda entry: (not entry[1][0], -entry[1][1], len(entry[0]), entry[0]))
+        return [
+            {'term': word, 'count': count, 'synonym': in_dictionary}
+            for word, (_, count, in_dictionary) in ranked[:limit]
+        ]
+
+    def refresh_if_changed(self):
+        """
+        フォルダキャッシュ・ファイルインデックスの版が変わっていれば、バックグラウンドで反映（SUGGEST_REFRESH_SECONDS ごとに確認）
+        """
+        now = time.monotonic()
+        if now - self._checked_at < getattr(settings, 'SUGGEST_REFRESH_SECONDS', 5):
+            return
+        self._checked_at = now
+
+        version = _data_versions.get(DATA_VERSION_KEY)
+        if version is None:
+            # 共有キャッシュから消えた場合は、新しい版にして全ワーカーで読み直す
+            version = mark_changed()
+        if version == self._version or self._refreshing:
+            return
+        self._refreshing = True
+        self._schedule_refresh(version)
+
+    def _schedule_refresh(self, version: str):
+        """バックグラウンドのスレッドで refresh を実行"""
+        def run():
+            try:
+                self.refresh(version)
+            except Exception as e:
+                logger.error(f"Failed to refresh suggest index: {e}")
+            finally:
+                connection.close()
+
+        threading.Thread(target=run, name='suggest-refresh', daemon=True).start()
+
+    def refresh(self, version: Optional[str] = None):
+        """
+        前回から変わったフォルダ・ファイルの名前をインデックスに反映（DB の読み込み中も候補を返せる）
+
+        Args:
+            version: 反映した時点の版（refresh_if_changed が次に比較する）
+        """
+        try:
+            with self._refresh_lock:
+                start_time = time.time()
+                watermarks = dict(self._watermarks)
+                rows = []
+                for model, id_field in ((FolderCache, 'folder_id'), (FileIndex, 'file_id')):
+                    query = model.objects.all()
+                    watermark = watermarks.get(model)
+                    if watermark is None:
+                        query = query.filter(is_active=True)
+                    else:
+                        # 同じ更新日時の行を取りこぼさないよう境界を含める（反映は冪等）
+                        query = query.filter(last_updated__gte=watermark)
+                    for item_id, name, tree_path, is_active, last_updated in query.values_list(
+                        id_field, 'name', 'tree_path', 'is_active', 'last_updated'
+                    ).iterator():
+                        rows.append((item_id, name, tree_path, is_active))
+                        if watermark is None or last_updated > watermark:
+                            watermark = last_updated
+                    watermarks[model] = watermark
+
+                with self._lock:
+                    if not self._dictionary_loaded:
+                        self._load_dictionary()
+                    changed = sum(self._update_item(*row) for row in rows)
+                    self._merge_keys()
+                    self._watermarks = watermarks
+                    self._version = version or self._version
+                    self._ready = True
+
+                if changed:
+                    logger.info(f"Suggest index updated: {changed} items changed, {len(self._terms)} terms in {time.time() - start_time:.2f}s")
+        finally:
+            self._refreshing = False
+
+    def clear(self):
+        """インデックスを破棄（次の候補検索で作り直す）"""
+        with self._lock:
+            self._keys = []
+            self._terms = {}
+            self._items = {}
+            self._added = []
+            self._removed = []
+            self._watermarks = {}
+            self._version = None
+            self._checked_at = 0.0
+            self._ready = False
+            self._dictionary_loaded = False
+
+    def _load_dictionary(self):
+        """類義語辞書の見出し語と類義語を候補に加える"""
+        words = set(synonym_dict.dictionary)
+        for synonyms in synonym_dict.dictionary.values():
+            words.update(synonyms)
+        for word in words:
+            self._term(word).in_dictionary = True
+        self._dictionary_loaded = True
+
+    def _update_item(self, item_id: str, name: str, tree_path: str, is_active: bool) -> int:
+        """
+        1要素の名前の語を差し替え
+
+        Returns:
+            変更があれば 1
+        """
+        current = (name, tree_path) if is_active else None
+        previous = self._items.get(item_id)
+        if previous == current:
+            return 0
+
+        if previous is not None:
+            self._remove_words(split_words(previous[0]), previous[1])
+        if current is None:
+            self._items.pop(item_id, None)
+        else:
+            self._items[item_id] = current
+            for word in split_words(name):
+                self._term(word).paths[tree_path] += 1
+        return 1
+
+    def _term(self, word: str) -> _Term:
+        term = self._terms.get(word)
+        if term is None:
+            term = self._terms[word] = _Term(reading_keys(word))
+            self._added.extend((key, word) for key in term.keys)
+        return term
+
+    def _remove_words(self, words: Iterable[str], tree_path: str):
+        for word in words:
+            term = self._terms.get(word)
+            if term is None:
+                continue
+            term.paths[tree_path] -= 1
+            if term.paths[tree_path] <= 0:
+                del term.paths[tree_path]
+            if not term.paths and not term.in_dictionary:
+                del self._terms[word]
+                self._removed.extend((key, word) for key in term.keys)
+
+    def _merge_keys(self):
+        """
+        追加・削除された語をソート済み配列に反映（少なければ挿入・削除、多ければ作り直す）
+        """
+        if not self._added and not self._removed:
+            return
+
+        if len(self._added) + len(self._removed) > getattr(settings, 'SUGGEST_MERGE_THRESHOLD', 256):
+            self._keys = sorted((key, word) for word, term in self._terms.items() for key in term.keys)
+        else:
+            # 同じ反映待ちの間に追加と削除の両方があった語は、現在の状態に合わせる
+            for key, word in self._removed:
+                position = bisect_left(self._keys, (key, word))
+                if word not in self._terms and position < len(self._keys) and self._keys[position] == (key, word):
+                    del self._keys[position]
+            for key, word in self._added:
+                position = bisect_left(self._keys, (key, word))
+                if word in self._terms and (position == len(self._keys) or self._keys[position] != (key, word)):
+                    self._keys.insert(position, (key, word))
+
+        self._added = []
+        self._removed = []
+
+
+suggest_index = SuggestIndex()
@@ -1,3 +1,1058 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from urllib.parse import quote
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from search.query_planner import prune_terms
+from search.synonym_index import compile_index, load_index
+from search.synonyms import HAS_NLP_LIBS, synonym_dict
+from .cache_jobs import enqueue_refresh, run_job
+from .cache_service import BatchSearchService, FolderCacheService, SearchResultCacheService
+from .drive_client import HAS_HTTPX, _refresh_if_expiring, get_async_http_client
+from .file_index import FileIndexService
+from .fake_drive import FOLDER_MIME_TYPE, PDF_MIME_TYPE, FakeDriveService, make_tree
+from .metrics import CACHE_REQUESTS
+from .locks import SingleFlight, SingleFlightTimeout, acquire_lock
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_request
+from .ranking import SearchResultRanker
+from .snapshot import export_snapshot, import_snapshot
+from .suggest import SuggestIndex
+from .tiered_cache import TieredCache
+from .models import CacheJob, CacheLock, DriveSyncState, FileIndex, FolderCache, SynonymCache
+
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'folders-tests'}}
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    CACHE_WRITE_BEHIND=False,
+    ENABLE_FILE_INDEX=True,
+    FOLDER_CACHE_INCREMENTAL_SYNC=True,
+    DRIVE_API_BACKOFF_SECONDS=0,
+)
+class SyncFolderCacheTests(TestCase):
+    """Changes API による差分同期（_apply_changes）のテスト"""
+
+    def setUp(self):
+        # root → folder-1, folder-4 → それぞれ2つのサブフォルダ、各フォルダに1ファイル
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=2, files_per_folder=1, root_id='root'))
+        self.service = FolderCacheService(self.drive)
+        self.service.build_folder_cache('root')
+
+    def sync(self):
+        return set(self.service.sync_folder_cache('root'))
+
+    def active_folder_ids(self):
+        return set(FolderCache.objects.filter(is_active=True).values_list('folder_id', flat=True))
+
+    def active_file_ids(self):
+        return set(FileIndex.objects.filter(is_active=True).values_list('file_id', flat=True))
+
+    def folder_ids_in_tree(self):
+        return {item_id for item_id, item in self.drive.items.items() if item['mimeType'] == FOLDER_MIME_TYPE}
+
+    def child_folder(self, parent_id):
+        return next(
+            item_id for item_id, item in self.drive.items.items()
+            if item['mimeType'] == FOLDER_MIME_TYPE and item['parents'] == [parent_id]
+        )
+
+    def test_build_saves_sync_token(self):
+        self.assertTrue(DriveSyncState.objects.filter(root_folder_id='root').exists())
+        self.assertEqual(self.active_folder_ids(), self.folder_ids_in_tree() | {'root'})
+
+    def test_added_folder_and_file(self):
+        parent_id = self.child_folder('root')
+        self.drive.update_item({'id': 'new-folder', 'name': 'new', 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent_id], 'trashed': False})
+        self.drive.update_item({'id': 'new-file', 'name': 'new.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['new-folder'], 'trashed': False})
+
+        self.assertIn('new-folder', self.sync())
+        row = FolderCache.objects.get(folder_id='new-folder')
+        self.assertEqual(row.parent_id, parent_id)
+        self.assertTrue(row.tree_path.startswith(FolderCache.objects.get(folder_id=parent_id).tree_path))
+        self.assertIn('new-file', self.active_file_ids())
+
+    def test_folder_moved_out_of_tree(self):
+        moved_id = self.child_folder('root')
+        descendant_id = self.child_folder(moved_id)
+        moved_file = next(item_id for item_id, item in self.drive.items.items() if item['parents'] == [moved_id] and item['mimeType'] == PDF_MIME_TYPE)
+        self.drive.update_item(dict(self.drive.items[moved_id], parents=['outside']))
+
+        folder_ids = self.sync()
+        self.assertNotIn(moved_id, folder_ids)
+        self.assertNotIn(descendant_id, folder_ids)
+        self.assertNotIn(descendant_id, self.active_folder_ids())
+        self.assertNotIn(moved_file, self.active_file_ids())
+
+    def test_folder_moved_into_tree_is_crawled(self):
+        self.drive.update_item({'id': 'outside-folder', 'name': 'outside', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['outside'], 'trashed': False})
+        self.drive.update_item({'id': 'outside-child', 'name': 'child', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['outside-folder'], 'trashed': False})
+        self.sync()
+        self.assertNotIn('outside-folder', self.active_folder_ids())
+
+        self.drive.update_item(dict(self.drive.items['outside-folder'], parents=['root']))
+        self.assertTrue({'outside-folder', 'outside-child'} <= self.sync())
+
+    def test_trashed_folder_and_file(self):
+        trashed_id = self.child_folder('root')
+        file_id = next(item_id for item_id, item in self.drive.items.items() if item['mimeType'] == PDF_MIME_TYPE)
+        self.drive.update_item(dict(self.drive.items[trashed_id], trashed=True))
+        self.drive.update_item(dict(self.drive.items[file_id], trashed=True))
+
+        self.assertNotIn(trashed_id, self.sync())
+        self.assertFalse(FolderCache.objects.get(folder_id=trashed_id).is_active)
+        self.assertNotIn(file_id, self.active_file_ids())
+
+    def test_deleted_folder(self):
+        deleted_id = self.child_folder('root')
+        self.drive.remove_item(deleted_id)
+
+        self.assertNotIn(deleted_id, self.sync())
+        self.assertFalse(FolderCache.objects.get(folder_id=deleted_id).is_active)
+
+    def test_renamed_folder_updates_path(self):
+        renamed_id = self.child_folder('root')
+        self.drive.update_item(dict(self.drive.items[renamed_id], name='renamed'))
+        self.drive.reset_calls()
+
+        self.sync()
+        self.assertTrue(FolderCache.objects.get(folder_id=renamed_id).path.endswith('renamed'))
+        self.assertEqual(self.drive.calls['files.list'], 0)
+
+    def test_expired_token_rebuilds(self):
+        DriveSyncState.objects.filter(root_folder_id='root').update(start_page_token='expired')
+        self.drive.update_item({'id': 'new-folder', 'name': 'new', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False})
+        self.drive.reset_calls()
+
+        self.assertIn('new-folder', self.sync())
+        self.assertGreater(self.drive.calls['files.list'], 0)
+        state = DriveSyncState.objects.get(root_folder_id='root')
+        self.assertEqual(state.start_page_token, str(len(self.drive.change_log)))
+
+    def test_too_deep_branch_is_skipped(self):
+        # Drive のID（33文字）を23階層以上つなぐと tree_path の上限を超える
+        parent_id = 'root'
+        for depth in range(24):
+            folder_id = f'{depth:02d}' + 'x' * 31
+            self.drive.update_item({'id': folder_id, 'name': f'level {depth}', 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent_id], 'trashed': False})
+            parent_id = folder_id
+        deepest_saved, too_deep = '21' + 'x' * 31, '22' + 'x' * 31
+
+        self.assertIn(deepest_saved, self.sync())
+        self.assertFalse(FolderCache.objects.filter(folder_id__in=[too_deep, parent_id]).exists())
+
+        # 再構築でも深すぎる枝以外はすべて保存される
+        DriveSyncState.objects.all().delete()
+        folder_ids = set(self.service.build_folder_cache('root'))
+        self.assertEqual(self.active_folder_ids(), folder_ids)
+        self.assertEqual(folder_ids, self.folder_ids_in_tree() - {f'{depth:02d}' + 'x' * 31 for depth in range(22, 24)} | {'root'})
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=True, DRIVE_API_BACKOFF_SECONDS=0, DRIVE_API_MAX_RETRIES=1)
+class PartialCrawlTests(TestCase):
+    """一部のフォルダを一覧できなかったクロールの保存のテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=3, files_per_folder=2, root_id='root'))
+        self.service = FolderCacheService(self.drive)
+        self.service.build_folder_cache('root')
+        self.folders = self.active_folder_ids()
+        self.files = self.active_file_ids()
+        self.token = DriveSyncState.objects.get(root_folder_id='root').start_page_token
+
+    def active_folder_ids(self):
+        return set(FolderCache.objects.filter(is_active=True).values_list('folder_id', flat=True))
+
+    def active_file_ids(self):
+        return set(FileIndex.objects.filter(is_active=True).values_list('file_id', flat=True))
+
+    def test_failed_subtree_is_kept(self):
+        self.drive.fail_requests("'folder-1' in parents", status=500, times=None)
+        self.drive.update_item({'id': 'new-folder', 'name': 'new', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False})
+
+        folder_ids = set(self.service.build_folder_cache('root'))
+        self.assertEqual(folder_ids, self.folders | {'new-folder'})
+        self.assertEqual(self.active_folder_ids(), self.folders | {'new-folder'})
+        self.assertEqual(self.active_file_ids(), self.files)
+        # 欠けたクロールの時点の同期トークンは保存しない
+        self.assertEqual(DriveSyncState.objects.get(root_folder_id='root').start_page_token, self.token)
+
+    def test_removed_folders_outside_the_failed_subtree_are_deactivated(self):
+        self.drive.fail_requests("'folder-1' in parents", status=500, times=None)
+        removed_id = next(
+            item_id for item_id, item in self.drive.items.items()
+            if item['mimeType'] == FOLDER_MIME_TYPE and item['parents'] == ['root'] and item_id != 'folder-1'
+        )
+        self.drive.remove_item(removed_id)
+
+        self.service.build_folder_cache('root')
+        self.assertNotIn(removed_id, self.active_folder_ids())
+        self.assertIn('folder-1', self.active_folder_ids())
+
+    def test_unlisted_root_changes_nothing(self):
+        DriveSyncState.objects.all().delete()
+        self.drive.fail_requests("'root' in parents", status=503, times=None)
+
+        self.assertEqual(set(self.service.build_folder_cache('root')), self.folders)
+        self.assertEqual(self.active_folder_ids(), self.folders)
+        self.assertEqual(self.active_file_ids(), self.files)
+        self.assertFalse(DriveSyncState.objects.exists())
+
+    def test_sync_keeps_token_when_added_folder_cannot_be_listed(self):
+        self.drive.update_item({'id': 'outside-folder', 'name': 'outside', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False})
+        self.drive.fail_requests("'outside-folder' in parents", status=500, times=None)
+
+        self.service.sync_folder_cache('root')
+        self.assertEqual(DriveSyncState.objects.get(root_folder_id='root').start_page_token, self.token)
+        self.assertNotIn('outside-folder', self.active_folder_ids())
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=True, DRIVE_API_BACKOFF_SECONDS=0, DRIVE_API_MAX_RETRIES=2)
+class CrawlRetryTests(TestCase):
+    """フォルダツリーのクロールでの一時的なエラーの再送のテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=2, files_per_folder=1, root_id='root'))
+        self.service = FolderCacheService(self.drive)
+
+    def crawl(self):
+        folders = {'root': self.service._get_root_node('root')}
+        files = []
+        failed = self.service._crawl_levels(['root'], folders, files)
+        return set(folders), {file['id'] for file in files}, failed
+
+    def test_server_errors_are_retried(self):
+        expected_folders, expected_files, _ = self.crawl()
+        self.drive.fail_requests("'folder-1' in parents", status=500, times=2)
+        self.drive.fail_requests(method='batch', status=503, times=1)
+
+        self.assertEqual(self.crawl(), (expected_folders, expected_files, set()))
+
+    def test_parents_that_keep_failing_are_reported(self):
+        self.drive.fail_requests("'folder-1' in parents", status=500, times=None)
+        self.drive.fail_requests("'folder-3' in parents", status=404, times=1)
+
+        folders, _, failed = self.crawl()
+        self.assertEqual(failed, {'folder-1', 'folder-3'})
+        self.assertEqual(folders, {'root', 'folder-1', 'folder-3'})
+
+    def test_failed_batch_is_reported(self):
+        self.drive.fail_requests(method='batch', status=400, times=None)
+
+        self.assertEqual(self.crawl(), ({'root'}, set(), {'root'}))
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=True, FOLDER_CACHE_INCREMENTAL_SYNC=False)
+class FileIndexTests(TestCase):
+    """ファイル名インデックスの検索・無効化のテスト"""
+
+    NAMES = {
+        'carol': 'Christmas Carol.pdf',
+        'hymn': '賛美歌 312.pdf',
+        'underscore': 'my_song.pdf',
+        'no-underscore': 'myxsong.pdf',
+        'percent': 'score 100%.pdf',
+        'no-percent': 'score 1000.pdf',
+    }
+
+    def setUp(self):
+        items = {'folder': {'id': 'folder', 'name': 'folder', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False}}
+        for file_id, name in self.NAMES.items():
+            items[file_id] = {'id': file_id, 'name': name, 'mimeType': PDF_MIME_TYPE, 'parents': ['folder'], 'trashed': False}
+        self.drive = FakeDriveService(items)
+        self.service = FolderCacheService(self.drive)
+        self.service.build_folder_cache('root')
+        self.index = FileIndexService()
+
+    def search(self, *keyword_groups):
+        return {file['id'] for file in self.index.search('root', list(keyword_groups))}
+
+    def test_full_text_terms(self):
+        self.assertEqual(self.search(['CHRISTMAS']), {'carol'})
+        self.assertEqual(self.search(['christmas', '賛美歌']), {'carol', 'hymn'})
+        self.assertEqual(self.search(['christmas'], ['carol']), {'carol'})
+        self.assertEqual(self.search(['christmas'], ['賛美歌']), set())
+
+    def test_short_terms_fall_back_to_substring_match(self):
+        self.assertEqual(self.search(['歌']), {'hymn'})
+        self.assertEqual(self.search(['歌', 'ca']), {'hymn', 'carol'})
+
+    def test_like_wildcards_match_literally(self):
+        self.assertEqual(self.search(['my_song']), {'underscore'})
+        self.assertEqual(self.search(['100%']), {'percent'})
+
+    def test_full_text_terms_use_trigram_index(self):
+        files = FileIndex.objects.filter(self.index._name_matches(['christmas']))
+        sql, params = files.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        # 制約なしの "INDEX 0:" は仮想テーブルの全件走査
+        self.assertIn('file_index_fts VIRTUAL TABLE INDEX 0:L', plan)
+
+    def test_removed_and_renamed_files(self):
+        self.drive.remove_item('carol')
+        self.drive.update_item(dict(self.drive.items['hymn'], name='聖歌 312.pdf'))
+
+        self.service.build_folder_cache('root')
+        self.assertFalse(FileIndex.objects.get(file_id='carol').is_active)
+        self.assertEqual(self.search(['christmas']), set())
+        self.assertEqual(self.search(['賛美歌']), set())
+        self.assertEqual(self.search(['聖歌']), {'hymn'})
+
+    def test_files_of_unlisted_folder_are_kept(self):
+        self.drive.fail_requests("'folder' in parents", status=403, times=None)
+
+        self.service.build_folder_cache('root')
+        self.assertEqual(self.search(['christmas']), {'carol'})
+        self.assertFalse(FileIndex.objects.filter(is_active=False).exists())
+
+
+
+@override_settings(DRIVE_API_BACKOFF_SECONDS=0, DRIVE_API_MAX_RETRIES=3, SEARCH_MAX_RESULTS=0)
+class BatchSearchRetryTests(SimpleTestCase):
+    """バッチ検索での一時的なエラーの再送のテスト"""
+
+    CONDITION = "name contains 'hymn'"
+
+    def setUp(self):
+        self.items = make_tree(breadth=3, depth=2, files_per_folder=3, root_id='root')
+        self.folder_ids = ['root'] + [item_id for item_id, item in self.items.items() if item['mimeType'] == FOLDER_MIME_TYPE]
+        self.expected = self.search(FakeDriveService(self.items))
+        self.assertTrue(self.expected)
+
+    def search(self, drive):
+        return [file['id'] for file in BatchSearchService(drive).batch_search(self.folder_ids, self.CONDITION)]
+
+    def test_rate_limits_and_server_errors_are_retried(self):
+        drive = FakeDriveService(self.items)
+        drive.fail_requests('in parents', status=429, times=1)
+        drive.fail_requests('in parents', status=500, times=1)
+        drive.fail_requests(method='batch', status=503, times=1)
+
+        self.assertEqual(self.search(drive), self.expected)
+        self.assertEqual(drive.calls['batch'], 4)
+
+    def test_random_rate_limits(self):
+        drive = FakeDriveService(self.items, error_rate=0.1, seed=1)
+
+        # フォルダごと・2件ずつのページに分けてリクエストを増やす
+        with self.settings(DRIVE_API_MAX_RETRIES=10, SEARCH_PARENTS_PER_QUERY=1, SEARCH_PAGE_SIZE=2):
+            self.assertEqual(self.search(drive), self.expected)
+        self.assertGreater(drive.calls['errors'], 0)
+
+    def test_client_errors_are_not_retried(self):
+        drive = FakeDriveService(self.items)
+        drive.fail_requests('in parents', status=400, times=None)
+
+        self.assertEqual(self.search(drive), [])
+        self.assertEqual(drive.calls['batch'], 1)
+
+    def test_gives_up_after_max_retries(self):
+        drive = FakeDriveService(self.items)
+        drive.fail_requests('in parents', status=500, times=None)
+
+        self.assertEqual(self.search(drive), [])
+        self.assertEqual(drive.calls['batch'], 4)
+
+
+
+@override_settings(SEARCH_PAGE_SIZE=2, SEARCH_MAX_RESULTS=0)
+class BatchSearchPagingTests(SimpleTestCase):
+    """バッチ検索の nextPageToken の段階的な取得と件数の上限のテスト"""
+
+    def setUp(self):
+        self.items = make_tree(breadth=3, depth=2, files_per_folder=3, root_id='root')
+        self.folder_ids = ['root'] + [item_id for item_id, item in self.items.items() if item['mimeType'] == FOLDER_MIME_TYPE]
+        self.file_ids = {item_id for item_id, item in self.items.items() if item['mimeType'] == PDF_MIME_TYPE}
+        self.drive = FakeDriveService(self.items)
+
+    def test_follows_next_page_tokens(self):
+        results = BatchSearchService(self.drive).batch_search(self.folder_ids, '')
+
+        self.assertEqual(len(results), len(self.file_ids))
+        self.assertEqual({file['id'] for file in results}, self.file_ids)
+        # 2件ずつのページを1段ずつ取得する
+        self.assertGreater(self.drive.calls['batch'], 1)
+
+    def test_stream_follows_next_page_tokens(self):
+        batches = list(BatchSearchService(self.drive).iter_batch_search(self.folder_ids, ''))
+
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sorted(file['id'] for items in batches for file in items), sorted(self.file_ids))
+
+    def test_max_results_stops_fetching_pages(self):
+        BatchSearchService(self.drive).batch_search(self.folder_ids, '')
+        unlimited_calls = self.drive.calls['files.list']
+        self.drive.reset_calls()
+
+        results = BatchSearchService(self.drive).batch_search(self.folder_ids, '', max_results=5)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len({file['id'] for file in results}), 5)
+        self.assertLess(self.drive.calls['files.list'], unlimited_calls)
+
+    def test_max_results_caps_the_stream(self):
+        batches = list(BatchSearchService(self.drive).iter_batch_search(self.folder_ids, '', max_results=5))
+
+        self.assertEqual(sum(len(items) for items in batches), 5)
+
+    def test_setting_caps_results(self):
+        with self.settings(SEARCH_MAX_RESULTS=7):
+            self.assertEqual(len(BatchSearchService(self.drive).batch_search(self.folder_ids, '')), 7)
+            # 0 以下の指定は無制限
+            self.assertEqual(len(BatchSearchService(self.drive).batch_search(self.folder_ids, '', max_results=0)), len(self.file_ids))
+
+
+
+@override_settings(SEARCH_MAX_RESULTS=0, SEARCH_PARENTS_PER_QUERY=50)
+class QueryPackingTests(SimpleTestCase):
+    """複数の親フォルダを1クエリにまとめる検索のテスト"""
+
+    CONDITION = "name contains 'hymn' or name contains 'song'"
+
+    def setUp(self):
+        self.items = make_tree(breadth=3, depth=3, files_per_folder=3, root_id='root')
+        self.folder_ids = ['root'] + [item_id for item_id, item in self.items.items() if item['mimeType'] == FOLDER_MIME_TYPE]
+
+    def search(self, drive=None, **overrides):
+        with self.settings(**overrides):
+            return BatchSearchService(drive or FakeDriveService(self.items)).batch_search(self.folder_ids, self.CONDITION)
+
+    def test_parent_cap(self):
+        with self.settings(SEARCH_PARENTS_PER_QUERY=4):
+            groups, queries = BatchSearchService(None)._build_queries(self.folder_ids, self.CONDITION)
+
+        self.assertEqual([len(group) for group in groups], [4] * 10)
+        self.assertEqual([folder_id for group in groups for folder_id in group], self.folder_ids)
+        self.assertEqual(len(queries), len(groups))
+
+    def test_length_cap(self):
+        with self.settings(DRIVE_QUERY_MAX_LENGTH=400):
+            groups, queries = BatchSearchService(None)._build_queries(self.folder_ids, [self.CONDITION, "name contains 'music'"])
+
+        self.assertGreater(len(groups), 2)
+        self.assertTrue(all(len(quote(query)) <= 400 for query in queries))
+        # 条件ごとにすべてのフォルダを1回ずつ含む
+        self.assertEqual([folder_id for group in groups for folder_id in group], self.folder_ids * 2)
+
+    def test_packed_results_match_unpacked(self):
+        unpacked = self.search(SEARCH_PARENTS_PER_QUERY=1)
+
+        self.assertTrue(unpacked)
+        self.assertEqual(self.search(), unpacked)
+        self.assertEqual(self.search(SEARCH_PARENTS_PER_QUERY=7), unpacked)
+        self.assertEqual(self.search(DRIVE_QUERY_MAX_LENGTH=500), unpacked)
+
+    def test_file_in_several_packed_parents(self):
+        # 検索順で後のフォルダを先に持つ、2つのフォルダに入ったファイル
+        first, second = self.folder_ids[2], self.folder_ids[-1]
+        self.items['shared'] = {'id': 'shared', 'name': 'hymn shared.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': [second, first], 'trashed': False}
+        unpacked = self.search(SEARCH_PARENTS_PER_QUERY=1)
+        packed = self.search()
+
+        self.assertEqual(packed, unpacked)
+        self.assertEqual([file['id'] for file in packed].count('shared'), 1)
+
+
+
+@override_settings(DRIVE_TOKEN_REFRESH_MARGIN_SECONDS=300)
+class TokenRefreshTests(SimpleTestCase):
+    """アクセストークンの事前更新のテスト"""
+
+    def credentials(self, expires_in, token='token'):
+        # google-auth と同じく、expiry はタイムゾーンなしのUTC
+        expiry = datetime.now(dt_timezone.utc).replace(tzinfo=None) + expires_in
+        return mock.Mock(token=token, expiry=expiry)
+
+    def refresh(self, credentials):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            _refresh_if_expiring(credentials)
+        return credentials.refresh.called
+
+    def test_valid_token_is_kept(self):
+        self.assertFalse(self.refresh(self.credentials(timedelta(hours=1))))
+
+    def test_expiring_token_is_refreshed(self):
+        self.assertTrue(self.refresh(self.credentials(timedelta(minutes=4))))
+        self.assertTrue(self.refresh(self.credentials(-timedelta(minutes=1))))
+
+    def test_missing_token_is_refreshed(self):
+        self.assertTrue(self.refresh(self.credentials(timedelta(hours=1), token=None)))
+
+
+
+@skipUnless(HAS_HTTPX, "httpx is not installed")
+class AsyncHttpClientTests(SimpleTestCase):
+    """イベントループごとの非同期HTTPクライアントのテスト"""
+
+    def test_client_is_shared_in_a_loop_and_closed_with_it(self):
+        async def get_clients():
+            return await get_async_http_client(), await get_async_http_client()
+
+        # async_to_sync はループを作って終了する（WSGI で非同期検索を呼んだ場合と同じ）
+        first, again = async_to_sync(get_clients)()
+        self.assertIs(first, again)
+        self.assertTrue(first.is_closed)
+
+        second, _ = async_to_sync(get_clients)()
+        self.assertIsNot(second, first)
+        self.assertTrue(second.is_closed)
+
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    CACHE_WRITE_BEHIND=False,
+    ENABLE_FILE_INDEX=True,
+    FOLDER_CACHE_INCREMENTAL_SYNC=True,
+    FOLDER_LISTING_CACHE_SECONDS=60,
+)
+class FolderListingTests(TestCase):
+    """フォルダ一覧のキャッシュと ETag による再検証のテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=2, files_per_folder=2, root_id='root'))
+        patcher = mock.patch('folders.views.get_drive_service', return_value=self.drive)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, folder_id='folder-1', **headers):
+        return self.client.get('/api/folders/', {'folder_id': folder_id}, headers=headers)
+
+    def test_if_none_match_returns_304_without_drive_requests(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # フォルダが先、それぞれ名前順
+        self.assertEqual([item['mimeType'] for item in response.json()], [FOLDER_MIME_TYPE] * 2 + [PDF_MIME_TYPE] * 2)
+        self.assertEqual({item['id'] for item in response.json()}, {'folder-7', 'folder-10', 'file-2', 'file-3'})
+        self.drive.reset_calls()
+
+        response = self.get(if_none_match=f'W/"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.drive.calls['files.list'], 0)
+
+        self.assertEqual(self.get(if_none_match='"stale"').status_code, 200)
+
+    def test_listing_follows_every_page(self):
+        for number in range(1005):
+            self.drive.update_item({'id': f'many-{number}', 'name': f'{number:04d}.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['folder-1'], 'trashed': False})
+
+        response = self.get()
+        self.assertEqual(len(response.json()), 1009)
+        self.assertEqual(self.drive.calls['files.list'], 2)
+
+    def test_sync_invalidates_changed_folders(self):
+        service = FolderCacheService(self.drive)
+        service.build_folder_cache('root')
+        etag = self.get()['ETag']
+        other_etag = self.get('folder-4')['ETag']
+
+        self.drive.update_item({'id': 'new-file', 'name': 'new.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['folder-1'], 'trashed': False})
+        service.sync_folder_cache('root')
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('new-file', [item['id'] for item in response.json()])
+        self.drive.reset_calls()
+        self.assertEqual(self.get('folder-4', if_none_match=other_etag).status_code, 304)
+        self.assertEqual(self.drive.calls['files.list'], 0)
+
+    def test_forced_refresh_invalidates_listings(self):
+        etag = self.get()['ETag']
+        self.drive.update_item(dict(self.drive.items['file-2'], name='renamed.pdf'))
+
+        run_job(enqueue_refresh('folder-1', force=True, run_in_process=False).id, self.drive)
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('renamed.pdf', [item['name'] for item in response.json()])
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, PAGINATION_MAX_LIMIT=3)
+class PaginationTests(TestCase):
+    """?limit= と ?cursor= によるページングのテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=2, files_per_folder=2, root_id='root'))
+        patcher = mock.patch('folders.views.get_drive_service', return_value=self.drive)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        return self.client.get('/api/folders/', {'folder_id': 'folder-1', **params})
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(120, 'abc')), (120, 'abc'))
+        for cursor in ['not a cursor', encode_cursor(-1, 'abc'), 'e30']:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_follow_the_cursor(self):
+        items = self.get().json()
+        first = self.get(limit=3).json()
+        self.assertEqual((first['items'], first['total']), (items[:3], 4))
+
+        second = self.get(limit=3, cursor=first['next_cursor']).json()
+        self.assertEqual(second['items'], items[3:])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_limit_is_capped(self):
+        self.assertEqual(len(self.get(limit=100).json()['items']), 3)
+
+    def test_invalid_limit_and_cursor_are_rejected(self):
+        for limit in ['0', '-1', 'abc']:
+            self.assertEqual(self.get(limit=limit).status_code, 400, limit)
+        self.assertEqual(self.get(cursor='not a cursor').status_code, 400)
+
+    def test_stale_cursor_is_gone(self):
+        self.assertEqual(self.get(cursor=encode_cursor(2, 'stale')).status_code, 410)
+
+    def test_next_cursor_header_without_limit(self):
+        items = [{'id': str(number)} for number in range(5)]
+        status_code, body, headers = paginate_request({}, items, 'v', default_limit=2)
+        self.assertEqual((status_code, body), (200, items[:2]))
+
+        status_code, body, headers = paginate_request({'cursor': headers['X-Next-Cursor']}, items, 'v', default_limit=2)
+        self.assertEqual(body, items[2:4])
+        status_code, body, headers = paginate_request({'cursor': headers['X-Next-Cursor']}, items, 'v', default_limit=2)
+        self.assertEqual((body, headers), (items[4:], {}))
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=True, SEARCH_RESULTS_TOP_N=3)
+class RankingTests(TestCase):
+    """検索結果の重複除去・スコア順の並べ替えのテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService({
+            'folder': {'id': 'folder', 'name': 'folder', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False},
+            'deep': {'id': 'deep', 'name': 'deep', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['folder'], 'trashed': False},
+        })
+        FolderCacheService(self.drive).build_folder_cache('root')
+        self.ranker = SearchResultRanker([('birthday', ['birthday', 'バースデー', '誕生日'])])
+
+    def rank(self, *items):
+        return [item['id'] for item in self.ranker.rank('root', [
+            {'id': file_id, 'name': name, 'parents': [parent]} for file_id, name, parent in items
+        ])]
+
+    def test_exact_matches_rank_above_synonyms_and_earlier_positions_first(self):
+        ranked = self.rank(
+            ('synonym', '誕生日.pdf', 'folder'),
+            ('late', 'happy birthday.pdf', 'folder'),
+            ('early', 'Birthday party.pdf', 'folder'),
+        )
+        self.assertEqual(ranked, ['early', 'late', 'synonym'])
+
+    def test_deeper_files_rank_lower(self):
+        ranked = self.rank(('a', 'birthday.pdf', 'deep'), ('b', 'birthday.pdf', 'folder'))
+        self.assertEqual(ranked, ['b', 'a'])
+
+    def test_ties_are_ordered_by_name_then_id(self):
+        ranked = self.rank(
+            ('c', 'birthday b.pdf', 'folder'),
+            ('b', 'birthday a.pdf', 'folder'),
+            ('a', 'birthday b.pdf', 'folder'),
+        )
+        self.assertEqual(ranked, ['b', 'a', 'c'])
+
+    def test_duplicates_are_removed_by_file_id(self):
+        ranked = self.rank(('a', 'birthday.pdf', 'folder'), ('a', 'birthday.pdf', 'deep'), ('b', '誕生日.pdf', 'deep'))
+        self.assertEqual(ranked, ['a', 'b'])
+
+    def test_view_returns_top_n(self):
+        SearchResultCacheService._tiered_cache.clear()
+        for number, name in enumerate(['誕生日 1.pdf', 'birthday 2.pdf', 'my birthday 3.pdf', 'birthday 4.pdf', 'バースデー 5.pdf']):
+            self.drive.update_item({'id': f'file-{number}', 'name': name, 'mimeType': PDF_MIME_TYPE, 'parents': ['folder'], 'trashed': False})
+        FolderCacheService(self.drive).build_folder_cache('root')
+
+        with mock.patch('folders.views.get_drive_service', return_value=self.drive), \
+                mock.patch.object(SearchResultCacheService, '_schedule_purge'):
+            response = self.client.get('/api/folders/', {'folder_id': 'root', 'query': 'birthday'})
+            self.assertEqual([item['id'] for item in response.json()], ['file-1', 'file-3', 'file-2'])
+
+            rest = self.client.get('/api/folders/', {'folder_id': 'root', 'query': 'birthday', 'cursor': response['X-Next-Cursor']})
+            self.assertEqual([item['id'] for item in rest.json()], ['file-4', 'file-0'])
+            self.assertNotIn('X-Next-Cursor', rest)
+
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    CACHE_WRITE_BEHIND=False,
+    FOLDER_CACHE_LOCK_SECONDS=1,
+    SINGLE_FLIGHT_POLL_SECONDS=0.1,
+    CACHE_JOB_RETENTION_DAYS=7,
+)
+class CacheJobTests(TestCase):
+    """フォルダキャッシュの更新ジョブのテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService(make_tree(breadth=2, depth=1, files_per_folder=1, root_id='root'))
+
+    def test_sync_job_is_skipped_while_another_refresh_runs(self):
+        acquire_lock('folder-cache:root', 'other-worker', 60)
+        job = enqueue_refresh('root', run_in_process=False)
+
+        self.assertEqual(run_job(job.id, self.drive).status, CacheJob.STATUS_SKIPPED)
+
+    def test_forced_job_waits_for_another_refresh(self):
+        # 他のワーカーのロックは期限（1秒）が来れば奪える
+        acquire_lock('folder-cache:root', 'other-worker', 1)
+        job = enqueue_refresh('root', force=True, run_in_process=False)
+
+        job = run_job(job.id, self.drive)
+        self.assertEqual(job.status, CacheJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.folder_count, 3)
+        self.assertFalse(CacheLock.objects.filter(name='folder-cache:root').exists())
+
+    @override_settings(CACHE_JOB_RETRY_SECONDS=60)
+    def test_recently_failed_folder_is_not_requeued(self):
+        failed = CacheJob.objects.create(root_folder_id='root', status=CacheJob.STATUS_FAILED, finished_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertEqual(enqueue_refresh('root', run_in_process=False).id, failed.id)
+        # 手動更新と、待ち時間を過ぎた後は登録し直す
+        self.assertNotEqual(enqueue_refresh('root', force=True, run_in_process=False).id, failed.id)
+        CacheJob.objects.filter(id=failed.id).update(finished_at=timezone.now() - timedelta(seconds=90))
+        CacheJob.objects.filter(force=True).delete()
+        self.assertNotEqual(enqueue_refresh('root', run_in_process=False).id, failed.id)
+
+    def test_old_finished_jobs_are_purged(self):
+        old = CacheJob.objects.create(root_folder_id='root', status=CacheJob.STATUS_SUCCEEDED, finished_at=timezone.now() - timedelta(days=8))
+        recent = CacheJob.objects.create(root_folder_id='root', status=CacheJob.STATUS_FAILED, finished_at=timezone.now() - timedelta(days=1))
+        job = enqueue_refresh('other-root', run_in_process=False)
+
+        run_job(job.id, self.drive)
+        remaining = set(CacheJob.objects.values_list('id', flat=True))
+        self.assertNotIn(old.id, remaining)
+        self.assertTrue({recent.id, job.id} <= remaining)
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, FOLDER_CACHE_INCREMENTAL_SYNC=True)
+class SnapshotTests(TestCase):
+    """キャッシュのスナップショットのテスト"""
+
+    def test_import_keeps_exported_timestamps(self):
+        service = FolderCacheService(FakeDriveService(make_tree(breadth=2, depth=1, files_per_folder=1, root_id='root')))
+        service.build_folder_cache('root')
+        # 30日前に書き出したスナップショット
+        exported_at = timezone.now() - timedelta(days=30)
+        FolderCache.objects.update(last_updated=exported_at)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.json.gz')
+            export_snapshot(path)
+            FolderCache.objects.all().delete()
+            import_snapshot(path)
+
+        # JSON にはミリ秒までしか残らない
+        self.assertLess(abs(FolderCache.objects.get(folder_id='root').last_updated - exported_at), timedelta(milliseconds=1))
+        self.assertFalse(service._is_cache_fresh('root'))
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=False, ENABLE_SEARCH_RESULT_CACHE=False)
+class SearchStreamTests(TransactionTestCase):
+    """NDJSON の逐次検索のテスト（DB はスレッドから使うので TransactionTestCase）"""
+
+    def test_asgi_stream_is_not_buffered(self):
+        drive = FakeDriveService(make_tree(breadth=3, depth=2, files_per_folder=2, root_id='root'))
+
+        async def get():
+            response = await AsyncClient().get('/api/folders/search/stream/', {'folder_id': 'root', 'query': 'hymn'})
+            return response, [json.loads(line) async for line in response.streaming_content]
+
+        with mock.patch('folders.views.get_drive_service', return_value=drive):
+            response, events = async_to_sync(get)()
+
+        # 同期イテレーターのままだと Django が全体を読み込んでから送信する
+        self.assertTrue(response.is_async)
+        self.assertEqual(events[-1]['type'], 'summary')
+        self.assertEqual(events[-1]['count'], sum(len(event['items']) for event in events if event['type'] == 'results'))
+
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    CACHE_WRITE_BEHIND=False,
+    SINGLE_FLIGHT_WAIT_SECONDS=0.3,
+    SINGLE_FLIGHT_POLL_SECONDS=0.1,
+    FOLDER_CACHE_STALE_WHILE_REVALIDATE=False,
+)
+class SingleFlightTimeoutTests(TestCase):
+    """他のワーカーが実行中の処理を待ちきれない場合のテスト"""
+
+    def test_gives_up_instead_of_running(self):
+        acquire_lock('work', 'other-worker', 60)
+        calls = []
+        flight = SingleFlight('test')
+
+        with self.assertRaises(SingleFlightTimeout):
+            flight.do('work', lambda: calls.append(1), lookup=lambda: None)
+        self.assertEqual(flight.do('work', lambda: calls.append(1), fallback=lambda: 'stale'), 'stale')
+        self.assertEqual(calls, [])
+
+    def test_stale_folder_ids_while_another_worker_rebuilds(self):
+        drive = FakeDriveService(make_tree(breadth=2, depth=1, files_per_folder=1, root_id='root'))
+        service = FolderCacheService(drive)
+        folder_ids = service.build_folder_cache('root')
+        FolderCache.objects.update(last_updated=timezone.now() - timedelta(days=2))
+        FolderCacheService._folder_ids_cache.clear()
+        acquire_lock('folder-cache:root', 'other-worker', 60)
+        drive.reset_calls()
+
+        self.assertEqual(set(service.get_all_folder_ids('root')), set(folder_ids) | {'root'})
+        self.assertEqual(drive.calls['files.list'], 0)
+
+    def test_search_returns_503_while_another_worker_searches(self):
+        drive = FakeDriveService(make_tree(breadth=2, depth=1, files_per_folder=1, root_id='root'))
+        acquire_lock(f"search:{SearchResultCacheService().make_key('root', 'hymn')}", 'other-worker', 60)
+
+        with mock.patch('folders.views.get_drive_service', return_value=drive):
+            response = self.client.get('/api/folders/', {'folder_id': 'root', 'query': 'hymn'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_SEARCH_RESULT_CACHE=True)
+class SearchResultCacheTests(TestCase):
+    """検索結果キャッシュ（L1 / L2 / DB）のテスト"""
+
+    def setUp(self):
+        SearchResultCacheService._tiered_cache.clear()
+        # DB 層でのヒット時に走る期限切れ削除のスレッドはテストでは不要
+        patcher = mock.patch.object(SearchResultCacheService, '_schedule_purge')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hits_are_counted_on_every_tier(self):
+        cache = SearchResultCacheService()
+        cache.set('root', 'hymn', [{'id': 'a'}])
+        hits = CACHE_REQUESTS.value(cache='search_result', result='hit')
+
+        self.assertEqual(cache.get('root', 'hymn'), [{'id': 'a'}])  # L1
+        SearchResultCacheService._tiered_cache.clear_local()
+        self.assertEqual(cache.get('root', 'hymn'), [{'id': 'a'}])  # L2
+        SearchResultCacheService._tiered_cache.clear()
+        self.assertEqual(cache.get('root', 'hymn'), [{'id': 'a'}])  # DB
+
+        self.assertEqual(CACHE_REQUESTS.value(cache='search_result', result='hit') - hits, 3)
+
+    def test_invalidate_clears_every_tier(self):
+        cache = SearchResultCacheService()
+        cache.set('root', 'hymn', [{'id': 'a'}])
+        cache.invalidate('root')
+
+        self.assertIsNone(cache.get('root', 'hymn'))
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False)
+class SynonymCacheTests(TestCase):
+    """類義語のプロセス内 LRU と一括取得のテスト"""
+
+    def setUp(self):
+        synonym_dict.clear_memory_cache(shared=True)
+        self.addCleanup(synonym_dict.clear_memory_cache, shared=True)
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = TieredCache('lru-test', max_entries=3)
+        cache.clear()
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        cache.get('a')
+        cache.set('d', 4)
+
+        self.assertEqual(list(cache._l1), ['c', 'a', 'd'])
+        cache.get_many(['c', 'x'])
+        cache.set('e', 5)
+        self.assertEqual(list(cache._l1), ['d', 'c', 'e'])
+        # L1 から追い出された値も共有キャッシュには残る
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_lookups_are_batched(self):
+        words = ['hymn', 'クリスマス', 'unlisted-word']
+
+        # DB キャッシュの読み込み1回と、生成した分の一括保存1回
+        with self.assertNumQueries(2):
+            synonyms = synonym_dict.get_synonyms_many(words)
+        self.assertEqual(set(synonyms), set(words))
+        self.assertEqual(SynonymCache.objects.filter(word__in=words).count(), 3)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(synonym_dict.get_synonyms_many(words), synonyms)
+        synonym_dict.clear_memory_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(synonym_dict.get_synonyms_many(words), synonyms)
+
+        # 共有キャッシュも消えると、DB キャッシュから1回で読み込む
+        synonym_dict.clear_memory_cache(shared=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(synonym_dict.get_synonyms_many(words + ['hymn']), synonyms)
+
+
+class SynonymIndexTests(SimpleTestCase):
+    """類義語の展開インデックスのテスト"""
+
+    def test_groups_do_not_overlap(self):
+        members = [word for group in synonym_dict.index['groups'] for word in group]
+        self.assertEqual(len(members), len(set(members)))
+
+    def test_spellings_expand_to_the_same_group(self):
+        for words in [('birthday', 'ばーすでい', 'バースデー'), ('grace', '恵み'), ('praise', 'worship', '礼拝'), ('prayer', '祈り', 'プレイヤー')]:
+            groups = [synonym_dict.lookup(word) for word in words]
+            self.assertIsNotNone(groups[0], words)
+            self.assertTrue(all(group == groups[0] for group in groups), words)
+
+    def test_groups_are_merged_transitively(self):
+        dictionary = {'a': ['a', 'b'], 'c': ['c', 'd'], 'e': ['e'], 'b': ['b', 'c']}
+        index = compile_index(dictionary, str.lower, lambda word: [], lambda word: [word], 'digest')
+
+        self.assertEqual(index['groups'], [['a', 'b', 'c', 'd'], ['e']])
+        self.assertEqual(index['variants'], {'a': 0, 'b': 0, 'c': 0, 'e': 1})
+
+    @skipUnless(HAS_NLP_LIBS, "synonym_index.json is compiled with jaconv and romkan")
+    def test_saved_index_is_up_to_date(self):
+        # 辞書を変更したら manage.py build_synonym_index で作り直す
+        self.assertEqual(load_index(synonym_dict._index_digest()), synonym_dict.index)
+
+
+class PruneTermsTests(SimpleTestCase):
+    """類義語の整理（prune_terms）のテスト"""
+
+    def test_prefix_is_pruned(self):
+        self.assertEqual(prune_terms(['ハレルヤコーラス', 'ハレルヤ', 'HALLELUJAH', 'hallelujah']), ['ハレルヤ', 'HALLELUJAH'])
+
+    def test_infix_is_kept(self):
+        # name contains は語の前方一致なので "happy" では "unhappy" を含む名前は見つからない
+        self.assertEqual(prune_terms(['happy', 'unhappy', 'happyday', 'happier']), ['happy', 'happier', 'unhappy'])
+        self.assertIn('unhappy', prune_terms(synonym_dict.dictionary['happy']))
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    """benchmark_pipeline コマンドのテスト"""
+
+    def run_benchmark(self, vendor, *args):
+        with mock.patch('folders.management.commands.benchmark_pipeline.connection') as connection_mock:
+            connection_mock.vendor = vendor
+            connection_mock.creation.create_test_db.side_effect = RuntimeError('create_test_db')
+            with self.assertRaises((CommandError, RuntimeError)) as raised:
+                call_command('benchmark_pipeline', '--breadth=1', '--depth=1', '--files=1', *args, stdout=StringIO())
+        return raised.exception
+
+    def test_refuses_to_run_on_other_databases(self):
+        self.assertIsInstance(self.run_benchmark('mysql'), CommandError)
+
+    def test_runs_on_sqlite_or_with_allow_db(self):
+        self.assertEqual(str(self.run_benchmark('sqlite')), 'create_test_db')
+        self.assertEqual(str(self.run_benchmark('mysql', '--allow-db')), 'create_test_db')
+
+
+@override_settings(CACHES=TEST_CACHES, CACHE_WRITE_BEHIND=False, ENABLE_FILE_INDEX=True, FOLDER_CACHE_INCREMENTAL_SYNC=True, SUGGEST_REFRESH_SECONDS=0)
+class SuggestIndexTests(TestCase):
+    """入力候補のインデックスのテスト"""
+
+    def setUp(self):
+        self.drive = FakeDriveService({
+            'hymns': {'id': 'hymns', 'name': '賛美歌集', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False},
+            'other': {'id': 'other', 'name': 'other', 'mimeType': FOLDER_MIME_TYPE, 'parents': ['root'], 'trashed': False},
+            'carol': {'id': 'carol', 'name': 'Christmas Carol.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['hymns'], 'trashed': False},
+            'score': {'id': 'score', 'name': 'クリスマス 楽譜.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['hymns'], 'trashed': False},
+            'eve': {'id': 'eve', 'name': 'Christmas Eve.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['other'], 'trashed': False},
+        })
+        self.service = FolderCacheService(self.drive)
+        self.service.build_folder_cache('root')
+        self.index = SuggestIndex()
+        patcher = mock.patch.object(self.index, '_schedule_refresh')
+        self.schedule_refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def terms(self, prefix, root_folder_id=None):
+        return {suggestion['term']: suggestion['count'] for suggestion in self.index.suggest(prefix, root_folder_id)}
+
+    def test_prefix_lookup(self):
+        self.index.refresh()
+
+        self.assertEqual(self.terms('chri'), {'Christmas': 2, 'christmas': 0})
+        self.assertEqual(self.terms('CAR'), {'Carol': 1})
+        # かな・ローマ字の読みでも引ける
+        self.assertEqual(self.terms('くり'), {'クリスマス': 1, 'くりすます': 0})
+        self.assertEqual(self.terms('kuri'), self.terms('くり'))
+        # フォルダ配下の出現数に絞る（辞書の語は常に含める）
+        self.assertEqual(self.terms('chri', 'other'), {'Christmas': 1, 'christmas': 0})
+        self.assertEqual(self.terms('car', 'other'), {})
+
+    def test_changes_are_merged_incrementally(self):
+        for threshold in (256, 0):  # 挿入・削除 / 作り直し
+            with self.subTest(threshold=threshold), override_settings(SUGGEST_MERGE_THRESHOLD=threshold):
+                self.index.clear()
+                self.index.refresh()
+                self.drive.update_item(dict(self.drive.items['carol'], name=f'Christmas Anthem {threshold}.pdf'))
+                self.drive.remove_item('eve')
+                self.service.sync_folder_cache('root')
+
+                self.index.refresh()
+                self.assertEqual(self.terms('chri'), {'Christmas': 1, 'christmas': 0})
+                self.assertEqual(self.terms('car'), {})
+                self.assertEqual(self.terms('anthem'), {'Anthem': 1})
+                self.assertEqual(self.index._keys, sorted(self.index._keys))
+
+                self.drive.update_item(dict(self.drive.items['carol'], name='Christmas Carol.pdf'))
+                self.drive.update_item({'id': 'eve', 'name': 'Christmas Eve.pdf', 'mimeType': PDF_MIME_TYPE, 'parents': ['other'], 'trashed': False})
+                self.service.sync_folder_cache('root')
+
+    def test_refreshes_in_background_when_the_version_changes(self):
+        # 作成が終わるまでは空のリストを返す
+        self.assertEqual(self.terms('chri'), {})
+        self.schedule_refresh.assert_called_once()
+        self.index.refresh(self.schedule_refresh.call_args.args[0])
+
+        # 版が変わらなければ DB へ問い合わせない
+        with self.assertNumQueries(0):
+            self.assertEqual(self.terms('chri', 'other'), {'Christmas': 1, 'christmas': 0})
+        self.schedule_refresh.assert_called_once()
+
+        self.drive.remove_item('eve')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.sync_folder_cache('root')
+        self.terms('chri')
+        self.assertEqual(self.schedule_refresh.call_count, 2)
+
+
+
+class FakeDriveTests(SimpleTestCase):
+    """ベンチマーク・テスト用の模擬 Drive のテスト"""
+
+    def test_every_folder_has_files(self):
+        items = make_tree(breadth=4, depth=3, files_per_folder=5)
+        self.assertEqual(sum(1 for item in items.values() if item['mimeType'] == PDF_MIME_TYPE), (4 + 16 + 64) * 5)
+
+    def test_name_contains_matches_word_prefixes(self):
+        drive = FakeDriveService({
+            item_id: {'id': item_id, 'name': name, 'mimeType': PDF_MIME_TYPE, 'parents': ['root'], 'trashed': False}
+            for item_id, name in [('a', 'happy day.pdf'), ('b', 'unhappy.pdf'), ('c', 'HelloWorld.pdf'), ('d', 'my_happy_song.pdf')]
+        })
+
+        def names(q):
+            return sorted(item['name'] for item in drive.files().list(q=q).execute()['files'])
+
+        self.assertEqual(names("name contains 'happy'"), ['happy day.pdf', 'my_happy_song.pdf'])
+        self.assertEqual(names("name contains 'hello'"), ['HelloWorld.pdf'])
+        self.assertEqual(names("name contains 'world'"), [])
 
-# Create your tests here.
@@ -0,0 +1,248 @@
+"""
+階層キャッシュ: プロセス内の LRU（L1）と、ワーカー間で共有する Django のキャッシュ（L2: Redis など）
+
+DB は永続化用の層として残し、検索結果・類義語の保存はバックグラウンドのスレッドで後から書き込む（write-behind）
+"""
+import hashlib
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import connection
+from .metrics import CACHE_REQUESTS
+
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    """L1（プロセス内 LRU）+ L2（共有キャッシュ）の2段のキャッシュ"""
+
+    def __init__(self, namespace: str, max_entries: Optional[int] = None, l1_seconds: Optional[int] = None):
+        """
+        Args:
+            namespace: キャッシュの種類（キーの接頭辞とメトリクスのラベル）
+            max_entries: L1 の件数上限（None なら TIERED_CACHE_L1_MAX_ENTRIES）
+            l1_seconds: L1 の有効期間（None なら TIERED_CACHE_L1_SECONDS）
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries or getattr(settings, 'TIERED_CACHE_L1_MAX_ENTRIES', 1000)
+        self.l1_seconds = l1_seconds or getattr(settings, 'TIERED_CACHE_L1_SECONDS', 30)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        # clear() で進める世代（L2 のキーに含め、古い世代のキーを読まないようにする）
+        self._version = None
+        self._version_checked_at = 0.0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        値を取得（L1 → L2 の順、L2 で見つかった値は L1 に入れる）
+
+        Returns:
+            値（なければ None）
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        複数の値をまとめて取得（L2 へは1回の問い合わせ）
+
+        Returns:
+            キー → 値（見つかったものだけ）
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._l1.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at <= now:
+                    del self._l1[key]
+                    continue
+                self._l1.move_to_end(key)
+                found[key] = value
+
+        missing = [key for key in keys if key not in found]
+        CACHE_REQUESTS.inc(len(found), cache=f'{self.namespace}_l1', result='hit')
+        CACHE_REQUESTS.inc(len(missing), cache=f'{self.namespace}_l1', result='miss')
+        if not missing:
+            return found
+
+        shared_keys = {self._shared_key(key): key for key in missing}
+        try:
+            values = shared_cache.get_many(list(shared_keys))
+        except Exception as e:
+            logger.warning(f"Shared cache read error ({self.namespace}): {e}")
+            values = {}
+
+        from_shared = {shared_keys[shared_key]: value for shared_key, value in values.items()}
+        CACHE_REQUESTS.inc(len(from_shared), cache=f'{self.namespace}_l2', result='hit')
+        CACHE_REQUESTS.inc(len(missing) - len(from_shared), cache=f'{self.namespace}_l2', result='miss')
+        self._remember(from_shared)
+        found.update(from_shared)
+        return found
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = None):
+        """
+        L1 と L2 に値を保存
+
+        Args:
+            key: キー
+            value: 値（None は保存できない）
+            timeout: L2 の有効期間（秒、None なら CACHES の TIMEOUT）。L1 は l1_seconds とこの短い方
+        """
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, entries: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        複数の値を L1 と L2 に保存
+        """
+        if not entries:
+            return
+        self._remember(entries, timeout)
+        try:
+            if timeout is None:
+                shared_cache.set_many({self._shared_key(key): value for key, value in entries.items()})
+            else:
+                shared_cache.set_many({self._shared_key(key): value for key, value in entries.items()}, max(1, int(timeout)))
+        except Exception as e:
+            logger.warning(f"Shared cache write error ({self.namespace}): {e}")
+
+    def delete(self, key: str):
+        """
+        L1 と L2 から値を削除（他のワーカーの L1 には l1_seconds の間残りうる）
+        """
+        with self._lock:
+            self._l1.pop(key, None)
+        try:
+            shared_cache.delete(self._shared_key(key))
+        except Exception as e:
+            logger.warning(f"Shared cache delete error ({self.namespace}): {e}")
+
+    def clear(self):
+        """
+        この種類のキャッシュをすべて無効化（L2 は世代を進めて古いキーを読まなくする）
+        """
+        with self._lock:
+            self._l1.clear()
+        version_key = self._version_key()
+        try:
+            shared_cache.add(version_key, 1, None)
+            self._version = shared_cache.incr(version_key)
+        except Exception as e:
+            logger.warning(f"Shared cache clear error ({self.namespace}): {e}")
+            self._version = (self._version or 1) + 1
+        self._version_checked_at = time.monotonic()
+
+    def clear_local(self):
+        """L1 だけをクリア"""
+        with self._lock:
+            self._l1.clear()
+
+    def _remember(self, entries: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        L1 に保存し、上限を超えた分を古い順に捨てる
+        """
+        if not entries:
+            return
+        seconds = self.l1_seconds if timeout is None else min(self.l1_seconds, timeout)
+        expires_at = time.monotonic() + seconds
+        with self._lock:
+            for key, value in entries.items():
+                self._l1[key] = (expires_at, value)
+                self._l1.move_to_end(key)
+            while len(self._l1) > self.max_entries:
+                self._l1.popitem(last=False)
+
+    def _shared_key(self, key: str) -> str:
+        # memcached などで使えない文字（空白・非ASCII）や長さの制限を避けるためハッシュにする
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:40]
+        return f'tiered:{self.namespace}:{self._current_version()}:{digest}'
+
+    def _version_key(self) -> str:
+        return f'tiered:{self.namespace}:version'
+
+    def _current_version(self) -> int:
+        """
+        L2 の世代（他のワーカーの clear() を反映するため l1_seconds ごとに読み直す）
+        """
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at >= self.l1_seconds:
+            try:
+                self._version = shared_cache.get(self._version_key()) or 1
+            except Exception as e:
+                logger.warning(f"Shared cache read error ({self.namespace}): {e}")
+                self._version = self._version or 1
+            self._version_checked_at = now
+        return self._version
+
+
+class WriteBehindQueue:
+    """DB への書き込みを順番にバックグラウンドで実行するキュー（プロセスごとに1スレッド）"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, description: str = ''):
+        """
+        書き込みを登録（CACHE_WRITE_BEHIND が無効ならその場で実行）
+
+        Args:
+            fn: 書き込み処理（例外はログに出して捨てる）
+            description: ログ用の説明
+        """
+        if not getattr(settings, 'CACHE_WRITE_BEHIND', True):
+            self._run(fn, description)
+            return
+        self._ensure_worker()
+        self._queue.put((fn, description))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        登録済みの書き込みが終わるまで待つ
+
+        Returns:
+            すべて終わった場合 True
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='cache-write-behind', daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            fn, description = self._queue.get()
+            try:
+                self._run(fn, description)
+            finally:
+                self._queue.task_done()
+                # 溜まった分を書き終えたら接続を返す
+                if self._queue.empty():
+                    connection.close()
+
+    @staticmethod
+    def _run(fn: Callable, description: str):
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Write-behind failed ({description}): {e}")
+
+
+write_behind = WriteBehindQueue()
@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import FolderListView, CacheRefreshView
+from .views import FolderListView, CacheRefreshView, CacheJobView, FolderSearchStreamView, AsyncFolderListView, SuggestView
 
 urlpatterns = [
     path('', FolderListView.as_view(), name='folder-list'),
+    path('async/', AsyncFolderListView.as_view(), name='folder-list-async'),
+    path('suggest/', SuggestView.as_view(), name='folder-suggest'),
+    path('search/stream/', FolderSearchStreamView.as_view(), name='folder-search-stream'),
     path('cache/refresh/', CacheRefreshView.as_view(), name='cache-refresh'),
+    path('cache/jobs/<uuid:job_id>/', CacheJobView.as_view(), name='cache-job'),
 ]
@@ -1,13 +1,114 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-import os
+import asyncio
+import json
+import logging
+import threading
 import time
+from search.query_planner import plan_name_conditions, prune_keyword_groups
 from search.synonyms import synonym_dict
-from .cache_service import FolderCacheService, BatchSearchService
+from .cache_jobs import enqueue_refresh
+from .cache_service import FolderCacheService, BatchSearchService, SearchResultCacheService, FolderListingCacheService
+from .async_search import AsyncBatchSearchService
+from .drive_client import HAS_HTTPX, get_drive_service
+from .file_index import FileIndexService
+from .locks import SingleFlightTimeout, search_flight
+from .metrics import SEARCH_RESULTS, StageTimer, render as render_metrics
+from .models import CacheJob
+from .pagination import paginate_request, result_set_version
+from .ranking import SearchResultRanker
+from .suggest import suggest_index
+
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_if_none_match(header):
+    """If-None-Match ヘッダーから ETag の集合を取り出す（弱いETagの W/ は無視）"""
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+
+def _paged_response(request, items, version, default_limit=0):
+    """
+    結果セットから ?limit= と ?cursor= で指定された1ページ分を返す（pagination.paginate_request を参照）
+    """
+    status_code, body, headers = paginate_request(
+        request.query_params, items, version, default_limit, settings.PAGINATION_MAX_LIMIT
+    )
+    response = Response(body, status=status_code)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _with_server_timing(response, timer):
+    """計測した段階ごとの所要時間を Server-Timing ヘッダーに付ける"""
+    response['Server-Timing'] = timer.server_timing()
+    return response
+
+
+def _run_search(service, folder_id, query_text, timer, result_cache):
+    """
+    検索を実行し、並べ替え済みの結果をキャッシュに保存
+
+    Returns:
+        (検索結果のリスト, 検索元（index / drive）) のタプル
+    """
+    # 1. キャッシュサービスとバッチ検索サービスの初期化
+    cache_service = FolderCacheService(service)
+    batch_search_service = BatchSearchService(service)
+
+    # 2. 全フォルダIDを取得（キャッシュから、または再構築）
+    with timer.stage('cache'):
+        all_folder_ids = cache_service.get_all_folder_ids(folder_id)
+    logger.info(f"Cache lookup: {len(all_folder_ids)} folders in {timer.durations['cache']:.2f}s")
+
+    # 3. 検索クエリの準備（シノニム展開）
+    with timer.stage('synonym'):
+        keywords = query_text.replace('　', ' ').split()
+        synonyms = synonym_dict.get_synonyms_many(keywords)
+        keyword_groups = prune_keyword_groups([synonyms[keyword] for keyword in keywords])
+
+    file_index = FileIndexService()
+
+    with timer.stage('search'):
+        if settings.ENABLE_FILE_INDEX and file_index.is_indexed(folder_id):
+            # 4a. ローカルのファイル名インデックスで検索（Drive へのリクエストなし）
+            source = 'index'
+            all_items = file_index.search(folder_id, keyword_groups, limit=settings.SEARCH_MAX_RESULTS or None)
+            logger.info(f"Searched local file index under {folder_id}")
+        else:
+            source = 'drive'
+            name_conditions = plan_name_conditions(keyword_groups, settings.SEARCH_CONDITION_MAX_LENGTH)
+            logger.debug(f"Search conditions: {name_conditions}")
+
+            # 4b. バッチ検索実行
+            all_items = batch_search_service.batch_search(all_folder_ids, name_conditions)
+
+    # 5. 重複除去とランキング（キャッシュには並べ替え済みの全件を保存）
+    with timer.stage('rank'):
+        ranker = SearchResultRanker([(keyword, synonyms[keyword]) for keyword in keywords])
+        all_items = ranker.rank(folder_id, all_items)
+
+    result_cache.set(folder_id, query_text, all_items)
+    logger.info(f"Search completed: {len(all_items)} results in {timer.durations['search']:.2f}s")
+    return all_items, source
+
+
+def _cached_search(result_cache, folder_id, query_text):
+    """他のワーカーが保存した検索結果を (検索結果, 'cache') で返す（未保存なら None）"""
+    items = result_cache.get(folder_id, query_text)
+    return None if items is None else (items, 'cache')
+
 
 class FolderListView(APIView):
     def get(self, request):
@@ -15,103 +116,70 @@ class FolderListView(APIView):
         folder_id = request.query_params.get('folder_id') or settings.GOOGLE_DRIVE_FOLDER_ID
         
         try:
-            # 優先: 環境変数からJSON文字列を読み込む（デプロイ環境用）
-            json_creds = os.environ.get('GOOGLE_CREDENTIALS_JSON')
-            
-            if json_creds:
-                import json
-                info = json.loads(json_creds)
-                creds = service_account.Credentials.from_service_account_info(
-                    info, scopes=['https://www.googleapis.com/auth/drive.metadata.readonly']
-                )
-            else:
-                # フォールバック: ローカルファイルから読み込む
-                creds_file = settings.GOOGLE_SERVICE_ACCOUNT_FILE
-                
-                # Determine absolute path for creds file if it's relative
-                if creds_file and not os.path.isabs(creds_file):
-                    creds_path = os.path.join(settings.BASE_DIR, creds_file)
-                else:
-                    creds_path = creds_file
-
-                if not creds_path or not os.path.exists(creds_path):
-                    return Response(
-                        {"error": "Service account file not found. Please ensure 'service_account.json' is present in the backend root or set GOOGLE_CREDENTIALS_JSON environment variable."},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-                
-                creds = service_account.Credentials.from_service_account_file(
-                    creds_path, scopes=['https://www.googleapis.com/auth/drive.metadata.readonly']
-                )
-
-            service = build('drive', 'v3', credentials=creds)
+            service = get_drive_service()
             
             query_text = request.query_params.get("query")
 
             if query_text:
                 # バッチ検索モード
+                timer = StageTimer('search')
                 try:
-                    start_time = time.time()
-
-                    # 1. キャッシュサービスとバッチ検索サービスの初期化
-                    cache_service = FolderCacheService(service)
-                    batch_search_service = BatchSearchService(service)
+                    # 0. 検索結果キャッシュを確認
+                    result_cache = SearchResultCacheService()
+                    with timer.stage('result_cache'):
+                        cached_items = result_cache.get(folder_id, query_text)
+                    if cached_items is not None:
+                        total_time = timer.finish()
+                        SEARCH_RESULTS.observe(len(cached_items), source='cache')
+                        logger.info(f"Search result cache hit: {len(cached_items)} items in {total_time:.3f}s")
+                        return _with_server_timing(
+                            _paged_response(request, cached_items, result_set_version(cached_items), settings.SEARCH_RESULTS_TOP_N),
+                            timer
+                        )
 
-                    # 2. 全フォルダIDを取得（キャッシュから、または再構築）
-                    cache_start = time.time()
-                    all_folder_ids = cache_service.get_all_folder_ids(folder_id)
-                    cache_time = time.time() - cache_start
-                    print(f"[OK] Cache lookup: {len(all_folder_ids)} folders in {cache_time:.2f}s")
-
-                    # 3. 検索クエリの準備（シノニム展開）
-                    keywords = query_text.replace('　', ' ').split()
-                    final_query_parts = []
-
-                    for keyword in keywords:
-                        synonyms = synonym_dict.get_synonyms(keyword)
-
-                        synonym_parts = []
-                        for syn in synonyms:
-                            safe_syn = syn.replace("'", "\\'")
-                            synonym_parts.append(f"name contains '{safe_syn}'")
-
-                        if synonym_parts:
-                            if len(synonym_parts) > 1:
-                                joined_or = " or ".join(synonym_parts)
-                                final_query_parts.append(f"({joined_or})")
-                            else:
-                                final_query_parts.append(synonym_parts[0])
-
-                    name_conditions = " and ".join(final_query_parts)
-                    print(f"[SEARCH] conditions: {name_conditions}")
-
-                    # 4. バッチ検索実行
-                    search_start = time.time()
-                    all_items = batch_search_service.batch_search(all_folder_ids, name_conditions)
-                    search_time = time.time() - search_start
+                    # 1〜5. 同じ検索が同時に来た場合は1回だけ実行して結果を共有
+                    all_items, source = search_flight.do(
+                        f'search:{result_cache.make_key(folder_id, query_text)}',
+                        lambda: _run_search(service, folder_id, query_text, timer, result_cache),
+                        lookup=lambda: _cached_search(result_cache, folder_id, query_text),
+                    )
 
-                    total_time = time.time() - start_time
-                    print(f"[OK] Search completed: {len(all_items)} results in {search_time:.2f}s (total: {total_time:.2f}s)")
+                    total_time = timer.finish()
+                    SEARCH_RESULTS.observe(len(all_items), source=source)
+                    logger.info(f"Search request: {len(all_items)} results ({source}) in {total_time:.2f}s")
 
-                    return Response(all_items)
+                    return _with_server_timing(
+                        _paged_response(request, all_items, result_set_version(all_items), settings.SEARCH_RESULTS_TOP_N),
+                        timer
+                    )
 
+                except SingleFlightTimeout as e:
+                    # 同じ検索・再構築が長引いている（待ち続けるとワーカーのタイムアウトで落ちる）
+                    logger.warning(f"Search is still running elsewhere: {e}")
+                    return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    headers={'Retry-After': str(e.retry_after)})
                 except Exception as e:
-                    print(f"[ERROR] Error in batch search: {e}")
+                    logger.error(f"Error in batch search: {e}")
                     return Response({"error": str(e)}, status=500)
 
             # Normal navigation mode (current folder only)
-            query = f"'{folder_id}' in parents and trashed = false"
-            
-            results = service.files().list(
-                q=query,
-                pageSize=100,
-                fields="nextPageToken, files(id, name, mimeType, webViewLink)",
-                orderBy="folder,name"
-            ).execute()
-            
-            items = results.get('files', [])
-            
-            return Response(items)
+            timer = StageTimer('listing')
+            with timer.stage('listing'):
+                items, version = FolderListingCacheService(service).get_listing(folder_id)
+            etag = f'"{version}"'
+
+            # 内容が変わっていなければ本文なしの 304 を返す
+            # （ページごとに URL が異なるので、ページ単位でも同じ ETag で再検証できる）
+            if etag in _parse_if_none_match(request.headers.get('If-None-Match', '')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = _paged_response(request, items, version[:16])
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            timer.finish()
+            return _with_server_timing(response, timer)
             
         except Exception as e:
             return Response(
@@ -121,58 +189,318 @@ class FolderListView(APIView):
 
 
 class CacheRefreshView(APIView):
-    """キャッシュを手動で更新するエンドポイント"""
+    """キャッシュを手動で更新するエンドポイント（ジョブを登録してすぐに返す）"""
 
     def post(self, request):
         try:
             folder_id = request.data.get('folder_id') or settings.GOOGLE_DRIVE_FOLDER_ID
 
-            # Google Drive API認証
-            json_creds = os.environ.get('GOOGLE_CREDENTIALS_JSON')
+            # バックグラウンドで全体を再構築（完了まで古いキャッシュで検索できる）
+            job = enqueue_refresh(folder_id, force=True)
 
-            if json_creds:
-                import json
-                info = json.loads(json_creds)
-                creds = service_account.Credentials.from_service_account_info(
-                    info, scopes=['https://www.googleapis.com/auth/drive.metadata.readonly']
-                )
+            return Response({
+                "status": job.status,
+                "message": f"Cache refresh queued for folder {folder_id}",
+                "job_id": str(job.id),
+                "poll_url": reverse('cache-job', args=[job.id]),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class CacheJobView(APIView):
+    """キャッシュ更新ジョブの進捗を返すエンドポイント"""
+
+    def get(self, request, job_id):
+        job = CacheJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        elapsed = None
+        if job.started_at:
+            elapsed = round(((job.finished_at or timezone.now()) - job.started_at).total_seconds(), 2)
+
+        return Response({
+            "job_id": str(job.id),
+            "folder_id": job.root_folder_id,
+            "status": job.status,
+            "progress": job.progress,
+            "folder_count": job.folder_count,
+            "message": job.message,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "elapsed_seconds": elapsed,
+        })
+
+
+async def _iterate_in_thread(iterator):
+    """
+    同期イテレーターを別スレッドで回し、生成された値を順に返す非同期ジェネレーター
+
+    クライアントが切断した場合は次の値の生成前に打ち切る
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def put(value):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, value)
+        except RuntimeError:
+            # イベントループが既に終了している
+            stopped.set()
+
+    def produce():
+        try:
+            for value in iterator:
+                put(value)
+                if stopped.is_set():
+                    break
+        except Exception as e:
+            logger.error(f"Error in streamed iterator: {e}")
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            connection.close()
+            put(done)
+
+    threading.Thread(target=produce, name='stream-producer', daemon=True).start()
+    try:
+        while True:
+            value = await queue.get()
+            if value is done:
+                return
+            yield value
+    finally:
+        stopped.set()
+
+
+class FolderSearchStreamView(APIView):
+    """
+    検索結果をバッチ完了ごとに NDJSON で逐次返すエンドポイント
+
+    各行は {"type": "results", ...} で、最後に {"type": "summary", ...}（件数・所要時間）を返す
+    """
+
+    def get(self, request):
+        folder_id = request.query_params.get('folder_id') or settings.GOOGLE_DRIVE_FOLDER_ID
+        query_text = request.query_params.get("query")
+
+        if not query_text:
+            return Response({"error": "query is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            service = get_drive_service()
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        lines = self._stream(service, folder_id, query_text)
+        # ASGI では同期イテレーターは最後まで読んでから送信されるため、スレッドで回して逐次渡す
+        if isinstance(request._request, ASGIRequest):
+            lines = _iterate_in_thread(lines)
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # プロキシでのバッファリングを無効化
+        return response
+
+    def _stream(self, service, folder_id, query_text):
+        """検索を実行し、NDJSON の行を順に生成"""
+        start_time = time.time()
+        timer = StageTimer('search_stream')
+        count = 0
+        batches = 0
+        source = 'drive'
+        all_items = []
+
+        def line(payload):
+            return json.dumps(payload, ensure_ascii=False) + "\n"
+
+        try:
+            # 0. 検索結果キャッシュを確認
+            result_cache = SearchResultCacheService()
+            with timer.stage('result_cache'):
+                cached_items = result_cache.get(folder_id, query_text)
+
+            if cached_items is not None:
+                source = 'cache'
+                batches = 1
+                count = len(cached_items)
+                yield line({"type": "results", "batch": 1, "items": cached_items,
+                            "elapsed_ms": round((time.time() - start_time) * 1000)})
             else:
-                creds_file = settings.GOOGLE_SERVICE_ACCOUNT_FILE
-                if creds_file and not os.path.isabs(creds_file):
-                    creds_path = os.path.join(settings.BASE_DIR, creds_file)
+                # 1. 全フォルダIDを取得（キャッシュから、または再構築）
+                with timer.stage('cache'):
+                    all_folder_ids = FolderCacheService(service).get_all_folder_ids(folder_id)
+
+                # 2. 検索クエリの準備（シノニム展開）
+                with timer.stage('synonym'):
+                    keywords = query_text.replace('　', ' ').split()
+                    synonyms = synonym_dict.get_synonyms_many(keywords)
+                    keyword_groups = prune_keyword_groups([synonyms[keyword] for keyword in keywords])
+
+                # 3. 検索（ローカルインデックス、またはバッチ完了ごとに送信）
+                search_start = time.perf_counter()
+                file_index = FileIndexService()
+                if settings.ENABLE_FILE_INDEX and file_index.is_indexed(folder_id):
+                    source = 'index'
+                    batch_results = [file_index.search(folder_id, keyword_groups, limit=settings.SEARCH_MAX_RESULTS or None)]
                 else:
-                    creds_path = creds_file
+                    name_conditions = plan_name_conditions(keyword_groups, settings.SEARCH_CONDITION_MAX_LENGTH)
+                    batch_results = BatchSearchService(service).iter_batch_search(all_folder_ids, name_conditions)
 
-                if not creds_path or not os.path.exists(creds_path):
-                    return Response(
-                        {"error": "Service account file not found"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
+                for items in batch_results:
+                    batches += 1
+                    count += len(items)
+                    all_items.extend(items)
+                    yield line({"type": "results", "batch": batches, "items": items,
+                                "elapsed_ms": round((time.time() - start_time) * 1000)})
+
+                timer.record('search', time.perf_counter() - search_start)
+
+                # 通常の検索と同じく、キャッシュには並べ替え済みの結果を保存
+                with timer.stage('rank'):
+                    all_items = SearchResultRanker([(keyword, synonyms[keyword]) for keyword in keywords]).rank(folder_id, all_items)
+                result_cache.set(folder_id, query_text, all_items)
+
+        except Exception as e:
+            logger.error(f"Error in streaming search: {e}")
+            yield line({"type": "error", "error": str(e)})
+
+        timer.finish()
+        SEARCH_RESULTS.observe(count, source=source)
+        yield line({"type": "summary", "source": source, "count": count, "batches": batches, "timings": timer.as_ms()})
+
+
+class AsyncFolderListView(View):
+    """
+    検索を非同期に実行するエンドポイント（ASGI 用、パラメータとレスポンスは FolderListView と同じ）
+
+    Drive への検索はイベントループ上で並列に送信し、DB を使う処理はスレッドで実行する。
+    検索以外のリクエストと httpx が未インストールの場合は FolderListView に委譲する
+    """
 
-                creds = service_account.Credentials.from_service_account_file(
-                    creds_path, scopes=['https://www.googleapis.com/auth/drive.metadata.readonly']
+    async def get(self, request):
+        query_text = request.GET.get("query")
+        if not query_text or not HAS_HTTPX:
+            return await sync_to_async(FolderListView.as_view())(request)
+
+        folder_id = request.GET.get('folder_id') or settings.GOOGLE_DRIVE_FOLDER_ID
+        timer = StageTimer('search_async')
+        try:
+            # 0. 検索結果キャッシュを確認
+            result_cache = SearchResultCacheService()
+            with timer.stage('result_cache'):
+                all_items = await sync_to_async(result_cache.get)(folder_id, query_text)
+
+            if all_items is not None:
+                source = 'cache'
+            else:
+                # 1〜4. 同じ検索が同時に来た場合は1回だけ実行して結果を共有
+                all_items, source = await search_flight.do_async(
+                    f'search:{result_cache.make_key(folder_id, query_text)}',
+                    lambda: self._search(folder_id, query_text, timer, result_cache),
+                    lookup=lambda: _cached_search(result_cache, folder_id, query_text),
                 )
 
-            service = build('drive', 'v3', credentials=creds)
+            total_time = timer.finish()
+            SEARCH_RESULTS.observe(len(all_items), source=source)
+            logger.info(f"Async search ({source}): {len(all_items)} results in {total_time:.2f}s")
 
-            # キャッシュサービス初期化
-            cache_service = FolderCacheService(service)
+            status_code, body, headers = paginate_request(
+                request.GET, all_items, result_set_version(all_items),
+                settings.SEARCH_RESULTS_TOP_N, settings.PAGINATION_MAX_LIMIT
+            )
+            response = JsonResponse(body, status=status_code, safe=False, json_dumps_params={'ensure_ascii': False})
+            for name, value in headers.items():
+                response[name] = value
+            return _with_server_timing(response, timer)
+
+        except SingleFlightTimeout as e:
+            logger.warning(f"Search is still running elsewhere: {e}")
+            response = JsonResponse({"error": str(e)}, status=503)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            logger.error(f"Error in async search: {e}")
+            return JsonResponse({"error": str(e)}, status=500)
 
-            # キャッシュ無効化と再構築
-            cache_service.invalidate_cache(folder_id)
-            start_time = time.time()
-            folder_ids = cache_service.build_folder_cache(folder_id)
-            elapsed = time.time() - start_time
+    async def _search(self, folder_id, query_text, timer, result_cache):
+        """
+        検索を実行し、並べ替え済みの結果をキャッシュに保存
+
+        Returns:
+            (検索結果のリスト, 検索元（index / drive）) のタプル
+        """
+        # 1. 全フォルダIDを取得（キャッシュから、または再構築）
+        with timer.stage('cache'):
+            all_folder_ids = await sync_to_async(self._get_all_folder_ids)(folder_id)
+
+        # 2. 検索クエリの準備（シノニム展開）
+        with timer.stage('synonym'):
+            keywords = query_text.replace('　', ' ').split()
+            synonyms = await sync_to_async(synonym_dict.get_synonyms_many)(keywords)
+            keyword_groups = prune_keyword_groups([synonyms[keyword] for keyword in keywords])
+
+        file_index = FileIndexService()
+        with timer.stage('search'):
+            if settings.ENABLE_FILE_INDEX and await sync_to_async(file_index.is_indexed)(folder_id):
+                # 3a. ローカルのファイル名インデックスで検索
+                source = 'index'
+                all_items = await sync_to_async(file_index.search)(
+                    folder_id, keyword_groups, limit=settings.SEARCH_MAX_RESULTS or None
+                )
+            else:
+                # 3b. Drive に並列で検索リクエストを送信
+                source = 'drive'
+                name_conditions = plan_name_conditions(keyword_groups, settings.SEARCH_CONDITION_MAX_LENGTH)
+                all_items = await AsyncBatchSearchService().batch_search(all_folder_ids, name_conditions)
+
+        # 4. 重複除去とランキング（キャッシュには並べ替え済みの全件を保存）
+        with timer.stage('rank'):
+            ranker = SearchResultRanker([(keyword, synonyms[keyword]) for keyword in keywords])
+            all_items = await sync_to_async(ranker.rank)(folder_id, all_items)
+
+        await sync_to_async(result_cache.set)(folder_id, query_text, all_items)
+        return all_items, source
+
+    @staticmethod
+    def _get_all_folder_ids(folder_id):
+        return FolderCacheService(get_drive_service()).get_all_folder_ids(folder_id)
 
-            return Response({
-                "status": "success",
-                "message": f"Cache refreshed for folder {folder_id}",
-                "folder_count": len(folder_ids),
-                "elapsed_seconds": round(elapsed, 2)
-            })
 
+class SuggestView(APIView):
+    """検索語の入力候補を返すエンドポイント（?q= の前方一致、Drive へのリクエストなし）"""
+
+    def get(self, request):
+        prefix = request.query_params.get('q', '').strip()
+        folder_id = request.query_params.get('folder_id') or settings.GOOGLE_DRIVE_FOLDER_ID
+        try:
+            limit = min(max(int(request.query_params.get('limit', settings.SUGGEST_MAX_RESULTS)), 1), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        timer = StageTimer('suggest')
+        try:
+            with timer.stage('suggest'):
+                suggestions = suggest_index.suggest(prefix, folder_id, limit)
         except Exception as e:
-            return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            logger.error(f"Error in suggest: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        timer.finish()
+
+        response = Response({"query": prefix, "suggestions": suggestions})
+        response['Cache-Control'] = 'private, max-age=30'
+        return _with_server_timing(response, timer)
+
+
+class MetricsView(APIView):
+    """Prometheus 形式のメトリクスを返すエンドポイント"""
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,103 @@
+"""
+クエリプランナー: 類義語展開したキーワードから、冗長な語を除いた最小の Drive 検索条件を組み立てる
+"""
+from typing import List
+from urllib.parse import quote
+
+
+def prune_terms(terms: List[str]) -> List[str]:
+    """
+    重複と、より短い語で始まる語を取り除く
+
+    name contains は語の前方一致（大文字小文字を区別しない）なので、"ハレルヤ" があれば
+    "ハレルヤコーラス" は条件に加えても結果が変わらない。途中に含むだけの語（"happy" に対する
+    "unhappy"）は別の結果になるので残す
+
+    Args:
+        terms: 類義語のリスト
+
+    Returns:
+        残った語のリスト（短い順）
+    """
+    kept = []
+    seen = []
+    for term in sorted({term.strip() for term in terms if term and term.strip()}, key=lambda t: (len(t), t)):
+        folded = term.casefold()
+        if any(folded.startswith(shorter) for shorter in seen):
+            continue
+        kept.append(term)
+        seen.append(folded)
+    return kept
+
+
+def prune_keyword_groups(keyword_groups: List[List[str]]) -> List[List[str]]:
+    """
+    キーワードごとの類義語リストをそれぞれ prune_terms で整理（空のグループは除く）
+    """
+    groups = [prune_terms(terms) for terms in keyword_groups]
+    return [terms for terms in groups if terms]
+
+
+def escape_term(term: str) -> str:
+    """
+    Drive のクエリ文字列リテラル用にエスケープ（バックスラッシュと単一引用符）
+    """
+    return term.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def build_name_conditions(keyword_groups: List[List[str]]) -> str:
+    """
+    name contains 条件を組み立てる（グループ内は OR、グループ間は AND）
+
+    Args:
+        keyword_groups: 整理済みのキーワードごとの類義語リスト
+
+    Returns:
+        検索条件
+    """
+    parts = []
+    for terms in keyword_groups:
+        clauses = [f"name contains '{escape_term(term)}'" for term in terms]
+        if len(clauses) > 1:
+            parts.append("(" + " or ".join(clauses) + ")")
+        elif clauses:
+            parts.append(clauses[0])
+    return " and ".join(parts)
+
+
+def plan_name_conditions(keyword_groups: List[List[str]], max_length: int) -> List[str]:
+    """
+    検索条件を組み立て、長すぎる場合は複数の条件に分割
+
+    (A or B) and C は (A and C) と (B and C) の和集合なので、最も語の多いグループを
+    半分に分けて、各条件が max_length（URLエンコード後）に収まるまで分割する。
+    分割した条件の結果はファイルIDで重複を除いて結合すること
+
+    Args:
+        keyword_groups: キーワードごとの類義語リスト
+        max_length: 1条件あたりの最大長（URLエンコード後）
+
+    Returns:
+        検索条件のリスト（キーワードがない場合は [""]）
+    """
+    groups = prune_keyword_groups(keyword_groups)
+    if not groups:
+        return [""]
+
+    plans = []
+    pending = [groups]
+    while pending:
+        groups = pending.pop()
+        conditions = build_name_conditions(groups)
+        widest = max(range(len(groups)), key=lambda i: len(groups[i]))
+        if len(quote(conditions)) <= max_length or len(groups[widest]) == 1:
+            plans.append(conditions)
+            continue
+
+        terms = groups[widest]
+        half = len(terms) // 2
+        # 元の順序が保たれるよう後半から積む
+        for part in (terms[half:], terms[:half]):
+            pending.append(groups[:widest] + [part] + groups[widest + 1:])
+
+    return plans
@@ -0,0 +1,132 @@
+"""
+類義語展開インデックス: 辞書を「表記ゆれ → グループID」と「グループ（1度だけ保持）」にコンパイルする
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synonym_index.json')
+INDEX_VERSION = 2
+
+
+def source_hash(dictionary: Dict[str, List[str]], *flags) -> str:
+    """
+    辞書の内容と変換ライブラリの有無から、インデックスが最新か判定するためのハッシュを計算
+
+    Args:
+        dictionary: 類義語辞書
+        flags: コンパイル結果に影響するフラグ（ライブラリの有無など）
+
+    Returns:
+        ハッシュ文字列
+    """
+    payload = json.dumps([INDEX_VERSION, dictionary, flags], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def compile_index(
+    dictionary: Dict[str, List[str]],
+    normalize: Callable[[str], str],
+    conversions: Callable[[str], Iterable[str]],
+    surface_variants: Callable[[str], Iterable[str]],
+    digest: str,
+) -> Dict:
+    """
+    辞書をインデックスにコンパイル
+
+    表記ゆれ・類義語を1つでも共有する見出し語は、同じグループにまとめる（Union-Find）。
+    どの表記で引いても同じ類義語に展開される
+
+    Args:
+        dictionary: 見出し語 → 類義語リスト
+        normalize: 正規化関数
+        conversions: 正規化済みの語からかな/ローマ字変換を返す関数
+        surface_variants: 見出し語から検索時に入力されうる表記（全角/半角など）を返す関数
+        digest: 辞書のハッシュ
+
+    Returns:
+        {'version', 'source_hash', 'groups': [[...]], 'variants': {表記: グループID}}
+    """
+    entries = []
+    parents = {}
+
+    def find(word):
+        while parents[word] != word:
+            parents[word] = parents[parents[word]]
+            word = parents[word]
+        return word
+
+    for key, synonyms in dictionary.items():
+        norm_key = normalize(key)
+        members = set(synonyms) | {norm_key} | set(conversions(norm_key))
+        members.discard('')
+        lookup_keys = {variant.strip().lower() for variant in {key, norm_key, *surface_variants(key)} if variant.strip()}
+        entries.append((members, lookup_keys))
+
+        # 類義語か検索時の表記を1つでも共有する見出し語を、同じグループにつなぐ
+        words = list(members | lookup_keys | {member.lower() for member in members})
+        for word in words:
+            parents.setdefault(word, word)
+        for word in words[1:]:
+            parents[find(word)] = find(words[0])
+
+    merged = {}
+    for members, _ in entries:
+        merged.setdefault(find(next(iter(members))), set()).update(members)
+
+    groups = []
+    group_ids = {}
+    variants = {}
+    for members, lookup_keys in entries:
+        root = find(next(iter(members)))
+        if root not in group_ids:
+            group_ids[root] = len(groups)
+            groups.append(sorted(merged[root]))
+        for variant in lookup_keys:
+            variants[variant] = group_ids[root]
+
+    return {
+        'version': INDEX_VERSION,
+        'source_hash': digest,
+        'groups': groups,
+        'variants': variants,
+    }
+
+
+def save_index(index: Dict, path: str = INDEX_PATH):
+    """
+    インデックスをJSONファイルに保存
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def load_index(digest: str, path: str = INDEX_PATH) -> Optional[Dict]:
+    """
+    保存済みのインデックスを読み込む
+
+    Args:
+        digest: 現在の辞書のハッシュ
+        path: インデックスファイルのパス
+
+    Returns:
+        インデックス（ファイルがない・辞書と一致しない場合は None）
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to load synonym index from {path}: {e}")
+        return None
+
+    if index.get('version') != INDEX_VERSION or index.get('source_hash') != digest:
+        logger.info("Synonym index is out of date, compiling in memory")
+        return None
+    return index
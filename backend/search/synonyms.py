@@ -1,4 +1,8 @@
+import logging
 import re
+from typing import Dict, Iterable, List
+from django.conf import settings
+from .synonym_index import compile_index, load_index, source_hash
 
 # ライブラリがインストールされていない場合でもサーバーが落ちないようにする
 try:
@@ -24,14 +28,25 @@ else:
 
 # キャッシュモデルをインポート（循環インポート回避のため遅延インポート）
 try:
+    from folders.metrics import CACHE_REQUESTS
     from folders.models import SynonymCache
+    from folders.tiered_cache import TieredCache, write_behind
     HAS_CACHE = True
 except ImportError:
     HAS_CACHE = False
     print("⚠️ Warning: SynonymCache model not available")
 
+
+logger = logging.getLogger(__name__)
+
+
 class SynonymDict:
     def __init__(self):
+        # DB キャッシュの手前に置くプロセス内 LRU・ワーカー間共有キャッシュ（単語 → 類義語リスト）
+        self._cache = TieredCache('synonym', max_entries=getattr(settings, 'SYNONYM_LRU_MAX_ENTRIES', 1024)) if HAS_CACHE else None
+        self.hits = 0
+        self.misses = 0
+
         # 拡張類義語/表記ゆれ辞書（双方向マッピング）
         self.dictionary = {
             # 既存のエントリ
@@ -62,11 +77,11 @@ class SynonymDict:
             '歌': ['song', 'ソング', 'そんぐ', '歌', 'うた', '曲', 'きょく'],
             '曲': ['song', 'ソング', 'そんぐ', '歌', 'うた', '曲', 'きょく'],
 
-            'christmas': ['christmas', 'クリスマス', 'くりすます', 'xmas', 'Xmas', '聖誕', 'せいたん', 'クリスマス'],
+            'christmas': ['christmas', 'クリスマス', 'くりすます', 'xmas', 'Xmas', '聖誕', 'せいたん'],
             'クリスマス': ['christmas', 'クリスマス', 'くりすます', 'xmas', 'Xmas', '聖誕', 'せいたん'],
             'xmas': ['christmas', 'クリスマス', 'くりすます', 'xmas', 'Xmas', '聖誕', 'せいたん'],
 
-            'easter': ['easter', 'イースター', 'いーすたー', '復活祭', 'ふっかつさい', 'イースター'],
+            'easter': ['easter', 'イースター', 'いーすたー', '復活祭', 'ふっかつさい'],
             'イースター': ['easter', 'イースター', 'いーすたー', '復活祭', 'ふっかつさい'],
             '復活祭': ['easter', 'イースター', 'いーすたー', '復活祭', 'ふっかつさい'],
 
@@ -113,6 +128,38 @@ class SynonymDict:
             '霊': ['spirit', 'スピリット', 'すぴりっと', '霊', 'れい', '御霊', 'みたま'],
         }
 
+        # 表記ゆれ → グループの展開インデックス（ビルド済みファイルがなければその場でコンパイル）
+        self.index = load_index(self._index_digest()) or self.compile_index()
+
+    def _index_digest(self):
+        return source_hash(self.dictionary, HAS_JACONV, HAS_ROMKAN)
+
+    def compile_index(self):
+        """
+        辞書を展開インデックスにコンパイル
+
+        Returns:
+            インデックス（synonym_index.compile_index を参照）
+        """
+        return compile_index(
+            self.dictionary, self.normalize, self._conversions, self._surface_variants, self._index_digest()
+        )
+
+    def lookup(self, word):
+        """
+        インデックスから単語のグループを取得（完全一致しなければ正規化して再検索）
+
+        Returns:
+            類義語リスト（辞書にない場合は None）
+        """
+        variants = self.index['variants']
+        group_id = variants.get(word.strip().lower())
+        if group_id is None:
+            group_id = variants.get(self.normalize(word))
+        if group_id is None:
+            return None
+        return self.index['groups'][group_id]
+
     def normalize(self, text):
         """
         簡易正規化
@@ -138,32 +185,94 @@ class SynonymDict:
         """
         if not word:
             return []
+        return self.get_synonyms_many([word])[word]
+
+    def get_synonyms_many(self, words: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        複数の単語の類義語をまとめて取得
+
+        プロセス内 LRU → 共有キャッシュ → DB キャッシュ（1クエリ）→ 生成 の順に解決し、
+        生成した分は一括で DB キャッシュに保存する（バックグラウンドで書き込む）
+
+        Args:
+            words: 単語のリスト
+
+        Returns:
+            単語 → 類義語リスト
+        """
+        words = list(dict.fromkeys(word for word in words if word))
+        result = self._cache.get_many(words) if self._cache else {}
 
-        # キャッシュから取得を試みる
+        missing = [word for word in words if word not in result]
+        self.hits += len(result)
+        self.misses += len(missing)
+        if not missing:
+            return result
+
+        # DB キャッシュから一括取得
         if HAS_CACHE:
             try:
-                cached = SynonymCache.objects.get(word=word)
-                print(f"[CACHE HIT] for '{word}'")
-                return cached.synonyms_json
-            except SynonymCache.DoesNotExist:
-                print(f"[CACHE MISS] for '{word}', generating...")
+                for word, synonyms in SynonymCache.objects.filter(word__in=missing).values_list('word', 'synonyms_json'):
+                    result[word] = synonyms
             except Exception as e:
-                print(f"[WARNING] Cache error for '{word}': {e}")
+                logger.warning(f"Synonym cache read error: {e}")
 
-        print(f"DEBUG: get_synonyms called with word='{word}', HAS_NLP_LIBS={HAS_NLP_LIBS}")
+        generated = {word: self._expand(word) for word in missing if word not in result}
+        result.update(generated)
+        if HAS_CACHE:
+            CACHE_REQUESTS.inc(len(missing) - len(generated), cache='synonym_db', result='hit')
+            CACHE_REQUESTS.inc(len(generated), cache='synonym_db', result='miss')
+
+        # 生成した分を DB キャッシュに保存（失敗しても検索は妨げない）
+        if HAS_CACHE and generated:
+            write_behind.submit(
+                lambda: SynonymCache.objects.bulk_create(
+                    [SynonymCache(word=word, synonyms_json=synonyms) for word, synonyms in generated.items()],
+                    ignore_conflicts=True,
+                ),
+                f'synonyms {list(generated)}',
+            )
+
+        if self._cache:
+            self._cache.set_many({word: result[word] for word in missing})
+        logger.debug(f"Synonyms resolved: {len(words) - len(missing)} from memory, {len(generated)} generated")
+        return result
 
-        synonyms = set()
-        synonyms.add(word)
+    def clear_memory_cache(self, shared: bool = False):
+        """
+        プロセス内 LRU と統計をクリア
 
-        # 1. 正規化して追加
-        norm_word = self.normalize(word)
-        synonyms.add(norm_word)
+        Args:
+            shared: True なら全ワーカーの共有キャッシュも無効化（辞書を変更したとき）
+        """
+        if self._cache:
+            if shared:
+                self._cache.clear()
+            else:
+                self._cache.clear_local()
+        self.hits = 0
+        self.misses = 0
+
+    def _expand(self, word):
+        """
+        類義語リストを生成（辞書ルックアップ、辞書にない語はアルゴリズム拡張）
+        """
+        # 1. 辞書ルックアップ（かな/ローマ字の変換はコンパイル時に展開済み）
+        group = self.lookup(word)
+        if group is not None:
+            return list(dict.fromkeys([word, *group]))
 
-        # 2. 辞書ルックアップ
-        if norm_word in self.dictionary:
-            synonyms.update(self.dictionary[norm_word])
+        # 2. 正規化して追加
+        norm_word = self.normalize(word)
+        synonyms = {word, norm_word}
+        synonyms.update(self._conversions(norm_word))
+        return list(synonyms)
 
-        # 3. アルゴリズム的拡張 (ライブラリがある場合のみ)
+    def _conversions(self, norm_word):
+        """
+        正規化済みの語のかな/ローマ字変換を返す（ライブラリがある場合のみ）
+        """
+        synonyms = set()
         if HAS_JACONV:
             try:
                 # A. ひらがな ⇔ カタカナ
@@ -172,31 +281,38 @@ class SynonymDict:
                 synonyms.add(hira)
                 synonyms.add(kata)
             except Exception as e:
-                print(f"[WARNING] Conversion error for '{word}': {e}")
+                logger.warning(f"Conversion error for '{norm_word}': {e}")
 
         if HAS_ROMKAN:
             try:
                 # B. ローマ字 → カタカナ/ひらがな (入力がアルファベットの場合)
+                # 英単語など、かなに変換しきれない語（"chりstまs" など）は使わない
                 if re.match(r'^[a-zA-Z]+$', norm_word):
                     converted_kata = romkan.to_katakana(norm_word)
                     converted_hira = romkan.to_hiragana(norm_word)
-                    synonyms.add(converted_kata)
-                    synonyms.add(converted_hira)
+                    if not re.search(r'[a-zA-Z]', converted_kata):
+                        synonyms.add(converted_kata)
+                        synonyms.add(converted_hira)
             except Exception as e:
-                print(f"[WARNING] Romkan conversion error for '{word}': {e}")
+                logger.warning(f"Romkan conversion error for '{norm_word}': {e}")
 
-        result = list(synonyms)
-        print(f"DEBUG: get_synonyms result for '{word}': {result}")
+        return synonyms
 
-        # キャッシュに保存
-        if HAS_CACHE:
+    def _surface_variants(self, word):
+        """
+        見出し語が検索時に入力されうる表記（かな変換、全角英数、半角カナ）を返す
+        """
+        forms = {word} | self._conversions(self.normalize(word))
+        if not HAS_JACONV:
+            return forms
+
+        variants = set(forms)
+        for form in forms:
             try:
-                SynonymCache.objects.create(word=word, synonyms_json=result)
-                print(f"[CACHED] synonyms for '{word}'")
+                variants.add(jaconv.h2z(form, kana=False, digit=True, ascii=True))
+                variants.add(jaconv.z2h(form, kana=True, digit=False, ascii=False))
             except Exception as e:
-                # キャッシュ失敗は検索を妨げない
-                print(f"[WARNING] Failed to cache '{word}': {e}")
-
-        return result
+                logger.warning(f"Conversion error for '{form}': {e}")
+        return variants
 
 synonym_dict = SynonymDict()
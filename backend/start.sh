@@ -6,5 +6,16 @@ python manage.py migrate --noinput
 # Collect static files
 python manage.py collectstatic --noinput
 
-# Start Gunicorn
-exec gunicorn config.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2
+# Warm caches: import a snapshot if one is configured, otherwise crawl Drive in the background
+if [ -n "$CACHE_SNAPSHOT_PATH" ] && [ -f "$CACHE_SNAPSHOT_PATH" ]; then
+    python manage.py warm_cache --import "$CACHE_SNAPSHOT_PATH"
+else
+    python manage.py warm_cache &
+fi
+
+# Start the server (ASGI=True serves the async search endpoint from a single event loop per worker)
+if [ "$ASGI" = "True" ]; then
+    exec uvicorn config.asgi:application --host 0.0.0.0 --port ${PORT:-8000} --workers 2
+fi
+# SINGLE_FLIGHT_WAIT_SECONDS (default 20) must stay below the worker timeout
+exec gunicorn config.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2 --timeout ${GUNICORN_TIMEOUT:-30}
@@ -13,12 +13,16 @@ export default function ClientHome() {
   const { 
     items, 
     loading, 
+    loadingMore,
+    hasMore,
     error, 
     breadcrumbs, 
     handleItemClick, 
     handleBreadcrumbClick, 
     refresh,
-    search
+    search,
+    suggest,
+    loadMore
   } = useDriveExplorer();
 
   useEffect(() => {
@@ -35,7 +39,7 @@ export default function ClientHome() {
         <h1 className={styles.title}>Google Drive Explorer</h1>
         <p className={styles.subtitle}>共有されたGoogle Driveの中身を、安心して見ることができます。</p>
         
-        <SearchForm onSearch={search} />
+        <SearchForm onSearch={search} onSuggest={suggest} />
 
         <Breadcrumbs 
           breadcrumbs={breadcrumbs} 
@@ -55,6 +59,9 @@ export default function ClientHome() {
           <DriveGrid 
             items={items} 
             onItemClick={handleItemClick} 
+            hasMore={hasMore}
+            loadingMore={loadingMore}
+            onLoadMore={loadMore}
           />
         )}
       </main>
@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useEffect, useRef } from 'react';
 import { DriveItem } from '../../types/drive';
 import { DriveItemCard } from './DriveItemCard';
 import styles from '../../app/page.module.css';
@@ -6,20 +6,47 @@ import styles from '../../app/page.module.css';
 interface DriveGridProps {
   items: DriveItem[];
   onItemClick: (item: DriveItem) => void;
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
-export const DriveGrid: React.FC<DriveGridProps> = ({ items, onItemClick }) => {
+export const DriveGrid: React.FC<DriveGridProps> = ({ items, onItemClick, hasMore = false, loadingMore = false, onLoadMore }) => {
+  const sentinelRef = useRef<HTMLDivElement>(null);
+
+  // 末尾が画面に近づいたら次のページを取得
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !hasMore || !onLoadMore) return;
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries[0].isIntersecting) onLoadMore();
+      },
+      { rootMargin: '400px' }
+    );
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [hasMore, onLoadMore]);
+
   if (items.length === 0) return null;
 
   return (
-    <div className={styles.grid}>
-      {items.map((item) => (
-        <DriveItemCard 
-          key={item.id} 
-          item={item} 
-          onClick={onItemClick} 
-        />
-      ))}
-    </div>
+    <>
+      <div className={styles.grid}>
+        {items.map((item) => (
+          <DriveItemCard 
+            key={item.id} 
+            item={item} 
+            onClick={onItemClick} 
+          />
+        ))}
+      </div>
+      {hasMore && (
+        <div ref={sentinelRef} className={styles.loadMore}>
+          {loadingMore && <div className={styles.spinner}></div>}
+        </div>
+      )}
+    </>
   );
 };
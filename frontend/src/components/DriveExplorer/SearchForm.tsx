@@ -1,15 +1,52 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import styles from '../../app/page.module.css';
+import { Suggestion } from '../../types/drive';
+
+// 入力が止まってから候補を取得するまでの時間（ミリ秒）
+const SUGGEST_DELAY_MS = 150;
 
 interface SearchFormProps {
   onSearch: (query: string) => void;
+  onSuggest?: (prefix: string) => Promise<Suggestion[]>;
 }
 
-export const SearchForm: React.FC<SearchFormProps> = ({ onSearch }) => {
+export const SearchForm: React.FC<SearchFormProps> = ({ onSearch, onSuggest }) => {
   const [query, setQuery] = useState('');
+  const [suggestions, setSuggestions] = useState<string[]>([]);
   const [isRecording, setIsRecording] = useState(false);
   const recognitionRef = React.useRef<any>(null);
 
+  // 最後の語の候補を取得し、その語を置き換えたクエリを datalist に出す
+  useEffect(() => {
+    const words = query.split(/[\s　]+/);
+    const lastWord = words[words.length - 1];
+    if (!onSuggest || !lastWord) {
+      setSuggestions([]);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await onSuggest(lastWord);
+        if (cancelled) return;
+        const head = words.slice(0, -1).join(' ');
+        setSuggestions(
+          results
+            .filter(s => s.term !== lastWord)
+            .map(s => (head ? `${head} ${s.term}` : s.term))
+        );
+      } catch (error) {
+        console.error('Failed to fetch suggestions:', error);
+      }
+    }, SUGGEST_DELAY_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [query, onSuggest]);
+
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault();
     onSearch(query);
@@ -75,7 +112,14 @@ export const SearchForm: React.FC<SearchFormProps> = ({ onSearch }) => {
         value={query}
         onChange={(e) => setQuery(e.target.value)}
         className={styles.searchInput}
+        list="search-suggestions"
+        autoComplete="off"
       />
+      <datalist id="search-suggestions">
+        {suggestions.map(suggestion => (
+          <option key={suggestion} value={suggestion} />
+        ))}
+      </datalist>
       <button type="submit" className={styles.searchButton}>
         Search
       </button>
@@ -1,13 +1,43 @@
-import { useState, useEffect, useCallback } from 'react';
-import { DriveItem, Breadcrumb } from '../types/drive';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { DriveItem, Breadcrumb, PagedResponse, Suggestion } from '../types/drive';
 
 import { normalizeQuery } from '../utils/stringUtils';
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api';
+// バックエンドを ASGI で動かしている場合は非同期の検索エンドポイントを使う
+const FOLDERS_PATH = process.env.NEXT_PUBLIC_ASYNC_SEARCH === 'true' ? 'folders/async' : 'folders';
+
+// 1回のリクエストで取得する件数（続きはスクロールに合わせて取得）
+const PAGE_SIZE = 100;
+
+// 一覧・検索結果の1ページ分を取得（結果セットはサーバー側に保持される）
+const fetchPage = async (queryString: string, cursor: string | null = null): Promise<PagedResponse> => {
+  const params = new URLSearchParams(queryString);
+  params.set('limit', String(PAGE_SIZE));
+  if (cursor) params.set('cursor', cursor);
+
+  console.log('Requesting URL:', `${API_URL}/${FOLDERS_PATH}/?${params.toString()}`);
+  // ETag で再検証し、変更がなければ 304 でブラウザキャッシュの内容を使う
+  const res = await fetch(`${API_URL}/${FOLDERS_PATH}/?${params.toString()}`, { cache: 'no-cache' });
+
+  if (res.status === 410) {
+    throw new Error('CURSOR_EXPIRED');
+  }
+  if (!res.ok) {
+    throw new Error('Failed to fetch items. Backend might be down or API error.');
+  }
+  return res.json();
+};
+
 export const useDriveExplorer = () => {
   const [items, setItems] = useState<DriveItem[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [breadcrumbs, setBreadcrumbs] = useState<Breadcrumb[]>([{ id: null, name: 'Home' }]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // 現在表示中の結果セットのクエリ文字列（続きのページ取得に使う）
+  const currentQuery = useRef('');
 
   const fetchItems = useCallback(async (folderId: string | null = null, queryText: string = '') => {
     console.log('Fetching items for folderId:', folderId, 'Query:', queryText);
@@ -18,24 +48,21 @@ export const useDriveExplorer = () => {
 
     setLoading(true);
     setError(null);
+    setNextCursor(null);
     try {
-      const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api';
-      
       const params = new URLSearchParams();
       if (folderId) params.append('folder_id', folderId);
       if (normalizedQuery) params.append('query', normalizedQuery);
-      
+
       const queryString = params.toString();
-      console.log('Requesting URL:', `${apiUrl}/folders/?${queryString}`);
-      
-      const res = await fetch(`${apiUrl}/folders/?${queryString}`);
-      
-      if (!res.ok) {
-        throw new Error('Failed to fetch items. Backend might be down or API error.');
-      }
-      const data = await res.json();
-      console.log('Fetched data:', data);
-      setItems(data);
+      currentQuery.current = queryString;
+
+      // 1ページ目だけ取得して表示し、続きは loadMore で取得する
+      const data = await fetchPage(queryString);
+      if (currentQuery.current !== queryString) return;
+      console.log(`Fetched ${data.items.length} of ${data.total} items`);
+      setItems(data.items);
+      setNextCursor(data.next_cursor);
     } catch (err: any) {
       console.error('Fetch error:', err);
       setError(err.message || 'Unknown error');
@@ -48,6 +75,30 @@ export const useDriveExplorer = () => {
     fetchItems(null);
   }, [fetchItems]);
 
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loadingMore) return;
+
+    const queryString = currentQuery.current;
+    setLoadingMore(true);
+    try {
+      const data = await fetchPage(queryString, nextCursor);
+      if (currentQuery.current !== queryString) return;
+      setItems(prev => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (err: any) {
+      if (err.message === 'CURSOR_EXPIRED') {
+        // 結果が更新されたので先頭から取り直す
+        const params = new URLSearchParams(queryString);
+        fetchItems(params.get('folder_id'), params.get('query') ?? '');
+        return;
+      }
+      console.error('Fetch error:', err);
+      setError(err.message || 'Unknown error');
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [nextCursor, loadingMore, fetchItems]);
+
   const handleFolderClick = (folder: DriveItem) => {
     console.log('Clicked folder:', folder);
     if (folder.mimeType === 'application/vnd.google-apps.folder') {
@@ -91,14 +142,30 @@ export const useDriveExplorer = () => {
     fetchItems(currentFolderId, query);
   };
 
+  // 入力中の語の候補を取得（現在のフォルダ配下に出現する語と辞書の語）
+  const suggest = useCallback(async (prefix: string): Promise<Suggestion[]> => {
+    const params = new URLSearchParams({ q: prefix });
+    const currentFolderId = breadcrumbs[breadcrumbs.length - 1].id;
+    if (currentFolderId) params.append('folder_id', currentFolderId);
+
+    const res = await fetch(`${API_URL}/folders/suggest/?${params.toString()}`);
+    if (!res.ok) return [];
+    const data = await res.json();
+    return data.suggestions;
+  }, [breadcrumbs]);
+
   return {
     items,
     loading,
+    loadingMore,
+    hasMore: nextCursor !== null,
     error,
     breadcrumbs,
     handleItemClick,
     handleBreadcrumbClick,
     refresh,
-    search
+    search,
+    suggest,
+    loadMore
   };
 };
@@ -9,3 +9,15 @@ export interface Breadcrumb {
   id: string | null;
   name: string;
 }
+
+export interface PagedResponse {
+  items: DriveItem[];
+  next_cursor: string | null;
+  total: number;
+}
+
+export interface Suggestion {
+  term: string;
+  count: number;
+  synonym: boolean;
+}